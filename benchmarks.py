@@ -0,0 +1,671 @@
+import argparse
+import array
+import gc
+import json
+import platform
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from control_client import ControlClient, measure_round_trips
+from control_server import ControlServer, SteeringController
+from engine_process import EngineProcess, EngineShared
+from engine_runner import EngineRunner
+from key_input import KeyState
+from mouse_input import MouseMotion
+from output_filters import STAGES, FilterSpec, measure_latency
+from output_sinks import AXIS_X, NullSink, OutputSink
+from profile_store import ProfileStore
+from response_curve import ResponseCurve
+from steering_bank import SteeringBank
+from steering_engine import SteeringConfig, SteeringEngine, SteeringInputs
+from telemetry import TelemetryWriter
+from tick_scheduler import TickScheduler
+from tick_stats import TickStats
+
+# Stand-in scan codes for the synthetic keyboard
+STEER_LEFT, STEER_RIGHT = 30, 32
+FULLSTEER_LEFT, FULLSTEER_RIGHT = 44, 45
+ACTION_KEY_CODES = list(range(130, 170))
+NOISE_CODES = list(range(60, 120))
+
+
+STAND_IN_CODES = {"a": STEER_LEFT, "d": STEER_RIGHT, "z": FULLSTEER_LEFT, "c": FULLSTEER_RIGHT}
+STAND_IN_CODES.update({str(i): code for i, code in enumerate(ACTION_KEY_CODES)})
+
+
+# Key masks as KeyState would resolve them, for a keyboard with fixed codes
+def stand_in_mask(name):
+    return 1 << STAND_IN_CODES[name] if name in STAND_IN_CODES else 0
+
+
+def make_settings(action_keys=0, pedals=0, filters=()):
+    return {
+        "steer_left_binding": "a",
+        "steer_right_binding": "d",
+        "fullsteer_left_binding": "z",
+        "fullsteer_right_binding": "c",
+        "action_keys": [{"binding": str(i), "cap_percentage": 90 - i} for i in range(action_keys)],
+        # Pedals share the steer keys, so they move whenever the wheel does
+        "axes": [{"axis": axis, "binding": "ad"[i % 2]} for i, axis in enumerate(("y", "z", "rz")[:pedals])],
+        "filters": [{"type": kind} for kind in filters],
+    }
+
+
+def percentiles(samples_ns):
+    ordered = sorted(samples_ns)
+    if not ordered:
+        return {"count": 0}
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] / 1000.0
+
+    return {
+        "count": len(ordered),
+        "mean_us": sum(ordered) / len(ordered) / 1000.0,
+        "p50_us": at(0.50),
+        "p99_us": at(0.99),
+        "max_us": ordered[-1] / 1000.0,
+    }
+
+
+# Log2 histogram of intervals in microseconds, as {"<=N us": count}
+def histogram(samples_ns):
+    buckets = {}
+    for sample in samples_ns:
+        bound = 1
+        while bound * 1000 < sample:
+            bound *= 2
+        buckets[bound] = buckets.get(bound, 0) + 1
+    return {f"<={bound}us": buckets[bound] for bound in sorted(buckets)}
+
+
+# Cost of one full tick (read inputs, step, write) with a given number of
+# action keys, none of which is held, so every one of them gets checked
+def bench_tick(action_keys, ticks, pedals=0, filters=()):
+    config = SteeringConfig.from_settings(make_settings(action_keys, pedals, filters), stand_in_mask)
+    engine = SteeringEngine(config)
+    inputs = SteeringInputs()
+    sink = NullSink()
+    pattern = [1 << STEER_RIGHT] * 50 + [0] * 30 + [1 << STEER_LEFT] * 50 + [0] * 30
+    period = len(pattern)
+
+    started = time.perf_counter_ns()
+    for i in range(ticks):
+        engine.config.read_inputs(pattern[i % period], inputs)
+        engine.step(inputs)
+        sink.set_axes(engine.state.axis_values)
+    elapsed = time.perf_counter_ns() - started
+    return {"ns_per_tick": elapsed / ticks, "ticks_per_second": ticks * 1e9 / elapsed,
+            "device_updates_per_tick": sink.writes_issued / ticks}
+
+
+# Cost of driving several devices: one vectorized SteeringBank against one
+# SteeringEngine per device, each with its own profile and sink
+def bench_seats(seats, ticks):
+    configs = [SteeringConfig.from_settings(dict(make_settings(10, 1), sensitivity=5 + i, linearity=60 + 10 * i),
+                                            stand_in_mask) for i in range(seats)]
+    pattern = [1 << STEER_RIGHT] * 50 + [0] * 30 + [1 << STEER_LEFT] * 50 + [0] * 30
+    period = len(pattern)
+
+    bank = SteeringBank(configs)
+    sinks = [NullSink() for _ in range(seats)]
+    started = time.perf_counter_ns()
+    for i in range(ticks):
+        bank.step(pattern[i % period])
+        for seat in bank.changed:
+            sinks[seat].set_axes(bank.axis_values[seat])
+    bank_ns = (time.perf_counter_ns() - started) / ticks
+
+    engines = [SteeringEngine(config) for config in configs]
+    inputs = SteeringInputs()
+    started = time.perf_counter_ns()
+    for i in range(ticks):
+        pressed = pattern[i % period]
+        for engine, sink in zip(engines, sinks):
+            engine.config.read_inputs(pressed, inputs)
+            engine.step(inputs)
+            sink.set_axes(engine.state.axis_values)
+    engines_ns = (time.perf_counter_ns() - started) / ticks
+    return {"seats": seats, "bank_ns_per_tick": bank_ns, "engines_ns_per_tick": engines_ns}
+
+
+# Per-seat scaling: marginal cost of one more device between the smallest
+# and the largest bank
+def bench_seat_scaling(ticks, counts=(1, 2, 4, 8, 16, 32)):
+    runs = [bench_seats(n, ticks) for n in counts]
+    first, last = runs[0], runs[-1]
+    added = last["seats"] - first["seats"]
+    return {
+        "runs": runs,
+        "bank_ns_per_added_seat": (last["bank_ns_per_tick"] - first["bank_ns_per_tick"]) / added,
+        "engines_ns_per_added_seat": (last["engines_ns_per_tick"] - first["engines_ns_per_tick"]) / added,
+    }
+
+
+def bench_curve(kind, evaluations):
+    curve = ResponseCurve(kind, 150, [(0.3, 0.1), (0.7, 0.6)])
+    values = [random.uniform(-1, 1) for _ in range(1000)]
+    apply = curve.apply
+    started = time.perf_counter_ns()
+    for i in range(evaluations):
+        apply(values[i % 1000])
+    elapsed = time.perf_counter_ns() - started
+    return {"ns_per_eval": elapsed / evaluations}
+
+
+# One output filter stage with default parameters: cost per sample and the
+# latency it adds (see output_filters.measure_latency)
+def bench_filter(kind, evaluations):
+    stage = STAGES[kind]()
+    values = [random.uniform(-1, 1) for _ in range(1000)]
+    apply = stage.apply
+    started = time.perf_counter_ns()
+    for i in range(evaluations):
+        apply(values[i % 1000], 0.01)
+    elapsed = time.perf_counter_ns() - started
+    spec = FilterSpec(kind, tuple(default for _, default in stage.PARAMS))
+    return dict(measure_latency([spec]), ns_per_sample=elapsed / evaluations)
+
+
+# Compiling a profile and swapping it into a running engine
+def bench_profile_switch(switches):
+    profiles = [dict(make_settings(i % 11), sensitivity=5 + i % 20, linearity=50 + i % 150) for i in range(20)]
+    engine = SteeringEngine()
+    started = time.perf_counter_ns()
+    for i in range(switches):
+        engine.config = SteeringConfig.from_settings(profiles[i % 20], stand_in_mask)
+    elapsed = time.perf_counter_ns() - started
+    return {"us_per_switch": elapsed / switches / 1000.0}
+
+
+# Extra cost per tick of TickStats.record_tick(), measured against the same
+# loop (clock reads included) with instrumentation switched off
+def bench_instrumentation(ticks):
+    results = {}
+    for enabled in (False, True):
+        stats = TickStats(enabled=enabled)
+        clock = time.perf_counter_ns
+        started = clock()
+        for i in range(ticks):
+            start = clock()
+            write = clock()
+            stats.record_tick(start, write, clock(), start if i & 7 == 0 else 0)
+        results[enabled] = (clock() - started) / ticks
+    return {"ns_per_tick_disabled": results[False], "ns_per_tick_enabled": results[True],
+            "overhead_ns": results[True] - results[False]}
+
+
+# Records when each axis write actually happens
+class TimestampSink(OutputSink):
+    name = "timestamp"
+
+    def __init__(self):
+        super().__init__()
+        self.last_write_ns = 0
+
+    def _write(self, axis, raw):
+        self.last_write_ns = time.perf_counter_ns()
+
+
+# Real-time run: a synthetic keyboard thread floods KeyState with events while
+# the steering loop ticks at `rate_hz`. Every `probe_interval` a steer key is
+# tapped (pressed and released immediately); key-to-axis latency is measured
+# from that press to the first axis write that reflects it, and probes that
+# never reach the engine count as dropped.
+def bench_key_storm(events_per_second, seconds, rate_hz, probe_interval=0.02):
+    config = SteeringConfig.from_settings(make_settings(10), stand_in_mask)
+    engine = SteeringEngine(config)
+    keys = KeyState()
+    inputs = SteeringInputs()
+    sink = TimestampSink()
+    scheduler = TickScheduler(rate_hz)
+
+    probes = []  # Press timestamps of probe taps not seen by the engine yet
+    latencies = []
+    intervals = []
+    probe_lock = threading.Lock()
+    stop = threading.Event()
+    events_sent = [0]
+
+    def keyboard_thread():
+        gap = 1.0 / events_per_second
+        next_event = time.perf_counter()
+        next_probe = next_event + probe_interval
+        while not stop.is_set():
+            now = time.perf_counter()
+            if now >= next_probe:
+                with probe_lock:
+                    probes.append(time.perf_counter_ns())
+                    keys.press(STEER_RIGHT)
+                keys.release(STEER_RIGHT)
+                next_probe += probe_interval
+                events_sent[0] += 2
+            if now >= next_event:
+                code = random.choice(NOISE_CODES)
+                if random.random() < 0.5:
+                    keys.press(code)
+                else:
+                    keys.release(code)
+                next_event += gap
+                events_sent[0] += 1
+            else:
+                time.sleep(0)
+
+    thread = threading.Thread(target=keyboard_thread, daemon=True)
+    thread.start()
+    scheduler.start()
+    last_tick = time.perf_counter_ns()
+    end = last_tick + int(seconds * 1e9)
+    while True:
+        dt = scheduler.wait()
+        now = time.perf_counter_ns()
+        intervals.append(now - last_tick)
+        last_tick = now
+        if now >= end:
+            break
+
+        with probe_lock:
+            pressed = keys.snapshot()
+            pending = probes[:] if pressed >> STEER_RIGHT & 1 else []
+            if pending:
+                probes.clear()
+        engine.config.read_inputs(pressed, inputs)
+        # Recenter each tick so every probe produces a fresh axis change
+        engine.reset()
+        sink.set_axis(AXIS_X, engine.step(inputs, dt))
+        for pressed_at in pending:
+            latencies.append(sink.last_write_ns - pressed_at)
+        sink.set_axis(AXIS_X, 0.0)
+
+    stop.set()
+    thread.join()
+    # Only probes that had a full tick to be seen can count as dropped
+    dropped = sum(1 for t in probes if t < last_tick - 2 * scheduler.period_ns)
+
+    return {
+        "events_per_second": events_sent[0] / seconds,
+        "tick_rate_hz": scheduler.rate_hz,
+        "missed_deadlines": scheduler.missed_deadlines,
+        "key_to_axis": percentiles(latencies),
+        "dropped_probes": dropped,
+        "tick_interval": percentiles(intervals),
+        "tick_interval_histogram": histogram(intervals),
+    }
+
+
+# Tick timing while this process keeps the GIL busy the way a slow
+# canvas.draw() does: the loop as a thread of this process against the loop
+# in an engine process
+def bench_gui_stall(seconds, rate_hz=1000):
+    def churn():
+        until = time.perf_counter() + seconds
+        while time.perf_counter() < until:
+            sum(i * i for i in range(10_000))
+
+    def timing(stats):
+        interval = stats.snapshot()["tick_interval"]
+        return {key: interval.get(key) for key in ("p50_us", "p99_us", "max_us")}
+
+    config = SteeringConfig.from_settings(make_settings(10), stand_in_mask)
+    stats = TickStats()
+    runner = EngineRunner(SteeringEngine(config), KeyState(), NullSink(), rate_hz=rate_hz, stats=stats)
+    runner.start()
+    churn()
+    thread = timing(stats)
+    runner.stop()
+
+    engine = EngineProcess(config, output="null", rate_hz=rate_hz, keyboard=False)
+    engine.start()
+    try:
+        churn()
+        process = timing(engine.stats)
+    finally:
+        engine.close()
+    return {"rate_hz": rate_hz, "thread_tick_interval": thread, "process_tick_interval": process}
+
+
+# Round trips through the control server to a running loop, over TCP and
+# (where there are Unix sockets) a Unix socket
+def bench_control(requests):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        store = ProfileStore(os.path.join(directory, "profiles.json"), defaults=dict(make_settings(10), sensitivity=10, tick_rate=1000),
+                             legacy_dir=directory)
+        store.save("default", store.load())
+        runner = EngineRunner(SteeringEngine(), KeyState(), NullSink(), rate_hz=1000, stats=TickStats())
+        controller = SteeringController(store, runner, stand_in_mask)
+        runner.start()
+        addresses = {"tcp": "127.0.0.1:0"}
+        if hasattr(socket, "AF_UNIX"):
+            addresses["unix"] = f"unix:{os.path.join(directory, 'control.sock')}"
+        try:
+            for name, address in addresses.items():
+                server = ControlServer(controller, address)
+                server.start()
+                client = ControlClient(server.bound_address())
+                try:
+                    samples = measure_round_trips(client, requests)
+                finally:
+                    client.close()
+                    server.stop()
+                results[name] = {command: percentiles(ns) for command, ns in samples.items()}
+        finally:
+            runner.stop()
+            store.writer.close()
+    return results
+
+
+# Traced memory one steady-state tick holds at once above the probe's own
+# floor, per interpreter (implementation, version, pointer bits): only the
+# ints CPython allocates past the small-int cache (timestamps, counters,
+# histogram counts), each freed within the tick or when the next tick
+# replaces it. There is no slack; a list, tuple or float more per tick goes
+# over. Re-measure them when the tick path changes on purpose. Interpreters
+# not listed are held to their own typical tick instead.
+TICK_PEAK_BYTES = {
+    ("cpython", 3, 11, 64): 176,
+}
+# Block size of an int as large as a perf_counter_ns() timestamp; floats
+# are smaller
+INT_BYTES = sys.getsizeof(1 << 60)
+# How often a tick may hold one int more than the baseline: a histogram
+# count the timing happens to push past the small-int cache
+RARE_INT_TICKS = 10_000  # At most one tick in this many
+
+
+# Baseline tick peak of this interpreter, and where it comes from
+def _tick_baseline(peaks):
+    key = (sys.implementation.name, *sys.version_info[:2], 64 if sys.maxsize > 2 ** 32 else 32)
+    if key in TICK_PEAK_BYTES:
+        return TICK_PEAK_BYTES[key], "measured"
+    return peaks[len(peaks) // 2], "median tick"
+
+
+# Scheduler stand-in for check_allocations(): fixed-dt ticks as fast as the
+# loop takes them, a steering pattern on the keys, and the traced-memory
+# peak of each tick measured in between
+class _ProbeScheduler:
+    rate_hz = 1000
+    period_ns = 1_000_000
+    missed_deadlines = 0
+
+    def __init__(self, runner, keys, warmup, ticks, floor):
+        self.runner = runner
+        self.keys = keys
+        self.ticks = 0
+        self.warmup = warmup
+        self.end = warmup + ticks
+        self.floor = floor
+        # Preallocated and holding plain C ints, so recording keeps no objects
+        self.peaks = array.array("q", [0]) * ticks
+        self.pattern = [STEER_RIGHT] * 50 + [None] * 30 + [STEER_LEFT] * 50 + [None] * 30
+        # First snapshot a whole number of key cycles before the last one,
+        # so both see the loop in the same state, and at least one cycle
+        # before measuring: the snapshot frees a lot at once, which shows in
+        # the next few key presses
+        cycles = (ticks + 1) // len(self.pattern) + 2
+        self.before = self.end + 1 - cycles * len(self.pattern)
+        self.gc_collections = 0
+        self._collecting = False
+        self.retained = []
+        self._before = None
+        self._base = 0
+
+    def start(self):
+        pass
+
+    def set_rate(self, rate_hz):
+        pass
+
+    def report(self):
+        return "probe"
+
+    def wait(self):
+        tick = self.ticks
+        if self.warmup < tick <= self.end:
+            self.peaks[tick - self.warmup - 1] = tracemalloc.get_traced_memory()[1] - self._base - self.floor
+        tick = self.ticks = tick + 1
+        if tick == self.warmup // 2:
+            tracemalloc.start()
+        elif tick == self.before:
+            gc.callbacks.append(self._on_gc)
+            self._before = self._snapshot()
+        elif tick == self.end + 1:
+            self._finish()
+
+        # Key events come from the hook thread in real life, outside the tick
+        pattern = self.pattern
+        code, previous = pattern[tick % len(pattern)], pattern[(tick - 1) % len(pattern)]
+        if code != previous:
+            if previous is not None:
+                self.keys.release(previous)
+            if code is not None:
+                self.keys.press(code)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+        return 0.001
+
+    def _on_gc(self, phase, info):
+        if phase == "start" and not self._collecting:
+            self.gc_collections += 1
+
+    # A full collection first empties the free lists, whose blocks
+    # tracemalloc still counts as allocated; otherwise whatever the loop
+    # parked there between the two snapshots would look retained
+    def _snapshot(self):
+        self._collecting = True
+        gc.collect()
+        self._collecting = False
+        return tracemalloc.take_snapshot()
+
+    def _finish(self):
+        after = self._snapshot()
+        gc.callbacks.remove(self._on_gc)
+        tracemalloc.stop()
+        before = _package_blocks(self._before)
+        self.retained = []
+        for where, (count, size) in _package_blocks(after).items():
+            was_count, was_size = before.get(where, (0, 0))
+            if count > was_count or size > was_size:
+                self.retained.append((where, count - was_count, size - was_size))
+        self.runner.stop()
+
+
+# Block count and size per allocating line in this package, leaving out
+# the probe itself and number-sized blocks: ints and floats come and go as
+# the loop replaces the values it holds (whether one is a fresh block or a
+# cached constant depends on where the steering and the timing are), and
+# a leak of them still grows the list or dict holding them
+def _package_blocks(snapshot):
+    here = os.path.dirname(os.path.abspath(__file__))
+    blocks = {}
+    for trace in snapshot.traces:
+        frame = trace.traceback[0]
+        if (trace.size <= INT_BYTES or not frame.filename.startswith(here)
+                or frame.filename == os.path.abspath(__file__)):
+            continue
+        where = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+        count, size = blocks.get(where, (0, 0))
+        blocks[where] = (count + 1, size + trace.size)
+    return blocks
+
+
+# Traced-memory floor of the probe itself (reset, read, read)
+def _probe_floor(rounds=1000):
+    tracemalloc.start()
+    floor = 0
+    for _ in range(rounds):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        floor = max(floor, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return floor
+
+
+# Allocation guard: run the real steering loop (EngineRunner with
+# instrumentation, the shared-memory state and samples of an engine
+# process, a mouse source, 10 action keys, 3 pedals and every filter stage)
+# for `ticks` steady-state ticks under tracemalloc and gc callbacks. Fails
+# if ticks go over the baseline, if memory is kept from one tick to the
+# next or if the cyclic collector has to run.
+def check_allocations(ticks=100_000, warmup=5_000):
+    config = SteeringConfig.from_settings(make_settings(10, 3, tuple(STAGES)), stand_in_mask)
+    shared = EngineShared.create()
+    keys = KeyState()
+    telemetry_path = os.path.join(tempfile.mkdtemp(), "allocations.tel")
+    telemetry = TelemetryWriter(telemetry_path, capacity=ticks + warmup + 1)
+    runner = EngineRunner(SteeringEngine(config), keys, NullSink(), stats=TickStats(),
+                          samples=shared.samples, shared=shared.state, mouse=MouseMotion(),
+                          telemetry=telemetry)
+    probe = runner.scheduler = _ProbeScheduler(runner, keys, warmup, ticks, _probe_floor())
+    try:
+        # The loop runs right here, without the watchdog thread: tracemalloc
+        # sees the whole process, so its wakeups would count against
+        # whichever tick they happen to land in
+        runner.run()
+    finally:
+        runner.stop()
+        shared.close(unlink=True)
+        telemetry.close()
+        shutil.rmtree(os.path.dirname(telemetry_path), ignore_errors=True)
+
+    peaks = sorted(probe.peaks)
+    p99 = peaks[int(len(peaks) * 0.99)]
+    baseline, baseline_source = _tick_baseline(peaks)
+    over = sum(1 for peak in peaks if peak > baseline)
+    retained_blocks = sum(count for _, count, _ in probe.retained)
+    problems = []
+    if p99 > baseline:
+        problems.append(f"ticks hold {p99} bytes at p99 (baseline {baseline})")
+    allowed = max(1, ticks // RARE_INT_TICKS)
+    if over > allowed:
+        problems.append(f"{over} ticks over the {baseline} byte baseline (allowed {allowed})")
+    if peaks[-1] > baseline + INT_BYTES:
+        problems.append(f"a tick held {peaks[-1]} bytes (baseline {baseline} plus one int)")
+    if probe.gc_collections:
+        problems.append(f"{probe.gc_collections} garbage collections during the run")
+    if probe.retained:
+        problems.append(f"{retained_blocks} blocks ({sum(size for _, _, size in probe.retained)} bytes) kept across ticks")
+    return {
+        "ticks": ticks,
+        "tick_peak_bytes": {"p50": peaks[len(peaks) // 2], "p99": p99, "max": peaks[-1]},
+        "baseline_bytes": baseline,
+        "baseline": baseline_source,
+        "ticks_over_baseline": over,
+        "gc_collections": probe.gc_collections,
+        "retained_blocks": retained_blocks,
+        "retained_sites": [f"{where}: {count:+} blocks, {size:+} B" for where, count, size in probe.retained[:5]],
+        "problems": problems,
+    }
+
+
+def run(quick=False):
+    scale = 0.1 if quick else 1.0
+    ticks = int(200_000 * scale)
+    storm_seconds = 1.0 if quick else 5.0
+    return {
+        "tick_0_action_keys": bench_tick(0, ticks),
+        "tick_10_action_keys": bench_tick(10, ticks),
+        "tick_40_action_keys": bench_tick(40, ticks),
+        "tick_3_pedals": bench_tick(10, ticks, pedals=3),
+        "tick_all_filters": bench_tick(10, ticks, filters=tuple(STAGES)),
+        "curve_power": bench_curve("power", ticks),
+        "curve_piecewise": bench_curve("piecewise", ticks),
+        "curve_spline": bench_curve("spline", ticks),
+        **{f"filter_{kind}": bench_filter(kind, ticks) for kind in STAGES},
+        "profile_switch": bench_profile_switch(int(2_000 * scale)),
+        "seat_scaling": bench_seat_scaling(int(20_000 * scale)),
+        "instrumentation": bench_instrumentation(ticks),
+        "gui_stall": bench_gui_stall(storm_seconds),
+        "control": bench_control(int(2_000 * scale)),
+        "key_storm_100hz": bench_key_storm(2_000, storm_seconds, 100),
+        "key_storm_1khz": bench_key_storm(5_000, storm_seconds, 1000),
+        "allocations": check_allocations(int(100_000 * scale)),
+    }
+
+
+# Metrics where a larger number is worse, keyed by (benchmark, field path)
+REGRESSION_METRICS = [
+    ("tick_0_action_keys", "ns_per_tick"),
+    ("tick_10_action_keys", "ns_per_tick"),
+    ("curve_power", "ns_per_eval"),
+    ("curve_spline", "ns_per_eval"),
+    ("filter_one_euro", "ns_per_sample"),
+    ("filter_one_euro", "ramp_ms"),
+    ("profile_switch", "us_per_switch"),
+    ("seat_scaling", "bank_ns_per_added_seat"),
+    ("instrumentation", "ns_per_tick_enabled"),
+    ("gui_stall", "process_tick_interval.p99_us"),
+    ("control", "tcp.set.p99_us"),
+    ("key_storm_1khz", "key_to_axis.p99_us"),
+]
+
+
+def _lookup(results, name, path):
+    value = results.get(name, {})
+    for part in path.split("."):
+        value = value.get(part, {}) if isinstance(value, dict) else {}
+    return value if isinstance(value, (int, float)) else None
+
+
+# List of human-readable regressions compared with an earlier result file
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, path in REGRESSION_METRICS:
+        new, old = _lookup(results, name, path), _lookup(baseline, name, path)
+        if new is not None and old and new > old * (1 + tolerance):
+            regressions.append(f"{name}.{path}: {old:.3f} -> {new:.3f} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the steering tick path with stand-in input and output")
+    parser.add_argument("--quick", action="store_true", help="Shorter run, for a smoke test")
+    parser.add_argument("--json", metavar="PATH", help="Write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="Fail if results regressed against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline (default 0.25)")
+    parser.add_argument("--allocations", nargs="?", type=int, const=100_000, metavar="TICKS",
+                        help="Only run the allocation guard over TICKS ticks (default 100000); fails if a tick allocates")
+    args = parser.parse_args(argv)
+
+    if args.allocations is not None:
+        if args.allocations < 1:
+            parser.error("--allocations needs at least one tick")
+        result = check_allocations(args.allocations)
+        print(json.dumps(result, indent=4))
+        for problem in result["problems"]:
+            print(f"ALLOCATION {problem}")
+        return 1 if result["problems"] else 0
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "benchmarks": run(args.quick),
+    }
+    print(json.dumps(results["benchmarks"], indent=4))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results["benchmarks"], baseline.get("benchmarks", {}), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
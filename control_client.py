@@ -0,0 +1,132 @@
+import argparse
+import itertools
+import json
+import socket
+import sys
+import time
+
+from control_server import ControlError, parse_address
+
+COMMANDS = ("ping", "profiles", "select", "get", "set", "state", "stats", "watch", "bench")
+
+
+# Blocking client for ControlServer, one request in flight at a time
+class ControlClient:
+    def __init__(self, address, timeout=5.0):
+        kind, *where = parse_address(address)
+        if kind == "unix":
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.settimeout(timeout)
+            self.socket.connect(where[0])
+        else:
+            self.socket = socket.create_connection(tuple(where), timeout)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self.socket.makefile("rb")
+        self._ids = itertools.count(1)
+        self._events = []  # Stream events that arrived while waiting for a reply
+
+    def close(self):
+        self._file.close()
+        self.socket.close()
+
+    # Send a command and return its result; raises ControlError with the
+    # server's message if it failed
+    def call(self, command, **arguments):
+        request_id = next(self._ids)
+        self.socket.sendall(json.dumps(dict(arguments, cmd=command, id=request_id)).encode() + b"\n")
+        while True:
+            message = self._read()
+            if "event" in message:
+                self._events.append(message)
+            elif message.get("id") == request_id:
+                if not message["ok"]:
+                    raise ControlError(message["error"])
+                return message["result"]
+
+    # Next stream event after subscribe
+    def event(self):
+        if self._events:
+            return self._events.pop(0)
+        while True:
+            message = self._read()
+            if "event" in message:
+                return message
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ControlError("Connection closed by the server")
+        return json.loads(line)
+
+
+# Round trips of a few representative commands, in ns per request. "set"
+# toggles sensitivity between its current value and one more, so the
+# profile ends up as it was.
+def measure_round_trips(client, count=1000):
+    sensitivity = client.call("get", name="sensitivity")
+    requests = {
+        "ping": lambda i: client.call("ping"),
+        "state": lambda i: client.call("state"),
+        "set": lambda i: client.call("set", name="sensitivity", value=sensitivity + (i % 2)),
+    }
+    results = {}
+    clock = time.perf_counter_ns
+    for name, request in requests.items():
+        samples = []
+        for i in range(count):
+            started = clock()
+            request(i)
+            samples.append(clock() - started)
+        results[name] = samples
+    client.call("set", name="sensitivity", value=sensitivity)
+    return results
+
+
+def _value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text  # Bare words such as key names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Talk to a running Wheelmode for Keyboard (see --control)")
+    parser.add_argument("address", help="Control address: unix:PATH or [HOST:]PORT")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("arguments", nargs="*", help="select NAME | get [NAME] | set NAME VALUE | watch [RATE_HZ] | bench [COUNT]")
+    args = parser.parse_args(argv)
+
+    client = ControlClient(args.address)
+    try:
+        if args.command == "select":
+            result = client.call("select", name=args.arguments[0])
+        elif args.command == "get":
+            result = client.call("get", **({"name": args.arguments[0]} if args.arguments else {}))
+        elif args.command == "set":
+            result = client.call("set", name=args.arguments[0], value=_value(args.arguments[1]))
+        elif args.command == "watch":
+            client.call("subscribe", rate_hz=int(args.arguments[0]) if args.arguments else 30)
+            while True:
+                print(json.dumps(client.event()))
+        elif args.command == "bench":
+            count = int(args.arguments[0]) if args.arguments else 1000
+            for name, samples in measure_round_trips(client, count).items():
+                samples.sort()
+                print(f"{name:<6} p50 {samples[len(samples) // 2] / 1000:.0f}us  "
+                      f"p99 {samples[int(len(samples) * 0.99)] / 1000:.0f}us  max {samples[-1] / 1000:.0f}us")
+            return 0
+        else:
+            result = client.call(args.command)
+        print(json.dumps(result, indent=4))
+    except (ControlError, IndexError) as e:
+        print(f"Error: {e or 'missing argument'}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import os
+import stat
+import threading
+
+from profile_store import ProfileError
+from steering_engine import SteeringConfig
+
+DEFAULT_SUBSCRIBE_HZ = 60
+MAX_SUBSCRIBE_HZ = 1000
+
+
+class ControlError(Exception):
+    pass
+
+
+# "unix:PATH" (or anything with a slash) for a Unix socket, "[HOST:]PORT"
+# for TCP; HOST defaults to 127.0.0.1
+def parse_address(text):
+    if text.startswith("unix:"):
+        return ("unix", text[len("unix:"):])
+    if "/" in text:
+        return ("unix", text)
+    host, _, port = text.rpartition(":")
+    try:
+        return ("tcp", host or "127.0.0.1", int(port))
+    except ValueError:
+        raise ControlError(f"Invalid control address '{text}', use unix:PATH or [HOST:]PORT")
+
+
+# Profile and parameter changes from outside the GUI.
+#
+# Works on the profile store's selected profile and hands every change
+# straight to the engine (an EngineRunner or EngineProcess), so it applies
+# on the next tick; on_change(profile) then lets a GUI bring its widgets up
+# to date on its own thread. seats names the profile of each extra seat the
+# engine runs; those on the changed profile follow along, as in the GUI.
+#
+# With profile given it works on that one instead and select only switches
+# it here, leaving the store's selection (the GUI's next profile) alone.
+class SteeringController:
+    def __init__(self, store, engine, key_mask=None, on_change=None, seats=(), profile=None):
+        self.store = store
+        self.engine = engine
+        self.key_mask = key_mask
+        self.on_change = on_change
+        self.seats = list(seats)
+        self.profile = profile
+
+    # The profile changes go to
+    @property
+    def selected(self):
+        return self.profile if self.profile is not None else self.store.selected
+
+    def profiles(self):
+        return {"profiles": self.store.names(), "selected": self.selected}
+
+    def select(self, name):
+        if not self.store.exists(name):
+            raise ControlError(f"No profile named '{name}'")
+        self._apply(name, self.store.load(name))
+        if self.profile is not None:
+            self.profile = name
+        else:
+            self.store.select(name)
+        self._changed(name)
+        return name
+
+    # One parameter of the selected profile, or all of them
+    def get(self, name=None):
+        settings = self.store.load(self.selected)
+        if name is None:
+            return settings
+        if name not in settings:
+            raise ControlError(f"Unknown parameter '{name}'")
+        return settings[name]
+
+    # Change one parameter of the selected profile and save it
+    def set(self, name, value):
+        profile = self.selected
+        settings = self.store.load(profile)
+        if name not in settings:
+            raise ControlError(f"Unknown parameter '{name}'")
+        current = settings[name]
+        numbers = (int, float)
+        if type(value) is not type(current) and not (isinstance(current, numbers) and isinstance(value, numbers)):
+            raise ControlError(f"'{name}' must be {type(current).__name__}, got {type(value).__name__}")
+        settings[name] = value
+        if name + "_codes" in settings:
+            settings[name + "_codes"] = []  # Resolved for the old key; the new name is looked up instead
+        self._apply(profile, settings)
+        self.store.save(profile, settings)
+        self._changed(profile)
+        return value
+
+    def state(self):
+        return dict(self.engine.tick_state(), profile=self.selected)
+
+    def stats(self):
+        stats = self.engine.stats
+        return {"status": self.engine.report(), "stats": stats.snapshot() if stats is not None and stats.enabled else {}}
+
+    def _apply(self, profile, settings):
+        config = SteeringConfig.from_settings(settings, self.key_mask)
+        self.engine.reload(config)
+        if "tick_rate" in settings:
+            self.engine.set_rate(settings["tick_rate"])
+        for seat, seat_profile in enumerate(self.seats):
+            if seat_profile == profile:
+                self.engine.reload_seat(seat, config)
+
+    def _changed(self, profile):
+        if self.on_change is not None:
+            self.on_change(profile)
+
+
+# Local control server: JSON lines over a Unix socket or a TCP port.
+#
+# Each request is one JSON object per line with "cmd", an optional "id" and
+# the command's arguments; the reply carries the same id, "ok" and either
+# "result" or "error". After subscribe the connection also receives
+# {"event": "state", ...} lines, one per new tick at up to rate_hz, until
+# unsubscribe.
+#
+#   ping                     "pong"
+#   profiles                 profile names and the selected one
+#   select    name           switch to another profile
+#   get       [name]         one parameter of the selected profile, or all
+#   set       name, value    change a parameter of the selected profile
+#   state                    live axis values of the last tick
+#   stats                    status line and loop histograms
+#   subscribe [rate_hz]      start the state stream
+#   unsubscribe              stop it
+#
+# The server runs an asyncio loop in its own thread.
+class ControlServer:
+    def __init__(self, controller, address):
+        self.controller = controller
+        self.address = parse_address(address)
+        self.requests = 0
+        self.clients = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._error = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._started.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="control-server", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            raise ControlError(f"Couldn't start the control server: {self._error}")
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._thread = None
+
+    # Where clients can connect, with the actual port if 0 was asked for
+    def bound_address(self):
+        if self.address[0] == "unix":
+            return f"unix:{self.address[1]}"
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"{host}:{port}"
+
+    def _run(self):
+        loop = self._loop = asyncio.new_event_loop()
+        try:
+            self._server = loop.run_until_complete(self._listen())
+        except OSError as e:
+            self._error = e
+            loop.close()
+            self._started.set()
+            return
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            loop.run_until_complete(self._server.wait_closed())
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+            if self.address[0] == "unix":
+                self._remove_socket()
+
+    async def _listen(self):
+        if self.address[0] == "unix":
+            self._remove_socket()  # Left over from a run that didn't shut down
+            return await asyncio.start_unix_server(self._serve, self.address[1])
+        return await asyncio.start_server(self._serve, self.address[1], self.address[2])
+
+    def _remove_socket(self):
+        try:
+            if stat.S_ISSOCK(os.stat(self.address[1]).st_mode):
+                os.remove(self.address[1])
+        except OSError:
+            pass
+
+    async def _serve(self, reader, writer):
+        self.clients += 1
+        stream = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    command = request.get("cmd")
+                    if command == "subscribe":
+                        rate_hz = max(1, min(int(request.get("rate_hz", DEFAULT_SUBSCRIBE_HZ)), MAX_SUBSCRIBE_HZ))
+                        if stream is not None:
+                            stream.cancel()
+                        stream = asyncio.ensure_future(self._stream(writer, rate_hz))
+                        result = {"rate_hz": rate_hz}
+                    elif command == "unsubscribe":
+                        if stream is not None:
+                            stream.cancel()
+                        stream = result = None
+                    else:
+                        result = self._handle(command, request)
+                    reply = {"id": request_id, "ok": True, "result": result}
+                except (ControlError, ProfileError, ValueError, TypeError, AttributeError) as e:
+                    reply = {"id": request_id, "ok": False, "error": str(e)}
+                self.requests += 1
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if stream is not None:
+                stream.cancel()
+            writer.close()
+            self.clients -= 1
+
+    def _handle(self, command, request):
+        controller = self.controller
+        if command == "ping":
+            return "pong"
+        if command == "profiles":
+            return controller.profiles()
+        if command == "select":
+            if "name" not in request:
+                _missing("name")
+            return controller.select(request["name"])
+        if command == "get":
+            return controller.get(request.get("name"))
+        if command == "set":
+            if "name" not in request or "value" not in request:
+                _missing("name and value")
+            return controller.set(request["name"], request["value"])
+        if command == "state":
+            return controller.state()
+        if command == "stats":
+            return controller.stats()
+        raise ControlError(f"Unknown command '{command}'")
+
+    # Push the state of every new tick, at most rate_hz times a second
+    async def _stream(self, writer, rate_hz):
+        period = 1.0 / rate_hz
+        last_ticks = None
+        try:
+            while True:
+                state = self.controller.state()
+                if state["ticks"] != last_ticks:
+                    last_ticks = state["ticks"]
+                    writer.write(json.dumps(dict(state, event="state")).encode() + b"\n")
+                    await writer.drain()
+                await asyncio.sleep(period)
+        except ConnectionError:
+            pass
+
+    def report(self):
+        return f"control {self.bound_address()}: {self.clients} clients, {self.requests} requests"
+
+
+def _missing(what):
+    raise ControlError(f"Missing {what}")
@@ -0,0 +1,528 @@
+import gc
+import json
+import os
+import pickle
+import struct
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+from engine_runner import STATE_DEAD, STATE_STOPPED, EngineControl, EngineRunner
+from input_trace import TraceRecorder
+from key_input import KeyState
+from mouse_input import EvdevMouse, MouseError
+from output_sinks import AXES, OutputError, create_sink
+from sample_ring import SharedSampleRing
+from steering_bank import SteeringBank
+from steering_engine import SteeringEngine
+from telemetry import DEFAULT_CAPACITY, TelemetryError, TelemetryWriter
+from tick_scheduler import raise_process_priority
+from tick_stats import TickStats
+
+# Sizes of the regions of the shared segment
+REPORT_BYTES = 64 * 1024
+QUEUE_BYTES = 4 * 1024 * 1024
+SAMPLE_CAPACITY = 16384
+
+# How often the engine process publishes its status report
+REPORT_SECONDS = 0.25
+
+# How long start() waits for the engine process to open its devices
+START_SECONDS = 10.0
+
+# Problems kept in the status report for the GUI to pick up
+MAX_PROBLEMS = 10
+
+_SEQUENCE = struct.Struct("<Q")
+_COUNTER = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+
+# A seqlock reader gives up waiting for a writer after this many tries and
+# falls back to the last payload it read whole; the writer may have died
+# halfway through a write
+SEQLOCK_RETRIES = 10000
+
+# Messages only the latest of which matters; while one is still in the
+# queue, newer ones wait and replace each other instead of piling up. Any
+# other message sends the waiting ones first, so the engine applies
+# everything in the order it was sent.
+COALESCED_MESSAGES = ("config", "rate", "seat")
+
+_AXIS_INDEX = {axis: index for index, axis in enumerate(AXES)}
+
+
+class EngineError(Exception):
+    pass
+
+
+# Single-writer seqlock over a region of a shared buffer.
+#
+# The writer makes the sequence number odd, writes the payload and makes it
+# even again; a reader copies the payload and retries if the number was odd
+# or changed in the meantime. The writer never waits for readers and readers
+# never see a half-written payload.
+class Seqlock:
+    def __init__(self, buffer, offset):
+        self.buffer = buffer
+        self.offset = offset
+        self.payload = offset + _SEQUENCE.size
+        (self._sequence,) = _SEQUENCE.unpack_from(buffer, offset)
+        self._last = None
+
+    def write(self, layout, *values):
+        self.begin()
+        layout.pack_into(self.buffer, self.payload, *values)
+        self.end()
+
+    # A write in several parts: begin(), any pack_into() calls on the
+    # payload, end()
+    def begin(self):
+        _SEQUENCE.pack_into(self.buffer, self.offset, self._sequence + 1)
+
+    def end(self):
+        self._sequence += 2
+        _SEQUENCE.pack_into(self.buffer, self.offset, self._sequence)
+
+    def read(self, layout):
+        buffer, offset, payload = self.buffer, self.offset, self.payload
+        for _ in range(SEQLOCK_RETRIES):
+            (before,) = _SEQUENCE.unpack_from(buffer, offset)
+            if not before & 1:
+                values = layout.unpack_from(buffer, payload)
+                if _SEQUENCE.unpack_from(buffer, offset)[0] == before:
+                    self._last = values
+                    return values
+            time.sleep(0)
+        if self._last is None:
+            return layout.unpack_from(buffer, payload)  # Nothing better to go on
+        return self._last
+
+
+# Live engine state, published by the loop after every tick
+class SharedEngineState:
+    # heartbeat_ns, ticks, x, output, axis count, then (index into AXES, value)
+    # per axis
+    _FIELDS = "<qQddB"
+    SIZE = _SEQUENCE.size + struct.calcsize(_FIELDS + "Bd" * len(AXES))
+    _HEADER = struct.Struct(_FIELDS)
+    _AXIS = struct.Struct("<Bd")
+
+    def __init__(self, buffer, offset):
+        self._lock = Seqlock(buffer, offset)
+        self._layouts = [struct.Struct(self._FIELDS + "Bd" * count) for count in range(len(AXES) + 1)]
+
+    # Packed field by field straight into the segment, so publishing builds
+    # no list or argument tuple
+    def publish(self, heartbeat_ns, ticks, state):
+        lock = self._lock
+        buffer = lock.buffer
+        offset = lock.payload
+        axis_values = state.axis_values
+        lock.begin()
+        self._HEADER.pack_into(buffer, offset, heartbeat_ns, ticks, state.x, state.output, len(axis_values))
+        offset += self._HEADER.size
+        for axis, value in axis_values:
+            self._AXIS.pack_into(buffer, offset, _AXIS_INDEX[axis], value)
+            offset += self._AXIS.size
+        lock.end()
+
+    def read(self):
+        heartbeat_ns, ticks, x, output, count, *pairs = self._lock.read(self._layouts[-1])
+        axis_values = [[AXES[pairs[2 * i]], pairs[2 * i + 1]] for i in range(count)]
+        return {"heartbeat_ns": heartbeat_ns, "ticks": ticks, "x": x, "output": output, "axis_values": axis_values}
+
+
+# Status report of the engine process as JSON, published a few times a second
+class SharedReport:
+    def __init__(self, buffer, offset, size):
+        self._lock = Seqlock(buffer, offset)
+        self.capacity = size - _SEQUENCE.size - _LENGTH.size
+        self._full = struct.Struct(f"<I{self.capacity}s")
+
+    def write(self, report):
+        data = json.dumps(report).encode()
+        if len(data) > self.capacity:
+            raise ValueError(f"engine report of {len(data)} bytes doesn't fit in {self.capacity}")
+        self._lock.write(struct.Struct(f"<I{len(data)}s"), len(data), data)
+
+    def read(self):
+        length, data = self._lock.read(self._full)
+        return json.loads(data[:length]) if length else {}
+
+
+# Lock-free single-producer, single-consumer message queue in a shared
+# buffer. Messages are pickled into a byte ring behind two counters of bytes
+# ever written (only the producer moves it) and read (only the consumer
+# moves it), so neither side ever waits for the other.
+#
+# The consuming side looks like a deque (truthy when not empty, popleft()),
+# so EngineRunner can use it as its message queue as it is.
+class MessageQueue:
+    def __init__(self, buffer, offset, size):
+        self.buffer = buffer
+        self._head = offset
+        self._tail = offset + _COUNTER.size
+        self._data = offset + 2 * _COUNTER.size
+        self.capacity = size - 2 * _COUNTER.size
+
+    def __bool__(self):
+        return _COUNTER.unpack_from(self.buffer, self._head)[0] != _COUNTER.unpack_from(self.buffer, self._tail)[0]
+
+    # Returns the position the consumer is past once it took the message
+    def append(self, message):
+        payload = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        record = _LENGTH.pack(len(payload)) + payload
+        (head,) = _COUNTER.unpack_from(self.buffer, self._head)
+        (tail,) = _COUNTER.unpack_from(self.buffer, self._tail)
+        if len(record) > self.capacity - (head - tail):
+            raise EngineError("engine message queue is full")
+        self._copy_in(head, record)
+        # Publish only once the record is in place
+        _COUNTER.pack_into(self.buffer, self._head, head + len(record))
+        return head + len(record)
+
+    def taken(self, position):
+        return _COUNTER.unpack_from(self.buffer, self._tail)[0] >= position
+
+    def popleft(self):
+        (head,) = _COUNTER.unpack_from(self.buffer, self._head)
+        (tail,) = _COUNTER.unpack_from(self.buffer, self._tail)
+        if head == tail:
+            raise IndexError("pop from an empty queue")
+        (length,) = _LENGTH.unpack(self._copy_out(tail, _LENGTH.size))
+        message = pickle.loads(self._copy_out(tail + _LENGTH.size, length))
+        _COUNTER.pack_into(self.buffer, self._tail, tail + _LENGTH.size + length)
+        return message
+
+    # Records wrap around the end of the ring
+    def _copy_in(self, position, data):
+        start = self._data + position % self.capacity
+        first = min(len(data), self._data + self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[self._data:self._data + len(data) - first] = data[first:]
+
+    def _copy_out(self, position, size):
+        start = self._data + position % self.capacity
+        first = min(size, self._data + self.capacity - start)
+        return bytes(self.buffer[start:start + first]) + bytes(self.buffer[self._data:self._data + size - first])
+
+
+# The shared memory segment between the GUI and the engine process: live
+# engine state, status report, axis samples for the plot and the message
+# queue, back to back.
+class EngineShared:
+    SIZE = SharedEngineState.SIZE + REPORT_BYTES + SharedSampleRing.size(SAMPLE_CAPACITY) + QUEUE_BYTES
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.name = memory.name
+        buffer = memory.buf
+        offset = 0
+        self.state = SharedEngineState(buffer, offset)
+        offset += -(-SharedEngineState.SIZE // 8) * 8
+        self.report = SharedReport(buffer, offset, REPORT_BYTES)
+        offset += REPORT_BYTES
+        size = SharedSampleRing.size(SAMPLE_CAPACITY)
+        self.samples = SharedSampleRing(buffer[offset:offset + size], SAMPLE_CAPACITY)
+        offset += size
+        self.messages = MessageQueue(buffer, offset, QUEUE_BYTES)
+
+    @classmethod
+    def create(cls):
+        return cls(shared_memory.SharedMemory(create=True, size=cls.SIZE + 8))
+
+    # Attach to a segment the parent created. The parent owns it; keep this
+    # process's resource tracker from removing it when we exit.
+    @classmethod
+    def attach(cls, name):
+        memory = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory)
+
+    def close(self, unlink=False):
+        # Views into the buffer have to go before it can be released
+        self.state = self.report = self.samples = self.messages = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+# TickStats of the GUI process: the loop's histograms come from the engine
+# process's report, the GUI refresh one is recorded here
+class RemoteTickStats(TickStats):
+    def __init__(self, report, enabled=True):
+        super().__init__(enabled=enabled)
+        self._report = report
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot.update(self._report.read().get("stats", {}))
+        return snapshot
+
+
+# Runs the steering loop (an EngineRunner) in a child process with raised
+# priority, so Tk and matplotlib in this process can't hold it up through
+# the GIL or garbage collection.
+#
+# The child hooks the keyboard and owns the output devices. Settings reach
+# it through the shared message queue, the same messages EngineRunner takes;
+# its state, samples and status come back through shared memory. Closing the
+# child's stdin stops it, which also happens if this process dies.
+#
+# With keyboard=False the child doesn't hook the keyboard and the wheel
+# stays centered, which is enough to benchmark the loop itself. mouse is
+# the evdev device for mouse steering ("" for the first mouse found), or
+# None to leave the mouse alone. telemetry is the path of a telemetry ring
+# file the loop writes every tick to, for telemetry.TelemetryReader.
+class EngineProcess(EngineControl):
+    def __init__(self, config, output=None, seat_configs=(), rate_hz=100, instrumentation=True,
+                 record_trace=None, raise_priority=False, on_problem=None, keyboard=True, mouse=None,
+                 telemetry=None, telemetry_capacity=DEFAULT_CAPACITY):
+        self.config = config
+        self.on_problem = on_problem  # Called from the monitor thread with a message
+        self.telemetry_path = telemetry
+        self._options = {
+            "output": output, "seat_configs": list(seat_configs), "rate_hz": rate_hz,
+            "instrumentation": instrumentation, "record_trace": record_trace, "raise_priority": raise_priority,
+            "keyboard": keyboard, "mouse": mouse, "telemetry": telemetry, "telemetry_capacity": telemetry_capacity,
+        }
+        self.shared = EngineShared.create()
+        self.samples = self.shared.samples
+        self.stats = RemoteTickStats(self.shared.report, enabled=instrumentation)
+        self._send_lock = threading.Lock()  # Several threads of this process may send
+        self._queued = {}  # Queue position of the last coalesced message sent, per kind (and seat)
+        self._held = {}  # Coalesced messages waiting for the consumer to take the one before
+        self._process = None
+        self._monitor = None
+        self._problems_seen = 0
+
+    # Start the engine process and wait until its devices are open; raises
+    # EngineError with the reason if that fails
+    def start(self):
+        if self.running():
+            return
+        # Nobody consumes the queue while the engine process is down; what was
+        # sent meanwhile is already in the options and config
+        with self._send_lock:
+            while self.shared.messages:
+                self.shared.messages.popleft()
+            self._queued.clear()
+            self._held.clear()
+            self.shared.messages.append(("init", dict(self._options, config=self.config)))
+        self._problems_seen = 0
+        self._process = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.shared.name],
+                                         stdin=subprocess.PIPE)
+        deadline = time.monotonic() + START_SECONDS
+        while True:
+            report = self.shared.report.read()
+            if "error" in report:
+                self._process.wait()
+                raise EngineError(report["error"])
+            if "state" in report:
+                break
+            if self._process.poll() is not None:
+                raise EngineError(f"Engine process exited with code {self._process.returncode}")
+            if time.monotonic() > deadline:
+                self.stop()
+                raise EngineError("Engine process did not start")
+            time.sleep(0.01)
+        self._monitor = threading.Thread(target=self._watch, name="engine-process-monitor", daemon=True)
+        self._monitor.start()
+
+    # Stop the loop, leaving the wheel centered, and end the engine process
+    def stop(self, timeout=2.0):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        process.stdin.close()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    # Stop and free the shared memory; the object is unusable afterwards
+    def close(self):
+        self.stop()
+        self.samples = None
+        self.stats = TickStats(enabled=False)
+        self.shared.close(unlink=True)
+
+    # Settings are also kept for the next start()
+    def set_rate(self, rate_hz):
+        self._options["rate_hz"] = rate_hz
+        super().set_rate(rate_hz)
+
+    def reload_seat(self, seat, config):
+        self._options["seat_configs"][seat] = config
+        super().reload_seat(seat, config)
+
+    def running(self):
+        return self._process is not None and self._process.poll() is None
+
+    # Messages to a stopped or dead engine process are dropped: nothing reads
+    # them, and the next start() hands it the current config and options
+    def _send(self, kind, payload):
+        if not self.running():
+            return
+        with self._send_lock:
+            if kind in COALESCED_MESSAGES:
+                self._held[(kind, payload[0]) if kind == "seat" else kind] = (kind, payload)
+                self._release()
+            else:
+                self._release(everything=True)
+                self.shared.messages.append((kind, payload))
+
+    # Send the held messages whose previous one the engine process took by
+    # now, or all of them
+    def _release(self, everything=False):
+        messages = self.shared.messages
+        for key, message in list(self._held.items()):
+            position = self._queued.get(key)
+            if everything or position is None or messages.taken(position):
+                self._queued[key] = messages.append(message)
+                del self._held[key]
+
+    # Latest tick: heartbeat_ns, ticks, x, output and axis_values
+    def tick_state(self):
+        return self.shared.state.read()
+
+    def health(self):
+        if self._process is not None and self._process.poll() is not None:
+            return f"engine process exited ({self._process.returncode})"
+        return self.shared.report.read().get("state", STATE_STOPPED)
+
+    # Status line of the engine process: loop health, tick rate and output device
+    def report(self):
+        if self._process is None or self._process.poll() is not None:
+            return self.health()
+        return self.shared.report.read().get("status", "")
+
+    # Pass problems the engine process ran into on to on_problem, and notice
+    # when it goes away on its own
+    def _watch(self):
+        process = self._process
+        while process is self._process:
+            time.sleep(REPORT_SECONDS)
+            with self._send_lock:
+                try:
+                    self._release()
+                except EngineError as e:
+                    self._report(str(e))
+            report = self.shared.report.read()
+            count = report.get("problem_count", 0)
+            if count > self._problems_seen:
+                for message in report.get("problems", [])[-(count - self._problems_seen):]:
+                    self._report(message)
+                self._problems_seen = count
+            if process is self._process and process.poll() is not None:
+                self._report(f"Engine process exited with code {process.returncode}")
+                return
+
+    def _report(self, message):
+        if self.on_problem is not None:
+            self.on_problem(message)
+
+
+def _status(runner, stats, problems):
+    report = {"state": runner.state, "status": runner.report(), "problem_count": len(problems),
+              "problems": problems[-MAX_PROBLEMS:]}
+    if runner.state == STATE_DEAD:
+        report["status"] = runner.health()
+    if stats.enabled:
+        report["stats"] = {name: summary for name, summary in stats.snapshot().items() if name != "gui_refresh"}
+    return report
+
+
+# Body of the engine process: open the devices, run the loop, and publish a
+# status report until the parent closes our stdin
+def serve(name):
+    shared = EngineShared.attach(name)
+    _, options = shared.messages.popleft()
+    try:
+        sink = create_sink(options["output"])
+        seat_sinks = [create_sink(options["output"], seat=seat) for seat in range(1, len(options["seat_configs"]) + 1)]
+    except OutputError as e:
+        shared.report.write({"error": str(e)})
+        shared.close()
+        return 1
+
+    keys = KeyState()
+    recorder = None
+    if options["record_trace"]:
+        recorder = keys.observer = TraceRecorder(options["record_trace"])
+    stats = TickStats(enabled=options["instrumentation"])
+    problems = []
+    # Without the mouse the keys still steer, so that's only worth a warning
+    mouse = None
+    if options["mouse"] is not None:
+        mouse = EvdevMouse(options["mouse"] or None)
+        try:
+            mouse.start()
+        except MouseError as e:
+            problems.append(f"Mouse steering off: {e}")
+            mouse = None
+    telemetry = None
+    if options["telemetry"]:
+        try:
+            telemetry = TelemetryWriter(options["telemetry"], options["telemetry_capacity"])
+        except TelemetryError as e:
+            problems.append(f"Telemetry off: {e}")
+    runner = EngineRunner(
+        SteeringEngine(options["config"]), keys, sink,
+        rate_hz=options["rate_hz"],
+        stats=stats, samples=shared.samples, recorder=recorder,
+        raise_priority=options["raise_priority"],
+        on_problem=problems.append,
+        seats=SteeringBank(options["seat_configs"]) if options["seat_configs"] else None, seat_sinks=seat_sinks,
+        messages=shared.messages, shared=shared.state, mouse=mouse, telemetry=telemetry,
+    )
+    if options["raise_priority"]:
+        raise_process_priority()
+    # Everything built so far lives as long as the process; moving it out of
+    # the collector's generations keeps any collection that still happens
+    # from walking it while the loop runs
+    gc.freeze()
+    try:
+        if options["keyboard"]:
+            keys.start()
+    except Exception as e:
+        shared.report.write({"error": f"Couldn't hook the keyboard: {e!r}"})
+        shared.close()
+        return 1
+    runner.start()
+    shared.report.write(_status(runner, stats, problems))
+
+    # EOF on stdin: the parent asked us to stop, or is gone
+    parent_gone = threading.Event()
+
+    def wait_for_parent():
+        sys.stdin.buffer.read()
+        parent_gone.set()
+    threading.Thread(target=wait_for_parent, name="engine-parent", daemon=True).start()
+    while not parent_gone.wait(REPORT_SECONDS):
+        shared.report.write(_status(runner, stats, problems))
+
+    runner.stop()
+    if options["keyboard"]:
+        keys.stop()
+    if mouse is not None:
+        mouse.stop()
+    if telemetry is not None:
+        telemetry.close()
+    sink.close()
+    for seat_sink in seat_sinks:
+        seat_sink.close()
+    if recorder is not None:
+        recorder.close()
+    shared.report.write(_status(runner, stats, problems))
+    shared.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(serve(sys.argv[1]))
@@ -0,0 +1,279 @@
+import collections
+import threading
+import time
+
+from steering_engine import SteeringInputs
+from tick_scheduler import TickScheduler, raise_thread_priority
+
+# A tick that hasn't completed for this long counts as a stall
+DEFAULT_STALL_SECONDS = 0.25
+
+STATE_STOPPED = "stopped"
+STATE_RUNNING = "running"
+STATE_PAUSED = "paused"
+STATE_DEAD = "dead"
+
+
+# Messages applied by the steering loop at the start of its next tick.
+#
+# Shared by EngineRunner, where the loop is a thread of this process, and
+# EngineProcess, where it runs in a child process; subclasses provide
+# _send(kind, payload).
+class EngineControl:
+    # Stop stepping and center the wheel until resume()
+    def pause(self):
+        self._send("pause", None)
+
+    def resume(self):
+        self._send("resume", None)
+
+    # Hot-reload a compiled SteeringConfig
+    def reload(self, config):
+        self.config = config
+        self._send("config", config)
+
+    def set_rate(self, rate_hz):
+        self._send("rate", rate_hz)
+
+    # Hot-reload the config of an extra seat
+    def reload_seat(self, seat, config):
+        self._send("seat", (seat, config))
+
+    def recenter(self):
+        self._send("reset", None)
+
+
+# Owns the one and only steering thread.
+#
+# Everything the loop touches is handed in once; the GUI (or any other
+# client) talks to the running loop only through messages, which the loop
+# applies at the start of its next tick. A watchdog thread keeps an eye on
+# the loop's heartbeat and notices stalls and crashes.
+#
+# Extra seats (more virtual devices driven from other profiles) run in a
+# SteeringBank next to the main engine, from the same key snapshot, with
+# one sink per seat.
+#
+# messages can be any deque-like queue (truthy when not empty, popleft()),
+# such as the shared-memory queue of an engine process; shared, if given,
+# gets the engine state published after every tick. mouse, if given, is a
+# started mouse source (mouse_input.EvdevMouse) whose motion since the last
+# tick feeds the steering next to the keys. telemetry, if given (a
+# telemetry.TelemetryWriter), gets a record of every tick.
+class EngineRunner(EngineControl):
+    def __init__(self, engine, keys, sink, rate_hz=100, stats=None, samples=None, recorder=None,
+                 raise_priority=False, stall_seconds=DEFAULT_STALL_SECONDS, on_problem=None,
+                 seats=None, seat_sinks=(), messages=None, shared=None, mouse=None, telemetry=None):
+        self.engine = engine
+        self.keys = keys
+        self.sink = sink
+        self.seats = seats
+        self.seat_sinks = list(seat_sinks)
+        self.stats = stats
+        self.samples = samples
+        self.recorder = recorder
+        self.shared = shared
+        self.mouse = mouse
+        self.telemetry = telemetry
+        self.raise_priority = raise_priority
+        self.scheduler = TickScheduler(rate_hz)
+        self.stall_seconds = stall_seconds
+        self.on_problem = on_problem  # Called from the watchdog thread with a message
+        self.config = engine.config  # Latest config handed to reload()
+
+        self.state = STATE_STOPPED
+        self.error = None
+        self.stalls = 0
+        self.heartbeat_ns = 0
+        self._messages = messages if messages is not None else collections.deque()
+        self._stop = threading.Event()
+        self._resume = threading.Event()
+        self._thread = None
+        self._watchdog = None
+
+    # Lifecycle, safe to call from any thread
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._arm()
+        self._thread = threading.Thread(target=self._run, name="steering-engine", daemon=True)
+        self._thread.start()
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog = threading.Thread(target=self._watch, name="steering-watchdog", daemon=True)
+            self._watchdog.start()
+
+    # Run the loop on the calling thread, without the watchdog, until stop()
+    # (from the scheduler, say); for benchmarks that step the loop themselves
+    def run(self):
+        self._arm()
+        self._run()
+
+    # Stop the loop and leave the wheel centered
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        self._resume.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        if self.state != STATE_DEAD:
+            self.state = STATE_STOPPED
+
+    def resume(self):
+        super().resume()
+        self._resume.set()
+
+    def _arm(self):
+        self._stop.clear()
+        self._resume.set()
+        self.error = None
+        self.state = STATE_RUNNING
+        self.heartbeat_ns = time.perf_counter_ns()
+
+    def _send(self, kind, payload):
+        self._messages.append((kind, payload))
+
+    def _apply_messages(self):
+        while self._messages:
+            kind, payload = self._messages.popleft()
+            if kind == "config":
+                self.engine.config = payload
+            elif kind == "rate":
+                period_ns = self.scheduler.period_ns
+                self.scheduler.set_rate(payload)
+                if self.scheduler.period_ns != period_ns:
+                    self.scheduler.start()
+            elif kind == "seat":
+                self.seats.reload(*payload)
+            elif kind == "reset":
+                self._reset_engine()
+                if self.seats is not None:
+                    self.seats.reset()
+            elif kind == "pause":
+                self.state = STATE_PAUSED
+                self._resume.clear()
+            elif kind == "resume":
+                self.state = STATE_RUNNING
+                self._resume.set()
+
+    # Reset the engine, and the trace with it so a replay stays in step
+    def _reset_engine(self):
+        self.engine.reset()
+        if self.recorder is not None:
+            self.recorder.reset()
+
+    # Steering centered, pedals released
+    def _center(self):
+        self._reset_engine()
+        self.sink.set_axes(self.engine.state.axis_values)
+        if self.seats is not None:
+            self.seats.reset()
+            for seat_sink, values in zip(self.seat_sinks, self.seats.axis_values):
+                seat_sink.set_axes(values)
+
+    def _run(self):
+        if self.raise_priority:
+            raise_thread_priority()
+        engine, keys, sink = self.engine, self.keys, self.sink
+        stats, samples, recorder, shared = self.stats, self.samples, self.recorder, self.shared
+        mouse, telemetry = self.mouse, self.telemetry
+        seats, seat_sinks = self.seats, self.seat_sinks
+        scheduler = self.scheduler
+        inputs = SteeringInputs()
+        clock = time.perf_counter_ns
+        scheduler.start()
+        try:
+            while not self._stop.is_set():
+                # Wait for the next tick; dt is the real time since the last one
+                dt = scheduler.wait()
+                tick_start = clock()
+                self.heartbeat_ns = tick_start
+
+                if self._messages:
+                    self._apply_messages()
+                    if self.state == STATE_PAUSED:
+                        self._center()
+                        while not self._resume.wait(0.1):
+                            self.heartbeat_ns = clock()
+                            if self._messages:
+                                self._apply_messages()
+                        scheduler.start()
+                        continue
+
+                config = engine.config
+                if recorder is not None:
+                    recorder.config(config)
+
+                # One profile snapshot and one pressed-key snapshot per tick
+                pressed = keys.snapshot()
+                config.read_inputs(pressed, inputs)
+                if mouse is not None:
+                    inputs.mouse_dx = mouse_dx = mouse.take()
+                    if recorder is not None and mouse_dx:
+                        recorder.mouse(mouse_dx)
+                output = engine.step(inputs, dt)
+                if seats is not None:
+                    seats.step(pressed, dt)
+
+                # All axes in one device update, and only when a quantized value changed
+                write_start = clock()
+                sink.set_axes(engine.state.axis_values)
+                if seats is not None:
+                    for seat in seats.changed:
+                        seat_sinks[seat].set_axes(seats.axis_values[seat])
+                if stats is not None:
+                    stats.record_tick(tick_start, write_start, clock(), keys.last_press_ns)
+                if telemetry is not None:
+                    telemetry.write(tick_start, clock() - tick_start, inputs, engine.state)
+
+                if recorder is not None:
+                    recorder.tick(dt, output)
+                # Hand the position to the plot; drawing happens on the Tk thread
+                if samples is not None:
+                    samples.push(tick_start / 1e9, engine.state.x)
+                if shared is not None:
+                    shared.publish(tick_start, scheduler.ticks, engine.state)
+            self._center()
+        except Exception as e:
+            self.error = e
+            self.state = STATE_DEAD
+            raise
+
+    def _watch(self):
+        stalled = False
+        while self._thread is not None or self.state == STATE_DEAD:
+            time.sleep(self.stall_seconds / 2)
+            if self.state == STATE_DEAD:
+                self._report(f"Steering loop died: {self.error!r}")
+                return
+            if self.state != STATE_RUNNING:
+                continue
+            late = (time.perf_counter_ns() - self.heartbeat_ns) / 1e9
+            if late > self.stall_seconds and not stalled:
+                stalled = True
+                self.stalls += 1
+                self._report(f"Steering loop stalled for {late * 1000:.0f} ms")
+            elif late <= self.stall_seconds:
+                stalled = False
+
+    def _report(self, message):
+        if self.on_problem is not None:
+            self.on_problem(message)
+
+    # Latest tick, as EngineProcess.tick_state() gives it; read from another
+    # thread, so values may be from two neighbouring ticks
+    def tick_state(self):
+        state = self.engine.state
+        return {"heartbeat_ns": self.heartbeat_ns, "ticks": self.scheduler.ticks, "x": state.x, "output": state.output,
+                "axis_values": [list(pair) for pair in state.axis_values]}
+
+    # Short human-readable state for the status line
+    def health(self):
+        if self.state == STATE_DEAD:
+            return f"engine dead ({self.error!r})"
+        return f"engine {self.state}, {self.stalls} stalls"
+
+    # Status line: loop health, tick rate, output device and mouse
+    def report(self):
+        mouse = f" | {self.mouse.report()}" if self.mouse is not None else ""
+        return f"{self.health()} | {self.scheduler.report()} | {self.sink.report()}{mouse}"
@@ -0,0 +1,160 @@
+import argparse
+import gc
+import signal
+import sys
+import threading
+
+from engine_runner import STATE_DEAD, EngineRunner
+from key_input import KeyState
+from mouse_input import EvdevMouse, MouseError, mouse_device
+from output_sinks import SINKS, OutputError, create_sink
+from profile_store import DEFAULT_PROFILE, DEFAULT_SETTINGS, DEFAULT_STORE_PATH, ProfileStore
+from steering_engine import SteeringConfig, SteeringEngine
+from tick_stats import TickStats
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Wheelmode for Keyboard without the settings window")
+    parser.add_argument("--profile", help="Profile to run (default: the one last selected in the GUI)")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Profile store file")
+    parser.add_argument("--output", choices=list(SINKS), help="Output device (default: profile setting, else vjoy on Windows and uinput on Linux)")
+    parser.add_argument("--seat", action="append", default=[], metavar="PROFILE",
+                        help="Drive one more virtual device (vJoy device 2, 3, ...) from PROFILE; can be given several times")
+    parser.add_argument("--record-trace", metavar="PATH", help="Record key events and steering output to a trace file for input_trace.py")
+    parser.add_argument("--control", metavar="ADDRESS",
+                        help="Accept profile and parameter changes on unix:PATH or [HOST:]PORT (see control_client.py)")
+    parser.add_argument("--mouse", nargs="?", const="", metavar="DEVICE",
+                        help="Read the mouse for mouse steering (default: when the profile steers with it), optionally from an evdev DEVICE")
+    parser.add_argument("--telemetry", metavar="PATH",
+                        help="Write every tick to a telemetry ring file for telemetry.py (default: profile setting)")
+    parser.add_argument("--stats", type=float, default=0, metavar="SECONDS",
+                        help="Print the status line and loop histograms every SECONDS")
+    return parser.parse_args(argv)
+
+
+# Ctrl+C, kill, closing the console window: all end in a normal shutdown
+def _install_signal_handlers(stop):
+    def handler(signum, frame):
+        stop.set()
+    for name in ("SIGINT", "SIGTERM", "SIGHUP", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), handler)
+
+
+# Run the engine from a stored profile until a signal arrives, then center
+# the wheel and close the devices. Only the engine modules are imported;
+# nothing here touches Tk or matplotlib, and numpy only comes in for --seat.
+def main(argv=None):
+    args = _parse_args(argv)
+    store = ProfileStore(args.store, defaults=DEFAULT_SETTINGS)
+    profile = args.profile or store.selected
+    for name in [profile] + args.seat:
+        # Like the GUI, run the defaults when nothing was ever saved
+        if not store.exists(name) and name != DEFAULT_PROFILE:
+            print(f"No profile named '{name}' in {args.store} (have: {', '.join(store.names()) or 'none'})", file=sys.stderr)
+            return 2
+    # The GUI's selection stays as it is; --profile only picks what runs here
+    settings = store.load(profile)
+
+    keys = KeyState()
+    try:
+        sink = create_sink(args.output or settings["output"])
+        seat_sinks = [create_sink(args.output or settings["output"], seat=seat) for seat in range(1, len(args.seat) + 1)]
+    except OutputError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    seats = None
+    if args.seat:
+        from steering_bank import SteeringBank
+        seats = SteeringBank([SteeringConfig.from_settings(store.load(name), keys.mask) for name in args.seat])
+    recorder = None
+    if args.record_trace:
+        from input_trace import TraceRecorder
+        recorder = keys.observer = TraceRecorder(args.record_trace)
+    mouse = None
+    device = args.mouse if args.mouse is not None else mouse_device(settings)
+    if device is not None:
+        mouse = EvdevMouse(device or None)
+        try:
+            mouse.start()
+        except MouseError as e:
+            print(f"Mouse steering off: {e}", file=sys.stderr)
+            mouse = None
+    telemetry = None
+    telemetry_path = args.telemetry or settings["telemetry_path"]
+    if telemetry_path:
+        from telemetry import TelemetryError, TelemetryWriter
+        try:
+            telemetry = TelemetryWriter(telemetry_path, settings["telemetry_capacity"])
+        except TelemetryError as e:
+            print(f"Telemetry off: {e}", file=sys.stderr)
+
+    stop = threading.Event()
+    runner = EngineRunner(
+        SteeringEngine(SteeringConfig.from_settings(settings, keys.mask)), keys, sink,
+        rate_hz=settings["tick_rate"],
+        stats=TickStats(enabled=settings["instrumentation"]), recorder=recorder,
+        raise_priority=settings["raise_thread_priority"],
+        on_problem=lambda message: print(message, file=sys.stderr),
+        seats=seats, seat_sinks=seat_sinks, mouse=mouse, telemetry=telemetry,
+    )
+
+    control_server = None
+    control_address = args.control or settings["control_address"]
+    if control_address:
+        from control_server import ControlError, ControlServer, SteeringController
+        controller = SteeringController(store, runner, keys.mask, on_change=lambda name: print(f"Profile '{name}' changed"),
+                                        seats=args.seat, profile=profile)
+        control_server = ControlServer(controller, control_address)
+
+    _install_signal_handlers(stop)
+    status = 0
+    try:
+        try:
+            keys.start()
+        except Exception as e:
+            print(f"Couldn't hook the keyboard: {e!r}", file=sys.stderr)
+            return 1
+        gc.freeze()  # Startup objects stay for good; keep collections off them
+        runner.start()
+        if control_server is not None:
+            try:
+                control_server.start()
+                print(f"Control server on {control_server.bound_address()}")
+            except ControlError as e:
+                print(e, file=sys.stderr)
+                control_server = None
+        print(f"Running profile '{profile}' at {runner.scheduler.rate_hz} Hz, Ctrl+C to stop")
+
+        # Signals only interrupt the main thread, so it waits here in short steps
+        interval = args.stats if args.stats > 0 else 0.5
+        while not stop.wait(interval):
+            if runner.state == STATE_DEAD:
+                status = 1
+                break
+            if args.stats > 0:
+                print(runner.report())
+                if runner.stats.enabled:
+                    print(runner.stats.report())
+    finally:
+        if control_server is not None:
+            control_server.stop()
+        runner.stop()  # Centers the wheel on the way out
+        keys.stop()
+        if mouse is not None:
+            mouse.stop()
+        sink.close()
+        for seat_sink in seat_sinks:
+            seat_sink.close()
+        if recorder is not None:
+            recorder.close()
+        if telemetry is not None:
+            telemetry.close()
+        store.writer.close()
+    print("Stopped, wheel centered")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
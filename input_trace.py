@@ -0,0 +1,323 @@
+import argparse
+import dataclasses
+import struct
+import sys
+import threading
+import time
+
+from key_input import KeyState
+from output_filters import FILTER_TYPES, FilterSpec
+from response_curve import ResponseCurve
+from steering_engine import STACKING_MODES, SteeringConfig, SteeringEngine, SteeringInputs
+
+# Trace files start with this magic; everything after it is a stream of
+# records, each a one-byte type followed by a fixed or length-prefixed body.
+MAGIC = b"WMFKTRC1"
+
+RECORD_KEY = 1        # t_ns, scan code, down
+RECORD_SNAPSHOT = 2   # t_ns; the engine read the pressed keys here
+RECORD_TICK = 3       # dt, curved output of the tick
+RECORD_CONFIG = 4     # length-prefixed packed SteeringConfig
+RECORD_MOUSE = 5      # mouse counts the next tick takes
+RECORD_RESET = 6      # the engine was reset (pause, recenter, stop)
+
+_KEY = struct.Struct("<BqHB")
+_SNAPSHOT = struct.Struct("<Bq")
+_TICK = struct.Struct("<Bdd")
+_MOUSE = struct.Struct("<Bq")
+_RESET = struct.Struct("<B")
+_LENGTH = struct.Struct("<BI")
+
+_CONFIG_NUMBERS = struct.Struct("<ddddddB")
+_CURVE_HEADER = struct.Struct("<dBH")
+_POINT = struct.Struct("<dd")
+_COUNT = struct.Struct("<H")
+_CAP = struct.Struct("<d")
+_STACKING = struct.Struct("<B")
+_FILTER_HEADER = struct.Struct("<BB")
+_VALUE = struct.Struct("<d")
+_MOUSE_CONFIG = struct.Struct("<ddddd")
+
+_CURVE_KINDS = ("power", "piecewise", "spline")
+_FILTER_KINDS = FILTER_TYPES
+
+
+class TraceError(Exception):
+    pass
+
+
+def _pack_mask(mask):
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    return _COUNT.pack(len(data)) + data
+
+
+def _unpack_mask(data, offset):
+    (length,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    return int.from_bytes(data[offset:offset + length], "little"), offset + length
+
+
+# Serialize everything the engine needs from a config, including the
+# already-resolved key masks, so a replay never needs the keyboard module
+def pack_config(config):
+    parts = [
+        _CONFIG_NUMBERS.pack(config.linearity, config.sensitivity, config.release_sensitivity,
+                             config.countersteer_multiplier, config.snap_to_action_key_multiplier,
+                             config.permanent_max_lock, config.snap_to_center),
+        _pack_mask(config.steer_left_mask),
+        _pack_mask(config.steer_right_mask),
+        _pack_mask(config.fullsteer_left_mask),
+        _pack_mask(config.fullsteer_right_mask),
+        _COUNT.pack(len(config.action_keys)),
+    ]
+    for mask, cap in config.action_keys:
+        parts.append(_pack_mask(mask))
+        parts.append(_CAP.pack(cap))
+    curve = config.curve
+    parts.append(_CURVE_HEADER.pack(curve.linearity, _CURVE_KINDS.index(curve.kind), len(curve.points)))
+    for point in curve.points:
+        parts.append(_POINT.pack(*point))
+    parts.append(_STACKING.pack(STACKING_MODES.index(config.action_key_stacking)))
+    parts.append(_COUNT.pack(len(config.filters)))
+    for spec in config.filters:
+        parts.append(_FILTER_HEADER.pack(_FILTER_KINDS.index(spec.kind), len(spec.values)))
+        parts.extend(_VALUE.pack(value) for value in spec.values)
+    parts.append(_MOUSE_CONFIG.pack(config.key_weight, config.mouse_weight, config.mouse_gain,
+                                    config.mouse_deadzone, config.mouse_recenter))
+    parts.append(_pack_mask(config.mouse_recenter_mask))
+    return b"".join(parts)
+
+
+def unpack_config(data):
+    numbers = _CONFIG_NUMBERS.unpack_from(data, 0)
+    offset = _CONFIG_NUMBERS.size
+    masks = []
+    for _ in range(4):
+        mask, offset = _unpack_mask(data, offset)
+        masks.append(mask)
+    (count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    action_keys = []
+    for _ in range(count):
+        mask, offset = _unpack_mask(data, offset)
+        (cap,) = _CAP.unpack_from(data, offset)
+        offset += _CAP.size
+        action_keys.append((mask, cap))
+    linearity, kind, point_count = _CURVE_HEADER.unpack_from(data, offset)
+    offset += _CURVE_HEADER.size
+    points = [_POINT.unpack_from(data, offset + i * _POINT.size) for i in range(point_count)]
+    offset += point_count * _POINT.size
+    # Traces from before action-key stacking end here and use first-wins
+    stacking = STACKING_MODES[0]
+    if offset < len(data):
+        stacking = STACKING_MODES[_STACKING.unpack_from(data, offset)[0]]
+        offset += _STACKING.size
+    # Traces from before output filters end here
+    filters = []
+    if offset < len(data):
+        (count,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        for _ in range(count):
+            kind, value_count = _FILTER_HEADER.unpack_from(data, offset)
+            offset += _FILTER_HEADER.size
+            values = tuple(_VALUE.unpack_from(data, offset + i * _VALUE.size)[0] for i in range(value_count))
+            offset += value_count * _VALUE.size
+            filters.append(FilterSpec(_FILTER_KINDS[kind], values))
+    # Traces from before mouse steering end here and steer with the keys alone
+    mouse = {}
+    if offset < len(data):
+        names = ("key_weight", "mouse_weight", "mouse_gain", "mouse_deadzone", "mouse_recenter")
+        mouse = dict(zip(names, _MOUSE_CONFIG.unpack_from(data, offset)))
+        offset += _MOUSE_CONFIG.size
+        mouse["mouse_recenter_mask"], offset = _unpack_mask(data, offset)
+    return SteeringConfig(
+        linearity=linearity,
+        sensitivity=numbers[1],
+        release_sensitivity=numbers[2],
+        countersteer_multiplier=numbers[3],
+        snap_to_action_key_multiplier=numbers[4],
+        permanent_max_lock=numbers[5],
+        snap_to_center=bool(numbers[6]),
+        steer_left_mask=masks[0],
+        steer_right_mask=masks[1],
+        fullsteer_left_mask=masks[2],
+        fullsteer_right_mask=masks[3],
+        action_keys=tuple(action_keys),
+        action_key_stacking=stacking,
+        curve=ResponseCurve(_CURVE_KINDS[kind], linearity, points),
+        filters=tuple(filters),
+        **mouse,
+    )
+
+
+# Appends key events, key snapshots, mouse motion, ticks, engine resets and
+# profile changes to a trace file. Attach it as KeyState.observer; the
+# steering loop calls mouse(), tick() and reset().
+class TraceRecorder:
+    def __init__(self, path, buffer_size=1 << 20):
+        self._file = open(path, "wb", buffering=buffer_size)
+        self._file.write(MAGIC)
+        self._lock = threading.Lock()
+        self._config = None
+
+    def on_key(self, scan_code, down):
+        record = _KEY.pack(RECORD_KEY, time.perf_counter_ns(), scan_code, down)
+        with self._lock:
+            self._file.write(record)
+
+    def on_snapshot(self):
+        record = _SNAPSHOT.pack(RECORD_SNAPSHOT, time.perf_counter_ns())
+        with self._lock:
+            self._file.write(record)
+
+    # Record the profile the next tick runs with, if it changed
+    def config(self, config):
+        if config is self._config:
+            return
+        self._config = config
+        body = pack_config(config)
+        with self._lock:
+            self._file.write(_LENGTH.pack(RECORD_CONFIG, len(body)) + body)
+
+    def mouse(self, dx):
+        record = _MOUSE.pack(RECORD_MOUSE, dx)
+        with self._lock:
+            self._file.write(record)
+
+    def tick(self, dt, output):
+        record = _TICK.pack(RECORD_TICK, dt, output)
+        with self._lock:
+            self._file.write(record)
+
+    def reset(self):
+        record = _RESET.pack(RECORD_RESET)
+        with self._lock:
+            self._file.write(record)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# Iterate over (type, values) records of a trace file
+def read_trace(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise TraceError(f"{path} is not a steering trace")
+    offset = len(MAGIC)
+    end = len(data)
+    view = memoryview(data)
+    try:
+        while offset < end:
+            kind = data[offset]
+            if kind == RECORD_KEY:
+                _, t, scan_code, down = _KEY.unpack_from(view, offset)
+                offset += _KEY.size
+                yield kind, (t, scan_code, bool(down))
+            elif kind == RECORD_SNAPSHOT:
+                _, t = _SNAPSHOT.unpack_from(view, offset)
+                offset += _SNAPSHOT.size
+                yield kind, (t,)
+            elif kind == RECORD_TICK:
+                _, dt, output = _TICK.unpack_from(view, offset)
+                offset += _TICK.size
+                yield kind, (dt, output)
+            elif kind == RECORD_MOUSE:
+                _, dx = _MOUSE.unpack_from(view, offset)
+                offset += _MOUSE.size
+                yield kind, (dx,)
+            elif kind == RECORD_RESET:
+                offset += _RESET.size
+                yield kind, ()
+            elif kind == RECORD_CONFIG:
+                _, length = _LENGTH.unpack_from(view, offset)
+                offset += _LENGTH.size
+                yield kind, (unpack_config(bytes(view[offset:offset + length])),)
+                offset += length
+            else:
+                raise TraceError(f"Unknown record type {kind} at byte {offset}")
+    except struct.error:
+        # A trace cut off mid-record (e.g. the app was killed); keep what we have
+        return
+
+
+# Run a trace back through the engine as fast as possible.
+#
+# Returns a list of (recorded_output, replayed_output). With no overrides the
+# two columns match exactly; overrides (SteeringConfig field -> value) replay
+# the same keys with different settings.
+def replay(path, overrides=None):
+    keys = KeyState()
+    engine = SteeringEngine()
+    inputs = SteeringInputs()
+    pressed = 0
+    mouse_dx = 0
+    results = []
+    for kind, values in read_trace(path):
+        if kind == RECORD_KEY:
+            if values[2]:
+                keys.press(values[1])
+            else:
+                keys.release(values[1])
+        elif kind == RECORD_SNAPSHOT:
+            pressed = keys.snapshot()
+        elif kind == RECORD_TICK:
+            dt, recorded = values
+            engine.config.read_inputs(pressed, inputs)
+            inputs.mouse_dx = mouse_dx
+            mouse_dx = 0
+            results.append((recorded, engine.step(inputs, dt)))
+        elif kind == RECORD_MOUSE:
+            mouse_dx = values[0]
+        elif kind == RECORD_RESET:
+            engine.reset()
+        elif kind == RECORD_CONFIG:
+            config = values[0]
+            if overrides:
+                config = dataclasses.replace(config, **overrides)
+                if "linearity" in overrides:
+                    curve = config.curve
+                    config = dataclasses.replace(config, curve=ResponseCurve(curve.kind, config.linearity, curve.points))
+            engine.config = config
+    return results
+
+
+# Settings that can be changed for a replay
+REPLAY_SETTINGS = ("linearity", "sensitivity", "release_sensitivity", "countersteer_multiplier",
+                   "snap_to_action_key_multiplier", "permanent_max_lock", "snap_to_center")
+
+
+def _parse_override(text):
+    name, _, value = text.partition("=")
+    if name not in REPLAY_SETTINGS:
+        raise argparse.ArgumentTypeError(f"unknown setting '{name}', choose from {', '.join(REPLAY_SETTINGS)}")
+    if name == "snap_to_center":
+        return name, value.lower() in ("1", "true", "yes")
+    return name, float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a steering input trace")
+    parser.add_argument("trace", help="Trace file written with --record-trace")
+    parser.add_argument("--set", action="append", type=_parse_override, default=[], metavar="NAME=VALUE",
+                        help="Replay with a different setting, e.g. --set sensitivity=20")
+    parser.add_argument("--out", help="Write recorded and replayed output as CSV")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    results = replay(args.trace, dict(args.set))
+    elapsed = time.perf_counter() - started
+
+    mismatches = sum(1 for recorded, replayed in results if recorded != replayed)
+    print(f"{len(results)} ticks replayed in {elapsed:.3f}s, {mismatches} differ from the recording")
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write("recorded,replayed\n")
+            for recorded, replayed in results:
+                f.write(f"{recorded!r},{replayed!r}\n")
+    return 1 if mismatches and not args.set else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
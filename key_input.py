@@ -0,0 +1,254 @@
+import sys
+import threading
+import time
+
+KEY_DOWN = "down"
+KEY_UP = "up"
+
+
+# Map Tk key names to names the keyboard module understands
+def normalize_key_name(key_name):
+    if len(key_name) == 1:
+        return key_name.lower()  # Tk reports "A" when shift is held
+    return KEYSYM_KEY_NAMES.get(key_name, key_name)  # Return mapped value or original key name
+
+
+# Tk keysyms (event.keysym, what the bind windows store as the display
+# name) and the keyboard module's name for the same key. Letters and digits
+# are the same in both. Either side of a modifier matches, as it always has.
+KEYSYM_KEY_NAMES = {
+    "Control_L": "ctrl",
+    "Control_R": "ctrl",
+    "Alt_L": "alt",
+    "Alt_R": "alt",
+    "Shift_L": "shift",
+    "Shift_R": "shift",
+    "Meta_L": "alt",
+    "Meta_R": "alt",
+    "ISO_Level3_Shift": "alt gr",
+    "Super_L": "left windows",
+    "Super_R": "right windows",
+    "Win_L": "left windows",
+    "Win_R": "right windows",
+    "App": "menu",
+    "Menu": "menu",
+    "Caps_Lock": "caps lock",
+    "Num_Lock": "num lock",
+    "Scroll_Lock": "scroll lock",
+    "Return": "enter",
+    "Escape": "esc",
+    "BackSpace": "backspace",
+    "Tab": "tab",
+    "ISO_Left_Tab": "tab",
+    "space": "space",
+    "Insert": "insert",
+    "Delete": "delete",
+    "Home": "home",
+    "End": "end",
+    "Prior": "page up",
+    "Next": "page down",
+    "Up": "up",
+    "Down": "down",
+    "Left": "left",
+    "Right": "right",
+    "Print": "print screen",
+    "Pause": "pause",
+    "Cancel": "break",
+    "exclam": "!",
+    "quotedbl": '"',
+    "numbersign": "#",
+    "dollar": "$",
+    "percent": "%",
+    "ampersand": "&",
+    "apostrophe": "'",
+    "quoteright": "'",
+    "parenleft": "(",
+    "parenright": ")",
+    "asterisk": "*",
+    "plus": "+",
+    "comma": ",",
+    "minus": "-",
+    "period": ".",
+    "slash": "/",
+    "colon": ":",
+    "semicolon": ";",
+    "less": "<",
+    "equal": "=",
+    "greater": ">",
+    "question": "?",
+    "at": "@",
+    "bracketleft": "[",
+    "backslash": "\\",
+    "bracketright": "]",
+    "asciicircum": "^",
+    "underscore": "_",
+    "grave": "`",
+    "quoteleft": "`",
+    "braceleft": "{",
+    "bar": "|",
+    "braceright": "}",
+    "asciitilde": "~",
+    "section": "\u00a7",
+    "degree": "\u00b0",
+    "KP_Enter": "keypad enter",
+    "KP_Add": "keypad +",
+    "KP_Subtract": "keypad -",
+    "KP_Multiply": "keypad *",
+    "KP_Divide": "keypad /",
+    "KP_Decimal": "keypad decimal",
+    "KP_Separator": "keypad separator",
+    "KP_Equal": "keypad =",
+    # Keypad keys with num lock off
+    "KP_Insert": "keypad 0",
+    "KP_End": "keypad 1",
+    "KP_Down": "keypad 2",
+    "KP_Next": "keypad 3",
+    "KP_Left": "keypad 4",
+    "KP_Begin": "keypad 5",
+    "KP_Right": "keypad 6",
+    "KP_Home": "keypad 7",
+    "KP_Up": "keypad 8",
+    "KP_Prior": "keypad 9",
+    "KP_Delete": "keypad decimal",
+    **{f"KP_{digit}": f"keypad {digit}" for digit in range(10)},
+    **{f"F{number}": f"f{number}" for number in range(1, 25)},
+}
+
+# MapVirtualKeyW mode for a virtual key to its scan code
+_MAPVK_VK_TO_VSC = 0
+
+
+# Pressed-key state kept up to date from keyboard events.
+#
+# Keys are tracked as bits of a Python int indexed by scan code. Every key
+# that goes down is also latched until the next snapshot, so a tap that is
+# pressed and released between two ticks still shows up once.
+class KeyState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pressed = 0
+        self._latched = 0
+        self._first_press_ns = 0
+        # perf_counter_ns of the earliest press the last snapshot picked up (0 if none)
+        self.last_press_ns = 0
+        self._masks = {}
+        self._hook = None
+        # Optional recorder with on_key(scan_code, down) and on_snapshot();
+        # called under the lock so it sees events in the order they apply
+        self.observer = None
+
+    # Start listening to global keyboard events
+    def start(self):
+        import keyboard
+        if self._hook is None:
+            self._hook = keyboard.hook(self.on_event)
+
+    def stop(self):
+        import keyboard
+        if self._hook is not None:
+            keyboard.unhook(self._hook)
+            self._hook = None
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._pressed = 0
+            self._latched = 0
+            self._first_press_ns = 0
+
+    # Keyboard hook callback; also used to feed synthetic events
+    def on_event(self, event):
+        if event.event_type == KEY_DOWN:
+            self.press(event.scan_code)
+        else:
+            self.release(event.scan_code)
+
+    def press(self, scan_code):
+        bit = 1 << scan_code
+        with self._lock:
+            self._pressed |= bit
+            self._latched |= bit
+            if not self._first_press_ns:
+                self._first_press_ns = time.perf_counter_ns()
+            if self.observer is not None:
+                self.observer.on_key(scan_code, True)
+
+    def release(self, scan_code):
+        with self._lock:
+            self._pressed &= ~(1 << scan_code)
+            if self.observer is not None:
+                self.observer.on_key(scan_code, False)
+
+    # Keys held now plus keys tapped since the previous snapshot. Without a
+    # new tap the held set is handed out as is, so no new int is built.
+    def snapshot(self):
+        with self._lock:
+            pressed = self._pressed
+            if self._latched:
+                pressed |= self._latched
+                self._latched = 0
+            self.last_press_ns = self._first_press_ns
+            self._first_press_ns = 0
+            if self.observer is not None:
+                self.observer.on_snapshot()
+        return pressed
+
+    # Bit mask of every scan code a binding name maps to (0 if unbound or unknown)
+    def mask(self, key_name):
+        mask = self._masks.get(key_name)
+        if mask is None:
+            mask = self._masks[key_name] = resolve_mask(key_name)
+        return mask
+
+
+def resolve_mask(key_name):
+    if not key_name or key_name == "Not Set":
+        return 0
+    return codes_mask(name_scan_codes(key_name))
+
+
+def codes_mask(scan_codes):
+    mask = 0
+    for scan_code in scan_codes:
+        mask |= 1 << scan_code
+    return mask
+
+
+# Scan codes the keyboard module has for a binding name. Keypad names fall
+# back to the plain key where the platform doesn't name the keypad apart.
+def name_scan_codes(key_name):
+    import keyboard
+    name = normalize_key_name(key_name)
+    scan_codes = keyboard.key_to_scan_codes(name, error_if_missing=False)
+    if not scan_codes and name.startswith("keypad "):
+        scan_codes = keyboard.key_to_scan_codes(name[len("keypad "):], error_if_missing=False)
+    return [scan_code for scan_code in scan_codes if scan_code >= 0]  # Keys without a scan code come back as -vk on Windows
+
+
+# Scan code of the key behind a Tk key event (event.keycode), as the
+# keyboard hook reports it, or None where Tk doesn't say: X11 keycodes are
+# evdev codes + 8, on Windows it's a virtual key
+def event_scan_code(keycode):
+    if sys.platform == "win32":
+        import ctypes
+        return ctypes.windll.user32.MapVirtualKeyW(keycode, _MAPVK_VK_TO_VSC) or None
+    if sys.platform.startswith("linux") and keycode > 8:
+        return keycode - 8
+    return None
+
+
+# Resolve a key captured in a bind window to the scan codes stored next to
+# its name in the profile: the key that was pressed plus whatever else the
+# keyboard module calls by that name (both shift keys for Shift_L, say).
+# Done once at bind time, so the engine only ORs integers together.
+def resolve_binding(keysym, keycode=None):
+    scan_codes = set()
+    if keycode:
+        scan_code = event_scan_code(keycode)
+        if scan_code is not None:
+            scan_codes.add(scan_code)
+    try:
+        scan_codes.update(name_scan_codes(keysym))
+    except (ImportError, OSError):
+        pass  # No key names on this system (not root, no dumpkeys); the pressed key is enough
+    return sorted(scan_codes)
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+# Linearity curve with a live position marker and an optional scrolling
+# history of the axis.
+#
+# The curve and axes are rendered once into a cached background; each frame
+# only restores that background and blits the animated artists, so refreshing
+# at 30 fps costs a fraction of a full canvas.draw().
+class LivePlot:
+    def __init__(self, fig, canvas, history_seconds=5.0):
+        self.fig = fig
+        self.canvas = canvas
+        self.history_seconds = history_seconds
+        self._background = None
+
+        if history_seconds:
+            self.ax, self.history_ax = fig.subplots(1, 2, gridspec_kw={"width_ratios": [1, 2]})
+        else:
+            self.ax, self.history_ax = fig.subplots(), None
+
+        self.ax.set_title("Linearity Curve")
+        self.ax.set_xlim(-1, 1)
+        self.ax.set_ylim(0, 1.05)
+        (self.curve_line,) = self.ax.plot([], [])
+        self.marker = self.ax.axvline(0, color='r', linestyle='--', animated=True)
+        self.animated = [self.marker]
+
+        if self.history_ax is not None:
+            self.history_ax.set_title(f"Last {history_seconds:g}s")
+            self.history_ax.set_xlim(-history_seconds, 0)
+            self.history_ax.set_ylim(-1.05, 1.05)
+            self.history_ax.axhline(0, color='0.8', linewidth=0.8)
+            (self.history_line,) = self.history_ax.plot([], [], color='r', animated=True)
+            self.animated.append(self.history_line)
+
+        fig.tight_layout()
+        # Any full redraw (resize, new curve) invalidates the cached background
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self.animated:
+            self.fig.draw_artist(artist)
+
+    # Replace the static curve; this is the only place doing a full render
+    def set_curve(self, x, y):
+        self.curve_line.set_data(x, y)
+        self.canvas.draw()
+
+    # Move the marker and history trace; called from the Tk timer
+    def refresh(self, samples):
+        if self._background is None:
+            return
+        self.marker.set_xdata([samples.latest()] * 2)
+        if self.history_ax is not None:
+            times, values = samples.window(self.history_seconds)
+            if len(times):
+                self.history_line.set_data(times - times[-1], values)
+            else:
+                self.history_line.set_data(np.empty(0), np.empty(0))
+
+        self.canvas.restore_region(self._background)
+        for artist in self.animated:
+            self.fig.draw_artist(artist)
+        self.canvas.blit(self.fig.bbox)
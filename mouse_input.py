@@ -0,0 +1,267 @@
+import argparse
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# Linux input_event as read from /dev/input/event*: struct timeval (two
+# native longs), type, code and a signed value
+EVENT = struct.Struct("@llHHi")
+EV_SYN = 0
+EV_REL = 2
+SYN_DROPPED = 3
+REL_X = 0
+
+# Events read from the device in one go
+READ_EVENTS = 64
+
+PROC_DEVICES = "/proc/bus/input/devices"
+
+
+class MouseError(Exception):
+    pass
+
+
+# Horizontal mouse motion summed up between engine ticks.
+#
+# A mouse reports at 1 kHz or more while the engine may tick at 100 Hz, so
+# the backend thread adds every delta as it arrives and the engine takes the
+# sum once per tick; no motion is lost or counted twice however the two
+# rates line up.
+class MouseMotion:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dx = 0
+        self.events = 0    # Motion events added
+        self.dropped = 0   # Times the kernel dropped events because nobody read them in time
+
+    def add(self, dx, events=1):
+        with self._lock:
+            self._dx += dx
+            self.events += events
+
+    # Counts since the previous take(). A resting mouse costs the tick one
+    # attribute read; motion that lands after it is picked up next tick.
+    def take(self):
+        if not self._dx:
+            return 0
+        with self._lock:
+            dx = self._dx
+            self._dx = 0
+        return dx
+
+
+# Add the REL_X motion of a buffer of raw input events to motion, one
+# add() per buffer. Returns the timestamp (s) of the last event, or None.
+def feed_events(motion, data):
+    dx = 0
+    events = 0
+    last = None
+    for seconds, microseconds, kind, code, value in EVENT.iter_unpack(data[:len(data) - len(data) % EVENT.size]):
+        if kind == EV_REL and code == REL_X:
+            dx += value
+            events += 1
+        elif kind == EV_SYN and code == SYN_DROPPED:
+            motion.dropped += 1
+        last = seconds + microseconds / 1e6
+    if events:
+        motion.add(dx, events)
+    return last
+
+
+# First device in /proc/bus/input/devices with a mouse handler and
+# relative X motion
+def find_mouse(devices_path=PROC_DEVICES):
+    try:
+        with open(devices_path) as f:
+            blocks = f.read().split("\n\n")
+    except OSError as e:
+        raise MouseError(f"Couldn't list input devices: {e}")
+    for block in blocks:
+        handlers = []
+        relative = 0
+        for line in block.splitlines():
+            if line.startswith("H: Handlers="):
+                handlers = line[len("H: Handlers="):].split()
+            elif line.startswith("B: REL="):
+                relative = int(line[len("B: REL="):].split()[-1], 16)
+        events = [handler for handler in handlers if handler.startswith("event")]
+        if events and relative & 1 << REL_X and any(handler.startswith("mouse") for handler in handlers):
+            return os.path.join("/dev/input", events[0])
+    raise MouseError("No mouse found, pass the device (/dev/input/eventN)")
+
+
+# Linux mouse backend: reads relative motion straight from an evdev device
+# node in its own thread and adds it to a MouseMotion. The device isn't
+# grabbed, so the cursor keeps working. The engine calls take() once per
+# tick, like KeyState.snapshot().
+class EvdevMouse:
+    def __init__(self, path=None, motion=None):
+        self.path = path
+        self.motion = motion if motion is not None else MouseMotion()
+        self._fd = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Open the device and start reading; raises MouseError if that fails
+    def start(self):
+        if self._thread is not None:
+            return
+        if not sys.platform.startswith("linux"):
+            raise MouseError("Mouse steering needs Linux evdev")
+        path = self.path or find_mouse()
+        try:
+            self._fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        except OSError as e:
+            raise MouseError(f"Couldn't open {path}: {e.strerror} (is the user in the 'input' group?)")
+        self.path = path
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mouse-input", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.motion.take()
+
+    def take(self):
+        return self.motion.take()
+
+    def _run(self):
+        fd, motion = self._fd, self.motion
+        while not self._stop.is_set():
+            # Short timeout so stop() doesn't wait on a resting mouse
+            if not select.select([fd], [], [], 0.1)[0]:
+                continue
+            try:
+                data = os.read(fd, EVENT.size * READ_EVENTS)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return  # Unplugged
+            feed_events(motion, data)
+
+    def report(self):
+        dropped = f", {self.motion.dropped} overruns" if self.motion.dropped else ""
+        return f"mouse {self.path}: {self.motion.events} events{dropped}"
+
+
+# Device to open for a profile: its mouse_device, "" for the first mouse
+# found if it steers with the mouse, or None to leave the mouse alone
+def mouse_device(settings):
+    if settings.get("mouse_device"):
+        return settings["mouse_device"]
+    return "" if settings.get("mouse_weight") else None
+
+
+# Copy raw events from a device to a file for replay_ticks()
+def record_events(device, out_path, seconds):
+    fd = os.open(device, os.O_RDONLY | os.O_NONBLOCK)
+    deadline = time.monotonic() + seconds
+    count = 0
+    try:
+        with open(out_path, "wb") as out:
+            while time.monotonic() < deadline:
+                if select.select([fd], [], [], 0.1)[0]:
+                    data = os.read(fd, EVENT.size * READ_EVENTS)
+                    out.write(data)
+                    count += len(data) // EVENT.size
+    finally:
+        os.close(fd)
+    return count
+
+
+# Run a recorded event stream through an engine, cut into ticks of 1 /
+# rate_hz by the event timestamps, the way EvdevMouse and the engine loop
+# would have seen it. Returns the total REL_X counts of the stream, the
+# counts the ticks took and a (dx, x, output) row per tick.
+def replay_ticks(path, engine, rate_hz=1000):
+    from steering_engine import SteeringInputs
+
+    with open(path, "rb") as f:
+        data = f.read()
+    period = 1.0 / rate_hz
+    motion = MouseMotion()
+    inputs = SteeringInputs()
+    rows = []
+    total = 0
+    tick_end = None
+    for offset in range(0, len(data) - len(data) % EVENT.size, EVENT.size):
+        seconds, microseconds, kind, code, value = EVENT.unpack_from(data, offset)
+        stamp = seconds + microseconds / 1e6
+        if tick_end is None:
+            tick_end = stamp + period
+        while stamp >= tick_end:
+            _tick(engine, motion, inputs, period, rows)
+            tick_end += period
+        feed_events(motion, data[offset:offset + EVENT.size])
+        if kind == EV_REL and code == REL_X:
+            total += value
+    _tick(engine, motion, inputs, period, rows)
+    return total, sum(row[0] for row in rows), rows
+
+
+def _tick(engine, motion, inputs, dt, rows):
+    engine.config.read_inputs(0, inputs)
+    inputs.mouse_dx = dx = motion.take()
+    output = engine.step(inputs, dt)
+    rows.append((dx, engine.state.x, output))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record a mouse or replay a recording through the steering")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="Record raw events of an evdev device")
+    record.add_argument("device", nargs="?", help="Device node (default: the first mouse)")
+    record.add_argument("out", help="Output file")
+    record.add_argument("--seconds", type=float, default=10)
+    replay = commands.add_parser("replay", help="Replay a recording through a profile")
+    replay.add_argument("recording")
+    replay.add_argument("--profile", help="Profile to steer with (default: the selected one)")
+    replay.add_argument("--rate", type=int, default=1000, help="Engine ticks per second")
+    replay.add_argument("--out", help="Write dx, position and output per tick as CSV")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        try:
+            device = args.device or find_mouse()
+            count = record_events(device, args.out, args.seconds)
+        except (MouseError, OSError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        print(f"Recorded {count} events from {device}")
+        return 0
+
+    from profile_store import DEFAULT_SETTINGS, DEFAULT_STORE_PATH, ProfileStore
+    from steering_engine import SteeringConfig, SteeringEngine
+
+    # Replaying doesn't create a store (importing any legacy profiles) where
+    # there is none yet; the defaults steer then
+    if os.path.exists(DEFAULT_STORE_PATH):
+        store = ProfileStore(DEFAULT_STORE_PATH, defaults=DEFAULT_SETTINGS)
+        settings = store.load(args.profile or store.selected)
+    else:
+        settings = dict(DEFAULT_SETTINGS)
+    if not settings.get("mouse_weight"):
+        settings["mouse_weight"] = 100
+    engine = SteeringEngine(SteeringConfig.from_settings(settings))
+    total, taken, rows = replay_ticks(args.recording, engine, args.rate)
+    print(f"{len(rows)} ticks, {total} counts recorded, {taken} taken by the ticks")
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write("dx,x,output\n")
+            for row in rows:
+                f.write(",".join(repr(value) for value in row) + "\n")
+    return 0 if taken == total else 1
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+import math
+from dataclasses import dataclass
+
+# Nominal tick length (steering_engine.TICK_SECONDS), for latency estimates
+NOMINAL_DT = 0.01
+
+FILTER_SLEW = "slew"
+FILTER_EMA = "ema"
+FILTER_ONE_EURO = "one_euro"
+
+
+# Limits how fast the output may move, in axis units per second
+class SlewLimiter:
+    __slots__ = ("rate", "value")
+    PARAMS = (("rate", 20.0),)
+    # Lowest value of each parameter that still lets the output move
+    MINIMUMS = {"rate": 0.01}
+
+    def __init__(self, rate=20.0):
+        self.rate = rate
+        self.value = 0.0
+
+    def reset(self, value):
+        self.value = value
+
+    def apply(self, target, dt):
+        step = self.rate * dt
+        value = self.value
+        if target > value + step:
+            value += step
+        elif target < value - step:
+            value -= step
+        else:
+            value = target
+        self.value = value
+        return value
+
+
+# Exponential moving average with a time constant in seconds, so it
+# behaves the same at any tick rate
+class Ema:
+    __slots__ = ("time_constant", "value")
+    PARAMS = (("time_constant", 0.02),)
+    MINIMUMS = {}  # 0 passes the input straight through
+
+    def __init__(self, time_constant=0.02):
+        self.time_constant = time_constant
+        self.value = 0.0
+
+    def reset(self, value):
+        self.value = value
+
+    def apply(self, target, dt):
+        alpha = 1.0 - math.exp(-dt / self.time_constant) if self.time_constant > 0 else 1.0
+        self.value += alpha * (target - self.value)
+        return self.value
+
+
+# One Euro filter (Casiez et al.): heavy smoothing while the input is
+# steady, little lag while it moves fast. Cutoffs are in Hz; beta sets how
+# quickly the cutoff rises with speed.
+class OneEuro:
+    __slots__ = ("min_cutoff", "beta", "d_cutoff", "value", "previous", "derivative")
+    PARAMS = (("min_cutoff", 1.0), ("beta", 0.5), ("d_cutoff", 1.0))
+    # A cutoff of 0 Hz never moves at all
+    MINIMUMS = {"min_cutoff": 0.01, "d_cutoff": 0.01}
+
+    def __init__(self, min_cutoff=1.0, beta=0.5, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset(0.0)
+
+    def reset(self, value):
+        self.value = value
+        self.previous = value
+        self.derivative = 0.0
+
+    def apply(self, target, dt):
+        # Smoothed speed of the input
+        r = 2 * math.pi * self.d_cutoff * dt
+        self.derivative += r / (r + 1) * ((target - self.previous) / dt - self.derivative)
+        self.previous = target
+        # Cutoff rises with speed
+        cutoff = self.min_cutoff + self.beta * abs(self.derivative)
+        r = 2 * math.pi * cutoff * dt
+        self.value += r / (r + 1) * (target - self.value)
+        return self.value
+
+
+STAGES = {
+    FILTER_SLEW: SlewLimiter,
+    FILTER_EMA: Ema,
+    FILTER_ONE_EURO: OneEuro,
+}
+FILTER_TYPES = tuple(STAGES)
+
+
+# One configured stage: its kind and parameter values in PARAMS order
+@dataclass(frozen=True, slots=True)
+class FilterSpec:
+    kind: str
+    values: tuple
+
+    @classmethod
+    def from_settings(cls, settings):
+        kind = settings.get("type")
+        if kind not in STAGES:
+            return None
+        stage = STAGES[kind]
+        values = []
+        for name, default in stage.PARAMS:
+            try:
+                value = float(settings.get(name, default))
+            except (TypeError, ValueError):
+                value = default
+            # An endless time constant would freeze the output as well
+            if not math.isfinite(value):
+                value = default
+            values.append(max(stage.MINIMUMS.get(name, 0.0), value))
+        return cls(kind, tuple(values))
+
+    def settings(self):
+        params = dict(zip((name for name, _ in STAGES[self.kind].PARAMS), self.values))
+        return dict(params, type=self.kind)
+
+    def create(self):
+        return STAGES[self.kind](*self.values)
+
+
+# Stage specs from a profile's "filters" list; unknown stages are skipped
+def filters_from_settings(settings_list):
+    specs = (FilterSpec.from_settings(stage) for stage in settings_list or ())
+    return tuple(spec for spec in specs if spec is not None)
+
+
+# The stages of one axis, applied in order after the response curve
+class FilterChain:
+    __slots__ = ("stages",)
+
+    def __init__(self, specs):
+        self.stages = [spec.create() for spec in specs]
+
+    def reset(self, value):
+        for stage in self.stages:
+            stage.reset(value)
+
+    def apply(self, value, dt):
+        for stage in self.stages:
+            value = stage.apply(value, dt)
+        return value
+
+
+# Latency a chain adds, by simulation at the given tick length:
+#   step_ms: extra time until a full-scale step gets halfway
+#   ramp_ms: how far the output trails a steady ramp (at the default
+#            steering speed of 10 units/s) after `seconds`, as a time
+def measure_latency(specs, dt=NOMINAL_DT, ramp_rate=10.0, seconds=1.0):
+    ticks = int(round(seconds / dt))
+    chain = FilterChain(specs)
+    chain.reset(0.0)
+    step_ms = math.inf
+    for tick in range(1, ticks + 1):
+        if chain.apply(1.0, dt) >= 0.5:
+            step_ms = (tick - 1) * dt * 1000.0  # An unfiltered step gets there on the first tick
+            break
+
+    # Linear stages don't care about the range, so the ramp can run long
+    # enough to settle
+    chain.reset(0.0)
+    target = output = 0.0
+    for _ in range(ticks):
+        target += ramp_rate * dt
+        output = chain.apply(target, dt)
+    ramp_ms = (target - output) / ramp_rate * 1000.0
+    return {"step_ms": step_ms, "ramp_ms": ramp_ms}
@@ -0,0 +1,231 @@
+import sys
+import time
+
+# Axis names understood by every sink
+AXIS_X = "x"
+AXIS_Y = "y"
+AXIS_Z = "z"
+AXIS_RX = "rx"
+AXIS_RY = "ry"
+AXIS_RZ = "rz"
+AXES = (AXIS_X, AXIS_Y, AXIS_Z, AXIS_RX, AXIS_RY, AXIS_RZ)
+
+# Raw axis range used by vJoy (and mirrored by the other sinks)
+AXIS_MIN = 0
+AXIS_MAX = 0x8000
+AXIS_CENTER = 0x4000
+
+
+class OutputError(Exception):
+    pass
+
+
+# Map an axis value in -1..1 to the device's integer range
+def to_raw(value):
+    return int((value + 1) * AXIS_CENTER)
+
+
+# Base class for output devices.
+#
+# set_axes() quantizes every value first and only talks to the device when at
+# least one integer value differs from the last one written, so an idle wheel
+# costs no driver calls. All changed axes of one call go out as a single
+# device update. Subclasses implement _write() and, if the device can take
+# several axes at once, _write_batch().
+class OutputSink:
+    name = "base"
+
+    def __init__(self):
+        self._last = {}
+        self._changed = []
+        self.writes_issued = 0
+        self.writes_suppressed = 0
+
+    def set_axis(self, axis, value):
+        return self.set_axes(((axis, value),))
+
+    # values: sequence of (axis, value) pairs, one per axis
+    def set_axes(self, values):
+        last = self._last
+        changed = self._changed
+        for axis, value in values:
+            raw = int((value + 1) * AXIS_CENTER)
+            if last.get(axis) != raw:
+                last[axis] = raw
+                changed.append((axis, raw))
+        if not changed:
+            self.writes_suppressed += 1
+            return False
+        self._write_batch(changed)
+        changed.clear()
+        self.writes_issued += 1
+        return True
+
+    def _write(self, axis, raw):
+        raise NotImplementedError
+
+    # changed: list of (axis, raw) to send as one update
+    def _write_batch(self, changed):
+        for axis, raw in changed:
+            self._write(axis, raw)
+
+    # Sink for the seat-th virtual device (0 is the first); devices that
+    # exist only once ignore the seat
+    @classmethod
+    def for_seat(cls, seat):
+        return cls()
+
+    def close(self):
+        pass
+
+    def report(self):
+        return f"{self.name}: {self.writes_issued} writes, {self.writes_suppressed} suppressed"
+
+
+class NullSink(OutputSink):
+    name = "null"
+
+    def _write(self, axis, raw):
+        pass
+
+
+# Keeps every write in memory as (perf_counter_ns, axis, raw)
+class RecordingSink(OutputSink):
+    name = "record"
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def _write(self, axis, raw):
+        self.records.append((time.perf_counter_ns(), axis, raw))
+
+
+class VJoySink(OutputSink):
+    name = "vjoy"
+
+    def __init__(self, device_id=1):
+        super().__init__()
+        try:
+            import pyvjoy  # type: ignore
+        except ImportError:
+            raise OutputError("pyvjoy is not installed")
+        try:
+            self._device = pyvjoy.VJoyDevice(device_id)
+        except pyvjoy.exceptions.vJoyFailedToAcquireException:
+            raise OutputError(f"VJoy device {device_id} is already in use")
+        except Exception as e:
+            if "No VJD" in str(e) or "VJD does not exist" in str(e):
+                raise OutputError("No vJoy device found")
+            raise
+        self._usages = {
+            AXIS_X: pyvjoy.HID_USAGE_X,
+            AXIS_Y: pyvjoy.HID_USAGE_Y,
+            AXIS_Z: pyvjoy.HID_USAGE_Z,
+            AXIS_RX: pyvjoy.HID_USAGE_RX,
+            AXIS_RY: pyvjoy.HID_USAGE_RY,
+            AXIS_RZ: pyvjoy.HID_USAGE_RZ,
+        }
+        # Position report fields, for sending several axes in one update()
+        self._fields = {
+            AXIS_X: "wAxisX",
+            AXIS_Y: "wAxisY",
+            AXIS_Z: "wAxisZ",
+            AXIS_RX: "wAxisXRot",
+            AXIS_RY: "wAxisYRot",
+            AXIS_RZ: "wAxisZRot",
+        }
+        # update() sends the whole report, so every axis starts centered
+        # instead of at the struct's zero (full left)
+        for field in self._fields.values():
+            setattr(self._device.data, field, AXIS_CENTER)
+        self._device.update()
+
+    @classmethod
+    def for_seat(cls, seat):
+        return cls(device_id=seat + 1)
+
+    # set_axis() goes straight to the driver; the report keeps a copy so a
+    # later update() of several axes doesn't send this one's old value
+    def _write(self, axis, raw):
+        self._device.set_axis(self._usages[axis], raw)
+        setattr(self._device.data, self._fields[axis], raw)
+
+    def _write_batch(self, changed):
+        if len(changed) == 1:
+            self._write(*changed[0])
+            return
+        data = self._device.data
+        for axis, raw in changed:
+            setattr(data, self._fields[axis], raw)
+        self._device.update()
+
+
+# Virtual joystick through the Linux uinput module (needs python-evdev and
+# write access to /dev/uinput)
+class UinputSink(OutputSink):
+    name = "uinput"
+
+    def __init__(self, device_name="Wheelmode for Keyboard"):
+        super().__init__()
+        try:
+            from evdev import AbsInfo, UInput, ecodes
+        except ImportError:
+            raise OutputError("python-evdev is not installed")
+        self._ecodes = ecodes
+        self._codes = {
+            AXIS_X: ecodes.ABS_X,
+            AXIS_Y: ecodes.ABS_Y,
+            AXIS_Z: ecodes.ABS_Z,
+            AXIS_RX: ecodes.ABS_RX,
+            AXIS_RY: ecodes.ABS_RY,
+            AXIS_RZ: ecodes.ABS_RZ,
+        }
+        info = AbsInfo(value=AXIS_CENTER, min=AXIS_MIN, max=AXIS_MAX, fuzz=0, flat=0, resolution=0)
+        capabilities = {
+            ecodes.EV_ABS: [(code, info) for code in self._codes.values()],
+            # Games only treat the device as a joystick if it has a button
+            ecodes.EV_KEY: [ecodes.BTN_TRIGGER],
+        }
+        try:
+            self._device = UInput(capabilities, name=device_name)
+        except OSError as e:
+            raise OutputError(f"Could not create uinput device: {e}")
+
+    @classmethod
+    def for_seat(cls, seat):
+        return cls(device_name=f"Wheelmode for Keyboard {seat + 1}") if seat else cls()
+
+    def _write(self, axis, raw):
+        self._device.write(self._ecodes.EV_ABS, self._codes[axis], raw)
+        self._device.syn()
+
+    # One SYN_REPORT for all changed axes, so readers see them change together
+    def _write_batch(self, changed):
+        for axis, raw in changed:
+            self._device.write(self._ecodes.EV_ABS, self._codes[axis], raw)
+        self._device.syn()
+
+    def close(self):
+        self._device.close()
+
+
+SINKS = {
+    NullSink.name: NullSink,
+    RecordingSink.name: RecordingSink,
+    VJoySink.name: VJoySink,
+    UinputSink.name: UinputSink,
+}
+
+
+def default_sink_name():
+    return UinputSink.name if sys.platform.startswith("linux") else VJoySink.name
+
+
+# Create a sink by name for the seat-th device; raises OutputError if it
+# can't be opened
+def create_sink(name=None, seat=0):
+    name = name or default_sink_name()
+    if name not in SINKS:
+        raise OutputError(f"Unknown output '{name}', choose from {', '.join(SINKS)}")
+    return SINKS[name].for_seat(seat)
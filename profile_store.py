@@ -0,0 +1,343 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+
+# How long settings must stay unchanged before they are written to disk
+DEFAULT_QUIET_SECONDS = 1.0
+
+
+# Write JSON so readers only ever see the old or the new file, never half of it
+def atomic_write_json(path, data, indent=4):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# Write-behind store for JSON settings files.
+#
+# save() only records the data in memory and marks the file dirty; a
+# background thread writes it once nothing changed for `quiet_seconds`, or
+# when flush()/close() is called. Repeated saves of the same file in between
+# collapse into one write and are counted in `flushes_avoided`.
+class SettingsWriter:
+    def __init__(self, quiet_seconds=DEFAULT_QUIET_SECONDS):
+        self.quiet_seconds = quiet_seconds
+        self._pending = {}
+        self._deadline = None
+        self._cond = threading.Condition()
+        # Held for a whole flush, so a document taken later can't be
+        # overwritten by an older one another thread is still writing
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.saves = 0
+        self.flushes = 0
+        self.flushes_avoided = 0
+        self._thread = threading.Thread(target=self._run, name="settings-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, path, data):
+        snapshot = copy.deepcopy(data)
+        with self._cond:
+            if path in self._pending:
+                self.flushes_avoided += 1
+            self._pending[path] = snapshot
+            self.saves += 1
+            self._deadline = time.monotonic() + self.quiet_seconds
+            self._cond.notify()
+
+    # Data saved for path but not written yet, or None
+    def pending(self, path):
+        with self._cond:
+            data = self._pending.get(path)
+        return copy.deepcopy(data) if data is not None else None
+
+    # Drop a pending write, e.g. because the file is being renamed
+    def discard(self, path):
+        with self._cond:
+            self._pending.pop(path, None)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+                self._deadline = None
+            for path, data in pending.items():
+                atomic_write_json(path, data)
+                with self._cond:
+                    self.flushes += 1
+
+    # Write everything still pending and stop the background thread
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._deadline is None:
+                        self._cond.wait()
+                        continue
+                    remaining = self._deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Could not save settings: {e}")
+
+    def report(self):
+        return f"{self.flushes} writes, {self.flushes_avoided} avoided"
+
+
+# Current layout of a stored profile; bump it and add a migration below
+# whenever a setting changes meaning or shape
+SCHEMA_VERSION = 2
+
+DEFAULT_STORE_PATH = "profiles.json"
+DEFAULT_PROFILE = "default"
+
+# Settings of a new profile, and the fallback for anything a stored
+# profile doesn't have
+DEFAULT_SETTINGS = {
+    "steer_left_binding": "a",  # Default to 'A' for steering left
+    "steer_right_binding": "d",  # Default to 'D' for steering right
+    "pause_steering_reset_binding": "",  # Default to unbound
+    # Scan codes of each binding, resolved when it was bound; empty to look
+    # the name up instead. Action keys and axes keep theirs as binding_codes.
+    "steer_left_binding_codes": [],
+    "steer_right_binding_codes": [],
+    "pause_steering_reset_binding_codes": [],
+    "fullsteer_left_binding_codes": [],
+    "fullsteer_right_binding_codes": [],
+    "mouse_recenter_binding_codes": [],
+    "linearity": 100,             # Default linearity
+    "sensitivity": 10,           # Default sensitivity
+    "release_sensitivity": 15,   # Default sensitivity on release
+    "sensitivity_when_paused": 3, # Default Sensitivity when Paused
+    "countersteer_multiplier": 2,  # Default countersteer multiplier
+    "fullsteer_left_binding": "",  # Default to unbound for fullsteer left
+    "fullsteer_right_binding": "",  # Default to unbound for fullsteer right
+    "snap_to_action_key_multiplier": 1,  # Default snap to action key multiplier
+    "action_keys": [],  # Default empty action keys
+    "action_key_stacking": "first",  # first, tightest, loosest or multiply when several action keys are held
+    "axes": [],  # Extra key-driven axes (throttle, brake, clutch), each with its own binding and rates
+    "curve_type": "power",  # power (uses linearity), piecewise or spline
+    "curve_points": [],  # Control points for piecewise/spline curves
+    "filters": [],  # Output filter stages (slew, ema, one_euro) applied to the steering after the curve
+    "permanent_max_lock": 100,
+    "key_weight": 100,  # Share of the key-driven position in the steering (%)
+    "mouse_weight": 0,  # Share of the mouse position in the steering (%), 0 for keys only
+    "mouse_gain": 1.0,  # Steering per mouse count; at 1, 1000 counts go from center to full lock
+    "mouse_deadzone": 0,  # Mouse deadzone around center (% of the axis)
+    "mouse_recenter": 0,  # Rate at which a resting mouse drifts back to center, 0 to stay put
+    "mouse_recenter_binding": "",  # Key that puts the mouse position back to center
+    "mouse_device": "",  # evdev mouse (/dev/input/eventN), empty for the first one found
+    "output": "",  # Output device: vjoy, uinput, null or record (empty for the platform default)
+    "tick_rate": 100,  # Engine ticks per second (100 - 1000)
+    "raise_thread_priority": False,  # Ask the OS for a higher priority engine process and steering thread
+    "instrumentation": True,  # Keep timing histograms for the stats panel
+    "telemetry_path": "",  # Telemetry ring file written every tick (see telemetry.py), empty for none
+    "telemetry_capacity": 1048576,  # Ticks the telemetry file holds before it wraps around
+    "control_address": "",  # Control server address (unix:PATH or [HOST:]PORT), empty for none
+    "plot_fps": 30,  # Refresh rate of the live plot
+    "history_seconds": 5  # Length of the scrolling axis history, 0 to hide it
+}
+
+# Loose per-profile files used before the store existed (schema 1)
+LEGACY_PREFIX = "keyboard_"
+LEGACY_SUFFIX = "_settings.json"
+LEGACY_SELECTED = "selected_profile.json"
+
+
+class ProfileError(Exception):
+    pass
+
+
+# Schema 1 -> 2: the old GUI stored cap percentages as typed in and used
+# "Not Set" for unbound keys
+def _migrate_v1(profile):
+    for action_key in profile.get("action_keys", []):
+        try:
+            action_key["cap_percentage"] = min(100, int(float(action_key.get("cap_percentage", 100))))
+        except (TypeError, ValueError):
+            action_key["cap_percentage"] = 100
+        if action_key.get("binding") == "Not Set":
+            action_key["binding"] = ""
+    for key, value in profile.items():
+        if key.endswith("_binding") and value == "Not Set":
+            profile[key] = ""
+    return profile
+
+
+# Migration from version n to n + 1, by n
+MIGRATIONS = {
+    1: _migrate_v1,
+}
+
+
+# All profiles in one JSON file with an index of names.
+#
+# The file is read once; each profile is migrated to SCHEMA_VERSION, filled
+# up with `defaults` and cached the first time it's loaded. Saves go through
+# a SettingsWriter (write-behind, atomic replace of the whole file), so a
+# rename or create is a single atomic write instead of a file move. On the
+# first run the legacy keyboard_<name>_settings.json files are imported;
+# they are left in place.
+class ProfileStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, defaults=None, writer=None, legacy_dir="."):
+        self.path = path
+        self.defaults = copy.deepcopy(defaults or {})
+        self.writer = writer if writer is not None else SettingsWriter()
+        self._lock = threading.RLock()
+        self._cache = {}
+        self.loads = 0
+        self.cache_hits = 0
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                document = json.load(f)
+        else:
+            document = self._import_legacy(legacy_dir)
+        self._raw = document.get("profiles", {})
+        self._selected = document.get("selected_profile", DEFAULT_PROFILE)
+        if not os.path.exists(path):
+            atomic_write_json(path, self._document())
+
+    # Build a store document from the loose files of older versions
+    @staticmethod
+    def _import_legacy(directory):
+        profiles = {}
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.startswith(LEGACY_PREFIX) and file_name.endswith(LEGACY_SUFFIX):
+                name = file_name[len(LEGACY_PREFIX):-len(LEGACY_SUFFIX)]
+                try:
+                    with open(os.path.join(directory, file_name), 'r') as f:
+                        profiles[name] = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Skipping profile file {file_name}: {e}")
+        selected = DEFAULT_PROFILE
+        try:
+            with open(os.path.join(directory, LEGACY_SELECTED), 'r') as f:
+                selected = json.load(f).get("selected_profile", DEFAULT_PROFILE)
+        except (OSError, ValueError):
+            pass
+        return {"schema_version": SCHEMA_VERSION, "selected_profile": selected, "profiles": profiles}
+
+    # Migrate a stored profile to the current schema and fill in defaults
+    def _validate(self, name, profile):
+        profile = copy.deepcopy(profile)
+        version = profile.pop("schema_version", 1)
+        if version > SCHEMA_VERSION:
+            raise ProfileError(f"Profile '{name}' was saved by a newer version (schema {version})")
+        while version < SCHEMA_VERSION:
+            profile = MIGRATIONS[version](profile)
+            version += 1
+        for key, value in self.defaults.items():
+            profile.setdefault(key, copy.deepcopy(value))
+        return profile
+
+    def _document(self):
+        # Profiles never loaded are written back exactly as they were read
+        profiles = {}
+        for name, profile in self._raw.items():
+            if name in self._cache:
+                profile = dict(self._cache[name], schema_version=SCHEMA_VERSION)
+            profiles[name] = profile
+        return {"schema_version": SCHEMA_VERSION, "selected_profile": self._selected, "profiles": profiles}
+
+    def _write(self, now=False):
+        self.writer.save(self.path, self._document())
+        if now:
+            self.writer.flush()
+
+    # Profile names in creation order, straight from the index
+    def names(self):
+        with self._lock:
+            return list(self._raw)
+
+    def exists(self, name):
+        with self._lock:
+            return name in self._raw
+
+    # A copy of the validated profile; unknown names give the defaults
+    def load(self, name=DEFAULT_PROFILE):
+        with self._lock:
+            self.loads += 1
+            if name in self._cache:
+                self.cache_hits += 1
+                profile = self._cache[name]
+            elif name in self._raw:
+                profile = self._cache[name] = self._validate(name, self._raw[name])
+            else:
+                profile = self.defaults
+            return copy.deepcopy(profile)
+
+    # Store settings for name (created if missing); written in the background
+    def save(self, name, settings):
+        with self._lock:
+            self._raw.setdefault(name, {})
+            self._cache[name] = copy.deepcopy(settings)
+            self._write()
+
+    # Add a new profile; written immediately
+    def create(self, name, settings):
+        with self._lock:
+            if not name or name in self._raw:
+                raise ProfileError(f"The profile '{name}' already exists.")
+            self._raw[name] = {}
+            self._cache[name] = copy.deepcopy(settings)
+            self._write(now=True)
+
+    # Rename a profile in place (keeping its position); written immediately
+    def rename(self, old_name, new_name):
+        with self._lock:
+            if old_name not in self._raw:
+                raise ProfileError(f"The profile '{old_name}' doesn't exist.")
+            if not new_name or new_name in self._raw:
+                raise ProfileError(f"The profile '{new_name}' already exists.")
+            self._raw = {new_name if name == old_name else name: profile for name, profile in self._raw.items()}
+            if old_name in self._cache:
+                self._cache[new_name] = self._cache.pop(old_name)
+            if self._selected == old_name:
+                self._selected = new_name
+            self._write(now=True)
+
+    def delete(self, name):
+        with self._lock:
+            self._raw.pop(name, None)
+            self._cache.pop(name, None)
+            self._write(now=True)
+
+    @property
+    def selected(self):
+        with self._lock:
+            return self._selected
+
+    def select(self, name):
+        with self._lock:
+            if name != self._selected:
+                self._selected = name
+                self._write()
+
+    def report(self):
+        return f"{len(self._raw)} profiles, {self.cache_hits}/{self.loads} loads cached"
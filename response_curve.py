@@ -0,0 +1,133 @@
+import functools
+import math
+
+CURVE_POWER = "power"
+CURVE_PIECEWISE = "piecewise"
+CURVE_SPLINE = "spline"
+CURVE_TYPES = (CURVE_POWER, CURVE_PIECEWISE, CURVE_SPLINE)
+
+# Table entries over |x| in 0..1. With linear interpolation in between, the
+# error against the exact power curve stays below 1e-5, except inside the
+# first table bin of the steepest (linearity > 100) curves
+DEFAULT_RESOLUTION = 4096
+
+
+# Clean up user control points: clamp to 0..1, sort, drop duplicates and make
+# sure the curve starts at (0, 0) and ends at (1, 1)
+def normalize_points(points):
+    cleaned = {}
+    for point in points or ():
+        try:
+            x, y = float(point[0]), float(point[1])
+        except (TypeError, ValueError, IndexError):
+            continue
+        cleaned[max(0.0, min(x, 1.0))] = max(0.0, min(y, 1.0))
+    cleaned.setdefault(0.0, 0.0)
+    cleaned.setdefault(1.0, 1.0)
+    return tuple(sorted(cleaned.items()))
+
+
+def _power_shape(linearity):
+    exponent = 100 / linearity
+    return lambda a: a ** exponent
+
+
+def _piecewise_shape(points):
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+
+    def shape(a):
+        for i in range(1, len(xs)):
+            if a <= xs[i]:
+                span = xs[i] - xs[i - 1]
+                t = (a - xs[i - 1]) / span if span else 1.0
+                return ys[i - 1] + (ys[i] - ys[i - 1]) * t
+        return ys[-1]
+    return shape
+
+
+# Monotone cubic (Fritsch-Carlson) through the control points, so the spline
+# never overshoots between points that are themselves monotone
+def _spline_shape(points):
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    n = len(xs)
+    if n < 3:
+        return _piecewise_shape(points)
+
+    slopes = [(ys[i + 1] - ys[i]) / (xs[i + 1] - xs[i]) for i in range(n - 1)]
+    tangents = [slopes[0]] + [
+        0.0 if slopes[i - 1] * slopes[i] <= 0 else (slopes[i - 1] + slopes[i]) / 2
+        for i in range(1, n - 1)
+    ] + [slopes[-1]]
+    for i, slope in enumerate(slopes):
+        if slope == 0:
+            tangents[i] = tangents[i + 1] = 0.0
+            continue
+        alpha, beta = tangents[i] / slope, tangents[i + 1] / slope
+        length = math.hypot(alpha, beta)
+        if length > 3:
+            tangents[i] = 3 * alpha / length * slope
+            tangents[i + 1] = 3 * beta / length * slope
+
+    def shape(a):
+        i = 0
+        while i < n - 2 and a > xs[i + 1]:
+            i += 1
+        h = xs[i + 1] - xs[i]
+        t = (a - xs[i]) / h
+        t2, t3 = t * t, t * t * t
+        return ((2 * t3 - 3 * t2 + 1) * ys[i] + (t3 - 2 * t2 + t) * h * tangents[i]
+                + (-2 * t3 + 3 * t2) * ys[i + 1] + (t3 - t2) * h * tangents[i + 1])
+    return shape
+
+
+# Odd-symmetric response curve sampled once into a lookup table.
+#
+# Building the table is the only place the curve shape is evaluated; apply()
+# is a table lookup plus one linear interpolation, so every curve type costs
+# the same per tick. The plot draws from the same table.
+class ResponseCurve:
+    __slots__ = ("kind", "linearity", "points", "resolution", "table")
+
+    def __init__(self, kind=CURVE_POWER, linearity=100, points=(), resolution=DEFAULT_RESOLUTION):
+        self.kind = kind if kind in CURVE_TYPES else CURVE_POWER
+        self.linearity = linearity
+        self.points = normalize_points(points)
+        self.resolution = resolution
+
+        if self.kind == CURVE_PIECEWISE:
+            shape = _piecewise_shape(self.points)
+        elif self.kind == CURVE_SPLINE:
+            shape = _spline_shape(self.points)
+        else:
+            shape = _power_shape(linearity)
+        self.table = tuple(max(0.0, min(shape(i / resolution), 1.0)) for i in range(resolution + 1))
+
+    # Map a raw axis value in -1..1 through the curve
+    def apply(self, x):
+        a = -x if x < 0 else x
+        if a >= 1.0:
+            y = self.table[self.resolution]
+        else:
+            position = a * self.resolution
+            index = int(position)
+            low = self.table[index]
+            y = low + (self.table[index + 1] - low) * (position - index)
+        return -y if x < 0 else y
+
+    # Points for drawing the curve over -1..1 (matches the old |x| plot)
+    def plot_points(self, count=201):
+        xs = [-1 + 2 * i / (count - 1) for i in range(count)]
+        return xs, [abs(self.apply(x)) for x in xs]
+
+
+# Curves never change once built, so every config with the same shape can
+# share one; compiling a profile only samples the tables it hasn't seen yet
+def make_curve(kind=CURVE_POWER, linearity=100, points=(), resolution=DEFAULT_RESOLUTION):
+    return _make_curve(kind, linearity, normalize_points(points), resolution)
+
+
+@functools.lru_cache(maxsize=64)
+def _make_curve(kind, linearity, points, resolution):
+    return ResponseCurve(kind, linearity, points, resolution)
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+# Fixed-size ring buffer of (timestamp, value) samples.
+#
+# One writer (the steering loop) pushes into preallocated numpy arrays; any
+# number of readers (the plot) copy out the latest value or a time window.
+# Readers never block the writer, at worst they see the sample being written.
+class SampleRing:
+    def __init__(self, capacity=16384):
+        self.capacity = capacity
+        self.times = np.zeros(capacity)
+        self.values = np.zeros(capacity)
+        self.count = 0  # Total samples ever pushed
+
+    def push(self, timestamp, value):
+        index = self.count % self.capacity
+        self.times[index] = timestamp
+        self.values[index] = value
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    # Most recent value, or default if nothing was pushed yet
+    def latest(self, default=0.0):
+        count = self.count
+        if not count:
+            return default
+        return float(self.values[(count - 1) % self.capacity])
+
+    # Samples from the last `seconds` (relative to the newest one), oldest first
+    def window(self, seconds):
+        count = self.count
+        size = min(count, self.capacity)
+        if not size:
+            return np.empty(0), np.empty(0)
+        end = count % self.capacity
+        order = np.arange(end - size, end) % self.capacity
+        times = self.times[order]
+        values = self.values[order]
+        keep = times >= times[-1] - seconds
+        return times[keep], values[keep]
+
+
+# SampleRing laid out in a caller-provided buffer, such as shared memory, so
+# a process other than the writer's can read it. The buffer holds the sample
+# count followed by the two arrays; size() tells how many bytes it needs.
+class SharedSampleRing(SampleRing):
+    def __init__(self, buffer, capacity=16384):
+        self.capacity = capacity
+        self._count = np.ndarray(1, np.int64, buffer, 0)
+        self.times = np.ndarray(capacity, np.float64, buffer, 8)
+        self.values = np.ndarray(capacity, np.float64, buffer, 8 + 8 * capacity)
+
+    @staticmethod
+    def size(capacity=16384):
+        return 8 + 16 * capacity
+
+    @property
+    def count(self):
+        return int(self._count[0])
+
+    @count.setter
+    def count(self, value):
+        self._count[0] = value
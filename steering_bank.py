@@ -0,0 +1,360 @@
+import numpy as np
+
+from output_filters import FilterChain
+from steering_engine import (STACK_FIRST, STACK_LOOSEST, STACK_MULTIPLY, STACK_TIGHTEST, TICK_SECONDS,
+                             SteeringConfig)
+
+# Order of the stacking modes in the per-seat mode array
+_STACKING_CODES = {STACK_FIRST: 0, STACK_TIGHTEST: 1, STACK_LOOSEST: 2, STACK_MULTIPLY: 3}
+
+
+def _codes(mask):
+    codes = []
+    while mask:
+        low = mask & -mask
+        codes.append(low.bit_length() - 1)
+        mask ^= low
+    return codes
+
+
+# Move values towards 0 by amount without crossing it (vectorized _approach)
+def _approach_zero(x, amount):
+    return np.where(x > 0, np.maximum(x - amount, 0.0), np.where(x < 0, np.minimum(x + amount, 0.0), x))
+
+
+# Several steering seats (one per virtual device) advanced together.
+#
+# Every seat runs the same model as SteeringEngine.step() with its own
+# config, but the per-seat state lives in numpy arrays and one step() moves
+# all seats with a fixed number of array operations, so an extra seat costs
+# far less than an extra engine. All seats read the same pressed-key bitset;
+# each seat's bindings pick out its own keys. Seats steer with the keys
+# alone; the mouse settings of their profiles don't apply.
+#
+# After step(), axis_values[seat] holds [axis, value] pairs like
+# SteeringState.axis_values, and changed lists the seats whose values moved,
+# so only those need to reach their output device. With outputs=False (for
+# offline simulation) only the raw positions x and pedals are advanced.
+# Output filters run per axis in plain Python, every tick, like in the
+# single engine.
+class SteeringBank:
+    def __init__(self, configs=(), outputs=True):
+        self.configs = ()
+        self.changed = []
+        self.outputs = outputs
+        self.set_configs(configs)
+
+    def __len__(self):
+        return len(self.configs)
+
+    # Hot-reload one seat. Like a config swap in SteeringEngine, the seat
+    # keeps its steering position while its pedals and filters start over.
+    def reload(self, seat, config):
+        configs = list(self.configs)
+        configs[seat] = config
+        self.set_configs(configs, keep=range(len(configs)), fresh=(seat,))
+
+    # Compile the configs into flat arrays. Seats listed in keep carry their
+    # state over (matched by index), except for the pedals and filters of
+    # seats in fresh; everything else starts at rest.
+    def set_configs(self, configs, keep=(), fresh=()):
+        configs = tuple(config if config is not None else SteeringConfig() for config in configs)
+        old_x = getattr(self, "x", None)
+        old_fullsteer = getattr(self, "fullsteer_active", None)
+        old_pedals = getattr(self, "pedals", None)
+        old_pedal_seat = getattr(self, "_pedal_seat", None)
+        old_filters = {(seat, slot): chain for _, seat, slot, chain in getattr(self, "_filters", ())}
+        old_axis_values = getattr(self, "axis_values", None)
+        self.configs = configs
+        seats = len(configs)
+
+        # Every binding becomes a segment of scan codes; a segment is held if
+        # any of its codes is pressed. Unbound segments point at a spare code
+        # just above the highest watched one, which is never pressed.
+        masks = []
+        for config in configs:
+            masks += [config.steer_left_mask, config.steer_right_mask,
+                      config.fullsteer_left_mask, config.fullsteer_right_mask]
+        action_seat, action_caps, action_starts = [], [], []
+        for seat, config in enumerate(configs):
+            action_starts.append(len(action_seat))
+            for mask, cap in config.action_keys:
+                masks.append(mask)
+                action_seat.append(seat)
+                action_caps.append(cap)
+            # Never-held sentinel so no seat has an empty segment
+            masks.append(0)
+            action_seat.append(seat)
+            action_caps.append(1.0)
+        pedals = [(seat, pedal) for seat, config in enumerate(configs) for pedal in config.pedals]
+        masks += [pedal.mask for _, pedal in pedals]
+
+        watched = 0
+        for mask in masks:
+            watched |= mask
+        spare = watched.bit_length()
+        self._watched = watched
+        self._bytes = spare // 8 + 1
+        codes, starts = [], []
+        for mask in masks:
+            starts.append(len(codes))
+            codes += _codes(mask) or [spare]
+        self._codes = np.array(codes, dtype=np.intp)
+        self._starts = np.array(starts, dtype=np.intp)
+        self._actions = slice(4 * seats, 4 * seats + len(action_seat))
+        self._pedal_keys = slice(4 * seats + len(action_seat), len(masks))
+
+        # Per-seat parameters
+        def column(name):
+            return np.array([float(getattr(config, name)) for config in configs])
+
+        self.sensitivity = column("sensitivity")
+        self.release_sensitivity = column("release_sensitivity")
+        self.countersteer_multiplier = column("countersteer_multiplier")
+        self.snap = column("snap_to_action_key_multiplier")
+        self.permanent_max_lock = column("permanent_max_lock")
+        self.snap_to_center = np.array([config.snap_to_center for config in configs], dtype=bool)
+        self.stacking = np.array([_STACKING_CODES[config.action_key_stacking] for config in configs], dtype=np.intp)
+        self._action_caps = np.array(action_caps)
+        self._action_starts = np.array(action_starts, dtype=np.intp)
+        self._action_positions = np.arange(len(action_caps), dtype=np.intp)
+
+        # Pedal parameters, one entry per pedal of any seat
+        self._pedal_seat = np.array([seat for seat, _ in pedals], dtype=np.intp)
+        self.pedal_sensitivity = np.array([float(pedal.sensitivity) for _, pedal in pedals])
+        self.pedal_release_sensitivity = np.array([float(pedal.release_sensitivity) for _, pedal in pedals])
+        self.pedal_invert = np.array([pedal.invert for _, pedal in pedals], dtype=bool)
+
+        # Curve tables, one row per distinct curve object; axes (steering
+        # first, then pedals) point at their row
+        curves = [config.curve for config in configs] + [pedal.curve for _, pedal in pedals]
+        distinct = {}
+        for curve in curves:
+            distinct.setdefault(id(curve), curve)
+        row_of = {key: row for row, key in enumerate(distinct)}
+        rows = [row_of[id(curve)] for curve in curves]
+        distinct = list(distinct.values())
+        resolutions = {curve.resolution for curve in distinct}
+        if len(resolutions) > 1:
+            raise ValueError("All response curves of a bank need the same resolution")
+        self._resolution = resolutions.pop() if resolutions else 1
+        tables = np.array([curve.table for curve in distinct]).reshape(len(distinct), self._resolution + 1)
+        tables = np.hstack((tables, tables[:, -1:]))
+        slopes = np.zeros_like(tables)
+        slopes[:, :-1] = tables[:, 1:] - tables[:, :-1]
+        self._tables = tables.ravel()
+        self._slopes = slopes.ravel()
+        self._row_offsets = np.array(rows, dtype=np.intp) * tables.shape[1]
+        self._pedal_sign = np.where(self.pedal_invert, -1.0, 1.0)
+
+        # State, carried over for the kept seats
+        self.x = np.zeros(seats)
+        self.fullsteer_active = np.zeros(seats, dtype=bool)
+        self.pedals = np.zeros(len(pedals))
+        for seat in keep:
+            if old_x is not None and seat < len(old_x):
+                self.x[seat] = old_x[seat]
+                self.fullsteer_active[seat] = old_fullsteer[seat]
+                before = old_pedals[old_pedal_seat == seat]
+                after = self._pedal_seat == seat
+                if seat not in fresh and len(before) == after.sum():
+                    self.pedals[after] = before
+        self._positions = np.concatenate((self.x, self.pedals))
+        out = self._outputs(self._positions)
+        self.output = out[:seats]
+        self.pedal_output = out[seats:]
+
+        # [axis, value] lists per seat, handed to the seat's sink
+        self.axis_values = []
+        for seat, config in enumerate(configs):
+            values = [[config.steering_axis, float(self.output[seat])]]
+            values += [[pedal.axis, float(value)] for (pedal_seat, pedal), value in zip(pedals, self.pedal_output)
+                       if pedal_seat == seat]
+            self.axis_values.append(values)
+        # Seat and position in that seat's list of every axis, steering first
+        axis_seat, axis_slot = list(range(seats)), [0] * seats
+        used = [1] * seats
+        for seat, _ in pedals:
+            axis_seat.append(seat)
+            axis_slot.append(used[seat])
+            used[seat] += 1
+        self._axis_seat = np.array(axis_seat, dtype=np.intp)
+        self._axis_slot = axis_slot
+
+        # Filter chains as (axis, seat, slot, chain). Kept seats keep theirs
+        # mid-way; new chains start from the value the axis had, so a
+        # reload doesn't make the steering jump.
+        self._curved = out.tolist()
+        self._filters = []
+        specs_of = [config.filters for config in configs] + [pedal.filters for _, pedal in pedals]
+        for i, specs in enumerate(specs_of):
+            if specs:
+                seat, slot = axis_seat[i], axis_slot[i]
+                kept = seat in keep and old_axis_values is not None and seat < len(old_axis_values)
+                chain = old_filters.get((seat, slot)) if kept and seat not in fresh else None
+                if kept and (chain is not None or slot == 0):
+                    self.axis_values[seat][slot][1] = old_axis_values[seat][slot][1]
+                if chain is None:
+                    chain = FilterChain(specs)
+                    chain.reset(self.axis_values[seat][slot][1])
+                self._filters.append((i, seat, slot, chain))
+        self._filtered = {i for i, _, _, _ in self._filters}
+        self.changed = list(range(seats))
+
+    # All seats centered and all pedals released
+    def reset(self):
+        self.set_configs(self.configs)
+
+    # Vectorized ResponseCurve.apply() over all axes, steering then pedals.
+    # Each table row is padded with one copy of its last entry and comes
+    # with a slope row, so |x| == 1 needs no special case.
+    def _curve(self, values):
+        position = np.abs(values) * self._resolution
+        index = position.astype(np.intp)
+        flat = index + self._row_offsets
+        y = self._tables[flat] + self._slopes[flat] * (position - index)
+        return np.copysign(y, values)
+
+    # Curved output of every axis; pedals map 0..1 to -1..1 (maybe inverted)
+    def _outputs(self, values):
+        out = self._curve(values)
+        seats = len(self.configs)
+        if len(out) > seats:
+            out[seats:] = (2 * out[seats:] - 1) * self._pedal_sign
+        return out
+
+    # Pressed state of every binding segment
+    def _held(self, pressed):
+        data = (pressed & self._watched).to_bytes(self._bytes, "little")
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little")
+        return np.logical_or.reduceat(bits[self._codes], self._starts).view(bool)
+
+    # Cap of the held action keys per seat, combined per the seat's stacking
+    # mode, and whether any action key of the seat is held
+    def _action_caps_held(self, held):
+        caps = self._action_caps
+        starts = self._action_starts
+        active = np.logical_or.reduceat(held, starts)
+        first = np.minimum.reduceat(np.where(held, self._action_positions, len(caps) - 1), starts)
+        tightest = np.minimum.reduceat(np.where(held, caps, np.inf), starts)
+        loosest = np.maximum.reduceat(np.where(held, caps, -np.inf), starts)
+        product = np.multiply.reduceat(np.where(held, caps, 1.0), starts)
+        return np.choose(self.stacking, (caps[first], tightest, loosest, product)), active
+
+    # Advance every seat by dt seconds from one pressed-key bitset.
+    #
+    # Same branches as SteeringEngine.step(), evaluated for all seats at once
+    # and merged with np.where; branches no seat is in this tick are skipped,
+    # so an idle bank costs a handful of array operations.
+    def step(self, pressed, dt=TICK_SECONDS):
+        seats = len(self.configs)
+        held = self._held(pressed)
+        x = self.x
+        pedals = self.pedals
+        was_fullsteer = self.fullsteer_active
+        if not held.any() and not x.any() and not pedals.any() and not was_fullsteer.any() and not self._filters:
+            self.changed = []
+            return
+        steer_left = held[0:4 * seats:4]
+        steer_right = held[1:4 * seats:4]
+        fullsteer_left = held[2:4 * seats:4]
+        fullsteer_right = held[3:4 * seats:4]
+
+        snap = self.snap
+        release_step = self.release_sensitivity * dt
+        release_snap = release_step * snap
+        steer_step = self.sensitivity * dt
+        actions = held[self._actions]
+        if actions.any():
+            action_cap, action_key_active = self._action_caps_held(actions)
+            cap = np.where(action_key_active, action_cap, self.permanent_max_lock)
+            boost = np.where(action_key_active, snap, 1.0)
+            boost_step = steer_step * boost
+            center_step = release_step * boost
+        else:
+            action_key_active = None
+            cap = self.permanent_max_lock
+            boost_step = steer_step
+            center_step = release_step
+        neg_cap = -cap
+
+        # Fullsteer, right wins like in the single engine
+        fullsteer_active = fullsteer_left | fullsteer_right
+        any_fullsteer = fullsteer_active.any()
+        if any_fullsteer:
+            x = np.where(fullsteer_right, 1.0, np.where(fullsteer_left, -1.0, x))
+
+        # Fullsteer release (snap to center or smooth return)
+        if was_fullsteer.any():
+            released = was_fullsteer & ~fullsteer_active
+            x = np.where(released, np.where(self.snap_to_center, 0.0, _approach_zero(x, release_step)), x)
+
+        # Normal steering input handling, lowest priority branch first
+        above = x > cap
+        below = x < neg_cap
+        normal = _approach_zero(x, center_step)
+        if below.any():
+            normal = np.where(below, np.minimum(x + release_snap, neg_cap), normal)
+        if above.any():
+            normal = np.where(above, np.maximum(x - release_snap, cap), normal)
+        if steer_right.any():
+            counter_step = steer_step * self.countersteer_multiplier
+            right = np.minimum(x + np.where(x < 0, counter_step, boost_step), cap)
+            normal = np.where(steer_right, right, normal)
+        if steer_left.any():
+            counter_step = steer_step * self.countersteer_multiplier
+            left = np.maximum(x - np.where(x > 0, counter_step, boost_step), neg_cap)
+            normal = np.where(steer_left, left, normal)
+        x = np.where(fullsteer_active, x, normal) if any_fullsteer else normal
+
+        # Action key capping and smooth transition
+        if action_key_active is not None:
+            x = np.where(action_key_active & (x > cap), np.maximum(x - release_snap, cap),
+                         np.where(action_key_active & (x < neg_cap), np.minimum(x + release_snap, neg_cap), x))
+
+        self.x = x
+        self.fullsteer_active = fullsteer_active
+
+        # Pedals ramp towards fully pressed or released
+        if len(pedals):
+            pedal_held = held[self._pedal_keys]
+            if pedal_held.any() or pedals.any():
+                pedals = np.where(pedal_held, np.minimum(pedals + self.pedal_sensitivity * dt, 1.0),
+                                  np.maximum(pedals - self.pedal_release_sensitivity * dt, 0.0))
+                self.pedals = pedals
+            positions = np.concatenate((x, pedals))
+        else:
+            positions = x
+        if not self.outputs:
+            return
+
+        # Only axes whose position moved get a new output, and only their
+        # seats are reported as changed
+        moved = np.flatnonzero(positions != self._positions)
+        filters = self._filters
+        if not len(moved) and not filters:
+            self.changed = []
+            return
+        axis_values = self.axis_values
+        changed = set()
+        if len(moved):
+            self._positions = positions
+            out = self._outputs(positions)
+            self.output = out[:seats]
+            self.pedal_output = out[seats:]
+            axis_slot = self._axis_slot
+            filtered = self._filtered
+            seat_of = self._axis_seat[moved].tolist()
+            for seat, i, value in zip(seat_of, moved.tolist(), out[moved].tolist()):
+                if i not in filtered:
+                    axis_values[seat][axis_slot[i]][1] = value
+                    changed.add(seat)
+            if filters:
+                self._curved = out.tolist()
+        curved = self._curved
+        for i, seat, slot, chain in filters:
+            value = chain.apply(curved[i], dt)
+            if value != axis_values[seat][slot][1]:
+                axis_values[seat][slot][1] = value
+                changed.add(seat)
+        self.changed = sorted(changed)
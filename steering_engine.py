@@ -0,0 +1,478 @@
+import math
+from dataclasses import dataclass, field
+
+from output_filters import FilterChain, filters_from_settings
+from response_curve import CURVE_POWER, ResponseCurve, make_curve
+
+# Nominal tick length the original 10 ms loop was tuned for. Rates in the
+# settings are "axis units per second", so at this dt one step moves the axis
+# by 0.01 * rate, exactly like the old per-tick increments.
+TICK_SECONDS = 0.01
+
+# Default settings used by the engine when a value is not configured
+DEFAULT_LINEARITY = 100
+DEFAULT_SENSITIVITY = 10
+DEFAULT_RELEASE_SENSITIVITY = 15
+DEFAULT_COUNTERSTEER_MULTIPLIER = 2
+DEFAULT_SNAP_TO_ACTION_KEY_MULTIPLIER = 1
+DEFAULT_PERMANENT_MAX_LOCK = 100
+DEFAULT_KEY_WEIGHT = 100
+DEFAULT_MOUSE_WEIGHT = 0
+DEFAULT_MOUSE_GAIN = 1.0
+DEFAULT_MOUSE_DEADZONE = 0
+DEFAULT_MOUSE_RECENTER = 0
+
+# Mouse counts that move the steering from center to full lock at gain 1
+MOUSE_COUNTS_PER_LOCK = 1000
+
+# How the caps of several held action keys combine
+STACK_FIRST = "first"            # The first key in the list wins
+STACK_TIGHTEST = "tightest"      # Smallest cap wins
+STACK_LOOSEST = "loosest"        # Largest cap wins
+STACK_MULTIPLY = "multiply"      # Caps multiply, e.g. 50% and 50% give 25%
+STACKING_MODES = (STACK_FIRST, STACK_TIGHTEST, STACK_LOOSEST, STACK_MULTIPLY)
+
+
+# Output axis the steering drives (output_sinks.AXIS_X)
+STEERING_AXIS = "x"
+
+
+# Keys held down and mouse motion during one tick, as seen by the engine
+class SteeringInputs:
+    __slots__ = ("steer_left", "steer_right", "fullsteer_left", "fullsteer_right", "action_cap", "action_keys",
+                 "pressed", "mouse_dx", "mouse_center")
+
+    def __init__(self, steer_left=False, steer_right=False, fullsteer_left=False,
+                 fullsteer_right=False, action_cap=None, pressed=0, mouse_dx=0, mouse_center=False, action_keys=0):
+        self.steer_left = steer_left
+        self.steer_right = steer_right
+        self.fullsteer_left = fullsteer_left
+        self.fullsteer_right = fullsteer_right
+        # Cap (0..1) of the active action key, or None when no action key is held
+        self.action_cap = action_cap
+        # Bit set of the held action keys, by position in the config's list
+        self.action_keys = action_keys
+        # Full pressed-key bitset, for the pedal axes
+        self.pressed = pressed
+        # Horizontal mouse counts since the previous tick (mouse_input.MouseMotion)
+        self.mouse_dx = mouse_dx
+        # Mouse recenter key held
+        self.mouse_center = mouse_center
+
+
+# Everything the engine carries from one tick to the next
+class SteeringState:
+    __slots__ = ("x", "key_x", "mouse_x", "output", "fullsteer_active", "action_key_active", "action_key_cap",
+                 "pedals", "axis_values", "filters", "layout")
+
+    def __init__(self):
+        self.pedals = []        # Raw pedal positions, 0 (released) .. 1 (fully pressed)
+        self.axis_values = []   # [axis, value] per output axis, handed to the sink each tick
+        self.filters = []       # FilterChain per output axis, or None
+        self.layout = None      # Config axis_values was laid out for
+        self.reset()
+
+    def reset(self):
+        self.x = 0.0                    # Raw steering position, -1 (left) .. 1 (right)
+        self.key_x = 0.0                # Position driven by the keys alone
+        self.mouse_x = 0.0              # Position driven by the mouse alone, before its deadzone
+        self.output = 0.0               # Steering axis value after the curve and filters
+        self.fullsteer_active = False   # Fullsteer state of the previous tick
+        self.action_key_active = False
+        self.action_key_cap = 1.0
+        self.pedals = [0.0] * len(self.pedals)
+        self.layout = None
+
+
+# Move value towards target by at most amount, never overshooting it
+def _approach(value, target, amount):
+    if value > target:
+        return max(value - amount, target)
+    if value < target:
+        return min(value + amount, target)
+    return value
+
+
+# Read a number from settings, falling back to default when it's missing or invalid
+def _number(settings, key, default, convert=float):
+    try:
+        return convert(settings.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Scan-code mask of a binding: the codes resolved when it was bound
+# (<key>_codes next to the name), else key_mask of the name for profiles
+# bound before codes were stored. Unbound stays unbound whatever codes linger.
+def _binding_mask(settings, key, key_mask):
+    name = settings.get(key, "")
+    if not name or name == "Not Set":
+        return 0
+    mask = 0
+    try:
+        for scan_code in settings.get(key + "_codes") or ():
+            mask |= 1 << int(scan_code)
+    except (TypeError, ValueError):
+        mask = 0
+    return mask or key_mask(name)
+
+
+# One extra key-driven axis (throttle, brake, clutch, ...). It ramps up with
+# `sensitivity` while its key is held and falls back with
+# `release_sensitivity`, like the steering does, then goes through its own
+# response curve. Released is the bottom of the axis range (top if inverted).
+@dataclass(frozen=True, slots=True)
+class PedalConfig:
+    name: str = ""
+    axis: str = "y"
+    mask: int = 0
+    sensitivity: float = DEFAULT_SENSITIVITY
+    release_sensitivity: float = DEFAULT_RELEASE_SENSITIVITY
+    invert: bool = False
+    curve: ResponseCurve = field(default_factory=ResponseCurve)
+    # Output filter stages (output_filters.FilterSpec), applied after the curve
+    filters: tuple = ()
+
+    @classmethod
+    def from_settings(cls, settings, key_mask):
+        linearity = max(50, min(_number(settings, "linearity", DEFAULT_LINEARITY, int), 200))  # Clamp between 50 and 200
+        return cls(
+            name=str(settings.get("name", "")),
+            axis=str(settings.get("axis", "y")),
+            mask=_binding_mask(settings, "binding", key_mask),
+            sensitivity=max(1, min(_number(settings, "sensitivity", DEFAULT_SENSITIVITY, int), 100)),
+            release_sensitivity=max(1, min(_number(settings, "release_sensitivity", DEFAULT_RELEASE_SENSITIVITY, int), 100)),
+            invert=bool(settings.get("invert", False)),
+            curve=make_curve(settings.get("curve_type", CURVE_POWER), linearity, settings.get("curve_points", ())),
+            filters=filters_from_settings(settings.get("filters")),
+        )
+
+    # Output value (-1..1) for a raw pedal position
+    def output(self, position):
+        value = 2 * self.curve.apply(position) - 1
+        return -value if self.invert else value
+
+
+# Validated, read-only snapshot of one profile, compiled whenever the settings
+# change. The engine only ever holds a reference to one of these, so the GUI
+# swaps in a new profile with a single assignment and the tick never parses,
+# clamps or looks anything up.
+@dataclass(frozen=True, slots=True)
+class SteeringConfig:
+    linearity: float = DEFAULT_LINEARITY
+    sensitivity: float = DEFAULT_SENSITIVITY
+    release_sensitivity: float = DEFAULT_RELEASE_SENSITIVITY
+    countersteer_multiplier: float = DEFAULT_COUNTERSTEER_MULTIPLIER
+    snap_to_action_key_multiplier: float = DEFAULT_SNAP_TO_ACTION_KEY_MULTIPLIER
+    permanent_max_lock: float = DEFAULT_PERMANENT_MAX_LOCK / 100.0
+    snap_to_center: bool = False
+    # Scan-code bit masks of the bindings (see key_input.KeyState)
+    steer_left_mask: int = 0
+    steer_right_mask: int = 0
+    fullsteer_left_mask: int = 0
+    fullsteer_right_mask: int = 0
+    # (mask, cap) of every bound action key, in priority order
+    action_keys: tuple = ()
+    action_key_stacking: str = STACK_FIRST
+    # Lookup table for the linearity/custom curve, shared with the plot
+    curve: ResponseCurve = field(default_factory=ResponseCurve)
+    steering_axis: str = STEERING_AXIS
+    # Extra key-driven axes, see PedalConfig
+    pedals: tuple = ()
+    # Output filter stages of the steering axis (output_filters.FilterSpec)
+    filters: tuple = ()
+    # Mouse steering: the raw position is key_weight * keys + mouse_weight *
+    # mouse. mouse_gain is axis units per count, mouse_deadzone a fraction of
+    # the axis around center and mouse_recenter the rate (axis units per
+    # second) at which a resting mouse drifts back to center, 0 to stay put.
+    key_weight: float = DEFAULT_KEY_WEIGHT / 100.0
+    mouse_weight: float = DEFAULT_MOUSE_WEIGHT / 100.0
+    mouse_gain: float = DEFAULT_MOUSE_GAIN / MOUSE_COUNTS_PER_LOCK
+    mouse_deadzone: float = DEFAULT_MOUSE_DEADZONE / 100.0
+    mouse_recenter: float = DEFAULT_MOUSE_RECENTER
+    mouse_recenter_mask: int = 0
+    # Derived from the weights: False when the keys drive the wheel alone
+    blend_sources: bool = field(init=False, repr=False, compare=False)
+    # Derived from action_keys: every action scan code in one mask, and
+    # scan code -> bit set of the action keys (list positions) bound to it
+    action_key_mask: int = field(init=False, repr=False, compare=False)
+    action_key_index: dict = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        combined = 0
+        index = {}
+        for position, (mask, cap) in enumerate(self.action_keys):
+            combined |= mask
+            while mask:
+                low = mask & -mask
+                code = low.bit_length() - 1
+                index[code] = index.get(code, 0) | 1 << position
+                mask ^= low
+        object.__setattr__(self, "action_key_mask", combined)
+        object.__setattr__(self, "action_key_index", index)
+        object.__setattr__(self, "blend_sources", self.mouse_weight != 0.0 or self.key_weight != 1.0)
+
+    # Build a config from a settings dict; key_mask turns a binding name into
+    # a scan-code mask for bindings without stored codes (they stay unbound
+    # without one)
+    @classmethod
+    def from_settings(cls, settings, key_mask=None):
+        if key_mask is None:
+            key_mask = lambda name: 0
+
+        action_keys = []
+        for action_key in settings.get("action_keys", []):
+            mask = _binding_mask(action_key, "binding", key_mask)
+            if mask:
+                cap = max(1, min(_number(action_key, "cap_percentage", 100), 100))  # Clamp between 1 and 100
+                action_keys.append((mask, cap / 100.0))
+
+        stacking = settings.get("action_key_stacking", STACK_FIRST)
+        linearity = max(50, min(_number(settings, "linearity", DEFAULT_LINEARITY, int), 200))  # Clamp between 50 and 200
+        curve = make_curve(settings.get("curve_type", CURVE_POWER), linearity, settings.get("curve_points", ()))
+
+        return cls(
+            linearity=linearity,
+            sensitivity=max(1, min(_number(settings, "sensitivity", DEFAULT_SENSITIVITY, int), 100)),  # Clamp between 1 and 100
+            release_sensitivity=max(1, min(_number(settings, "release_sensitivity", DEFAULT_RELEASE_SENSITIVITY, int), 100)),
+            countersteer_multiplier=_number(settings, "countersteer_multiplier", DEFAULT_COUNTERSTEER_MULTIPLIER),
+            snap_to_action_key_multiplier=_number(settings, "snap_to_action_key_multiplier", DEFAULT_SNAP_TO_ACTION_KEY_MULTIPLIER),
+            permanent_max_lock=max(1, min(_number(settings, "permanent_max_lock", DEFAULT_PERMANENT_MAX_LOCK), 100)) / 100.0,
+            snap_to_center=bool(settings.get("snap_to_center", False)),
+            steer_left_mask=_binding_mask(settings, "steer_left_binding", key_mask),
+            steer_right_mask=_binding_mask(settings, "steer_right_binding", key_mask),
+            fullsteer_left_mask=_binding_mask(settings, "fullsteer_left_binding", key_mask),
+            fullsteer_right_mask=_binding_mask(settings, "fullsteer_right_binding", key_mask),
+            action_keys=tuple(action_keys),
+            action_key_stacking=stacking if stacking in STACKING_MODES else STACK_FIRST,
+            curve=curve,
+            filters=filters_from_settings(settings.get("filters")),
+            key_weight=max(0, min(_number(settings, "key_weight", DEFAULT_KEY_WEIGHT), 100)) / 100.0,
+            mouse_weight=max(0, min(_number(settings, "mouse_weight", DEFAULT_MOUSE_WEIGHT), 100)) / 100.0,
+            mouse_gain=max(0.01, min(_number(settings, "mouse_gain", DEFAULT_MOUSE_GAIN), 100)) / MOUSE_COUNTS_PER_LOCK,
+            mouse_deadzone=max(0, min(_number(settings, "mouse_deadzone", DEFAULT_MOUSE_DEADZONE), 50)) / 100.0,
+            mouse_recenter=max(0, min(_number(settings, "mouse_recenter", DEFAULT_MOUSE_RECENTER), 100)),
+            mouse_recenter_mask=_binding_mask(settings, "mouse_recenter_binding", key_mask),
+            # Axes already used by the steering (or an earlier pedal) are skipped
+            pedals=tuple(_unique_axes(
+                PedalConfig.from_settings(axis_settings, key_mask) for axis_settings in settings.get("axes", [])
+            )),
+        )
+
+    # Fill inputs from a pressed-key bitset
+    def read_inputs(self, pressed, inputs):
+        inputs.steer_left = bool(pressed & self.steer_left_mask)
+        inputs.steer_right = bool(pressed & self.steer_right_mask)
+        inputs.fullsteer_left = bool(pressed & self.fullsteer_left_mask)
+        inputs.fullsteer_right = bool(pressed & self.fullsteer_right_mask)
+        held = pressed & self.action_key_mask
+        if held:
+            positions = inputs.action_keys = self._action_positions(held)
+            inputs.action_cap = self._action_cap(positions)
+        else:
+            inputs.action_keys = 0
+            inputs.action_cap = None
+        inputs.pressed = pressed
+        inputs.mouse_center = bool(pressed & self.mouse_recenter_mask)
+        return inputs
+
+    # Positions of the action keys bound to the held scan codes; only walks
+    # the held codes, so the number of configured action keys doesn't matter
+    def _action_positions(self, held):
+        index = self.action_key_index
+        positions = 0
+        while held:
+            low = held & -held
+            positions |= index[low.bit_length() - 1]
+            held ^= low
+        return positions
+
+    # Combine the caps of the action keys at positions
+    def _action_cap(self, positions):
+        action_keys = self.action_keys
+        stacking = self.action_key_stacking
+        if stacking == STACK_FIRST:
+            return action_keys[(positions & -positions).bit_length() - 1][1]
+
+        cap = None
+        while positions:
+            low = positions & -positions
+            key_cap = action_keys[low.bit_length() - 1][1]
+            positions ^= low
+            if cap is None:
+                cap = key_cap
+            elif stacking == STACK_TIGHTEST:
+                cap = min(cap, key_cap)
+            elif stacking == STACK_LOOSEST:
+                cap = max(cap, key_cap)
+            else:
+                cap *= key_cap
+        return cap
+
+
+def _unique_axes(pedals):
+    used = {STEERING_AXIS}
+    for pedal in pedals:
+        if pedal.axis not in used:
+            used.add(pedal.axis)
+            yield pedal
+
+
+# Headless steering model: no Tk, no keyboard module and no vJoy in here
+class SteeringEngine:
+    def __init__(self, config=None):
+        self.state = SteeringState()
+        # Replaced as a whole, never modified; reading it once per tick gives a
+        # consistent view even while the GUI swaps in a new one
+        self.config = config if config is not None else SteeringConfig()
+
+    def reset(self):
+        self.state.reset()
+        self._layout(self.config)
+
+    # Size the per-axis state for config and put every axis at rest. Filters
+    # start from the current value, so a hot reload doesn't make them jump.
+    def _layout(self, config):
+        state = self.state
+        state.pedals = [0.0] * len(config.pedals)
+        state.axis_values = [[config.steering_axis, state.output]]
+        state.axis_values += [[pedal.axis, pedal.output(0.0)] for pedal in config.pedals]
+        state.filters = []
+        for specs, (_, value) in zip([config.filters] + [pedal.filters for pedal in config.pedals], state.axis_values):
+            chain = FilterChain(specs) if specs else None
+            if chain is not None:
+                chain.reset(value)
+            state.filters.append(chain)
+        state.layout = config
+
+    # Advance the model by dt seconds and return the curved axis value (-1..1).
+    # All axis values of the tick (steering first, then pedals) end up in
+    # state.axis_values, ready for one batched OutputSink.set_axes() call.
+    def step(self, inputs, dt=TICK_SECONDS):
+        config = self.config
+        state = self.state
+        x = state.key_x
+
+        action_key_active = inputs.action_cap is not None
+        action_key_cap = inputs.action_cap if action_key_active else config.permanent_max_lock
+        snap = config.snap_to_action_key_multiplier
+        boost = snap if action_key_active else 1
+        steer_step = config.sensitivity * dt
+        release_step = config.release_sensitivity * dt
+
+        fullsteer_active = False
+        if inputs.fullsteer_left:
+            x = -1.0  # Fullsteer left to 100%
+            fullsteer_active = True
+        if inputs.fullsteer_right:
+            x = 1.0  # Fullsteer right to 100%
+            fullsteer_active = True
+
+        # Handle fullsteer release (snap to center or smooth return)
+        if state.fullsteer_active and not fullsteer_active:
+            if config.snap_to_center:
+                x = 0.0
+            else:
+                x = _approach(x, 0.0, release_step)
+
+        # Normal steering input handling (if fullsteer is not active)
+        if not fullsteer_active:
+            if inputs.steer_left:
+                if x > 0:
+                    x -= steer_step * config.countersteer_multiplier
+                else:
+                    x -= steer_step * boost
+                x = max(x, -action_key_cap)
+            elif inputs.steer_right:
+                if x < 0:
+                    x += steer_step * config.countersteer_multiplier
+                else:
+                    x += steer_step * boost
+                x = min(x, action_key_cap)
+            elif x > action_key_cap:
+                x = max(x - release_step * snap, action_key_cap)
+            elif x < -action_key_cap:
+                x = min(x + release_step * snap, -action_key_cap)
+            else:
+                # Smoothly return to the center
+                x = _approach(x, 0.0, release_step * boost)
+
+        # Handle action key capping and smooth transition
+        if action_key_active:
+            if x > action_key_cap:
+                x = max(x - release_step * snap, action_key_cap)
+            elif x < -action_key_cap:
+                x = min(x + release_step * snap, -action_key_cap)
+
+        state.key_x = x
+        if config.blend_sources:
+            x = self._blend(config, x, inputs, action_key_cap, release_step * snap, dt)
+
+        output = config.curve.apply(x)
+
+        if state.layout is not config:
+            self._layout(config)
+        filters = state.filters
+        if filters[0] is not None:
+            output = filters[0].apply(output, dt)
+
+        state.x = x
+        state.output = output
+        axis_values = state.axis_values
+        axis_values[0][1] = output
+
+        # Pedals: ramp towards fully pressed or released
+        if config.pedals:
+            pressed = inputs.pressed
+            positions = state.pedals
+            i = 0  # Counted by hand; enumerate() would cost an object per tick
+            for pedal in config.pedals:
+                old = positions[i]
+                if pressed & pedal.mask:
+                    position = min(old + pedal.sensitivity * dt, 1.0)
+                else:
+                    position = max(old - pedal.release_sensitivity * dt, 0.0)
+                # Resting pedals keep their output; skip the curve lookup
+                chain = filters[i + 1]
+                if position != old or chain is not None:
+                    positions[i] = position
+                    value = pedal.output(position)
+                    axis_values[i + 1][1] = chain.apply(value, dt) if chain is not None else value
+                i += 1
+
+        state.fullsteer_active = fullsteer_active
+        state.action_key_active = action_key_active
+        state.action_key_cap = action_key_cap
+        return output
+
+    # Mix the mouse into the key position. The mouse position adds up the
+    # motion since the last tick and answers to the same caps as the keys:
+    # pushing against the cap stops there, and a position beyond a newly
+    # held action key's cap eases down to it like a released key.
+    def _blend(self, config, key_x, inputs, cap, ease_step, dt):
+        state = self.state
+        old = state.mouse_x
+        dx = inputs.mouse_dx
+        if inputs.mouse_center:
+            m = 0.0
+        else:
+            m = old + dx * config.mouse_gain
+            if not dx and config.mouse_recenter:
+                m = _approach(m, 0.0, config.mouse_recenter * dt)
+            if m > cap:
+                m = cap if old <= cap else max(min(m, old) - ease_step, cap)
+            elif m < -cap:
+                m = -cap if old >= -cap else min(max(m, old) + ease_step, -cap)
+        state.mouse_x = m
+
+        # Deadzone around center, rescaled so the position doesn't jump at its edge
+        deadzone = config.mouse_deadzone
+        mouse = m
+        if deadzone:
+            magnitude = abs(m)
+            mouse = 0.0 if magnitude <= deadzone else math.copysign((magnitude - deadzone) / (1.0 - deadzone), m)
+
+        # Together the sources stay within the cap, unless one of them is
+        # still easing down to it
+        limit = max(cap, abs(key_x), abs(m))
+        return max(-limit, min(config.key_weight * key_x + config.mouse_weight * mouse, limit))
@@ -0,0 +1,219 @@
+import argparse
+import csv
+import dataclasses
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from profile_store import DEFAULT_PROFILE, DEFAULT_SETTINGS, DEFAULT_STORE_PATH, ProfileStore
+from response_curve import ResponseCurve
+from steering_bank import SteeringBank
+from steering_engine import TICK_SECONDS, SteeringConfig
+
+# Stand-in scan codes for the scripted keyboard
+STEER_LEFT, STEER_RIGHT, ACTION_KEY = 1, 2, 3
+LEFT, RIGHT, ACTION = 1 << STEER_LEFT, 1 << STEER_RIGHT, 1 << ACTION_KEY
+
+# Settings a sweep can vary, with the limits SteeringConfig.from_settings() applies
+PARAMETERS = {
+    "sensitivity": (1, 100, int),
+    "release_sensitivity": (1, 100, int),
+    "countersteer_multiplier": (0.1, 10.0, float),
+    "snap_to_action_key_multiplier": (0.1, 10.0, float),
+    "linearity": (50, 200, int),
+}
+
+# Metrics in seconds unless noted; inf when the position never got there
+METRICS = (
+    "full_lock_time",      # Center to full lock, holding one steer key
+    "center_time",         # Full lock back to center after letting go
+    "reversal_time",       # Full lock to full opposite lock (countersteer)
+    "cap_settle_time",     # Full lock down to an action key's cap, pressed as the steer key is let go
+    "cap_overshoot",       # Position above that cap integrated over time (axis units * s)
+    "center_gain",         # Curve slope around center: output / input at 25% (unitless)
+)
+
+# Positions closer than this count as reached
+EPSILON = 1e-9
+
+
+# Parse "start:stop:count" (evenly spaced) or "a,b,c" into a list of values
+def parse_range(name, text):
+    low, high, convert = PARAMETERS[name]
+    if ":" in text:
+        start, stop, count = text.split(":")
+        values = np.linspace(float(start), float(stop), int(count)).tolist()
+    else:
+        values = [float(value) for value in text.split(",")]
+    values = [convert(round(min(max(value, low), high), 3)) for value in values]
+    return sorted(set(values))
+
+
+# Every combination of the swept values, as a list of {name: value}
+def make_grid(ranges):
+    names = list(ranges)
+    return [dict(zip(names, values)) for values in itertools.product(*(ranges[name] for name in names))]
+
+
+# One config per combination, built from a base profile. Bindings are
+# replaced by stand-in keys; curves are shared between combinations with
+# the same linearity, so the bank keeps one table per linearity.
+def build_configs(base_settings, grid, cap=0.5):
+    base = SteeringConfig.from_settings(base_settings)
+    base = dataclasses.replace(
+        base,
+        steer_left_mask=LEFT, steer_right_mask=RIGHT, fullsteer_left_mask=0, fullsteer_right_mask=0,
+        action_keys=((ACTION, cap),), pedals=(),
+    )
+    curves = {}
+    configs = []
+    for combination in grid:
+        values = {name: value for name, value in combination.items() if name != "linearity"}
+        linearity = combination.get("linearity", base.linearity)
+        if linearity not in curves:
+            curves[linearity] = ResponseCurve(base.curve.kind, linearity, base.curve.points)
+        configs.append(dataclasses.replace(base, linearity=linearity, curve=curves[linearity], **values))
+    return configs
+
+
+# Hold the keys in pressed for the given time and call measure(t, x) after
+# every tick, t being the time since the phase started
+def _phase(bank, pressed, seconds, dt, measure=None):
+    for tick in range(1, int(round(seconds / dt)) + 1):
+        bank.step(pressed, dt)
+        if measure is not None:
+            measure(tick * dt, bank.x)
+
+
+# Time of the first tick each combination met condition(x), inf for never
+def _first_time(count, condition):
+    first = np.full(count, np.inf)
+
+    def measure(t, x):
+        np.copyto(first, t, where=np.isinf(first) & condition(x))
+    return first, measure
+
+
+# Run the scripted input patterns for all configs at once.
+#
+# Returns {metric: array with one value per config}.
+def simulate(configs, cap=0.5, dt=TICK_SECONDS, phase_seconds=3.0):
+    count = len(configs)
+    bank = SteeringBank(configs, outputs=False)
+    lock = bank.permanent_max_lock
+
+    # Center to full lock, then back to center
+    full_lock_time, measure = _first_time(count, lambda x: x >= lock - EPSILON)
+    _phase(bank, RIGHT, phase_seconds, dt, measure)
+    center_time, measure = _first_time(count, lambda x: np.abs(x) <= EPSILON)
+    _phase(bank, 0, phase_seconds, dt, measure)
+
+    # Full lock to full opposite lock
+    _phase(bank, RIGHT, phase_seconds, dt)
+    reversal_time, measure = _first_time(count, lambda x: x <= -lock + EPSILON)
+    _phase(bank, LEFT, phase_seconds, dt, measure)
+
+    # Full lock, then the steer key is let go and an action key with a
+    # lower cap comes in (while steering, the cap applies instantly)
+    bank.reset()
+    _phase(bank, RIGHT, phase_seconds, dt)
+    limit = np.minimum(lock, cap)
+    cap_settle_time, measure_settle = _first_time(count, lambda x: x <= limit + EPSILON)
+    cap_overshoot = np.zeros(count)
+
+    def measure(t, x):
+        measure_settle(t, x)
+        cap_overshoot[:] += np.maximum(x - limit, 0.0) * dt
+    _phase(bank, ACTION, phase_seconds, dt, measure)
+
+    center_gain = np.array([config.curve.apply(0.25) / 0.25 for config in configs])
+    return {
+        "full_lock_time": full_lock_time,
+        "center_time": center_time,
+        "reversal_time": reversal_time,
+        "cap_settle_time": cap_settle_time,
+        "cap_overshoot": cap_overshoot,
+        "center_gain": center_gain,
+    }
+
+
+# Sum of squared relative errors against the targets; lower is better
+def score(metrics, targets):
+    total = np.zeros(len(next(iter(metrics.values()))))
+    for name, target in targets.items():
+        scale = abs(target) if target else 1.0
+        total += ((metrics[name] - target) / scale) ** 2
+    return np.nan_to_num(total, nan=np.inf, posinf=np.inf)
+
+
+def _parse_target(text):
+    name, _, value = text.partition("=")
+    if name not in METRICS:
+        raise argparse.ArgumentTypeError(f"unknown metric '{name}', choose from {', '.join(METRICS)}")
+    return name, float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep steering settings over scripted inputs and rank the results")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Profile store to read the base profile from and export to")
+    parser.add_argument("--base", default=DEFAULT_PROFILE, help="Profile the unswept settings come from")
+    for name in PARAMETERS:
+        parser.add_argument(f"--{name.replace('_', '-')}", metavar="RANGE", dest=name,
+                            help="Values to try: start:stop:count or a,b,c")
+    parser.add_argument("--target", action="append", type=_parse_target, required=True, metavar="METRIC=VALUE",
+                        help=f"Desired metric value, e.g. full_lock_time=0.3 ({', '.join(METRICS)})")
+    parser.add_argument("--cap", type=float, default=0.5, help="Action key cap for the cap metrics (default 0.5)")
+    parser.add_argument("--top", type=int, default=10, help="Number of best candidates to show")
+    parser.add_argument("--export", type=int, default=0, metavar="N", help="Save the N best candidates as profiles")
+    parser.add_argument("--prefix", default="tuned", help="Name prefix of exported profiles; taken names are skipped")
+    parser.add_argument("--csv", metavar="PATH", help="Write every combination and its metrics as CSV")
+    args = parser.parse_args(argv)
+
+    store = ProfileStore(args.store, defaults=DEFAULT_SETTINGS)
+    # Like the GUI, the defaults stand in for a default profile never saved
+    if not store.exists(args.base) and args.base != DEFAULT_PROFILE:
+        parser.error(f"no profile named '{args.base}' in {args.store} (have: {', '.join(store.names()) or 'none'})")
+    base_settings = store.load(args.base)
+    ranges = {name: parse_range(name, getattr(args, name)) for name in PARAMETERS if getattr(args, name)}
+    if not ranges:
+        parser.error("nothing to sweep, give at least one range such as --sensitivity 5:40:8")
+    grid = make_grid(ranges)
+
+    started = time.perf_counter()
+    metrics = simulate(build_configs(base_settings, grid, args.cap), args.cap)
+    scores = score(metrics, dict(args.target))
+    elapsed = time.perf_counter() - started
+    order = np.argsort(scores, kind="stable")
+    print(f"{len(grid)} combinations simulated in {elapsed:.2f}s")
+
+    names = list(ranges)
+    print("  ".join(["score"] + names + list(METRICS)))
+    for i in order[:args.top]:
+        row = [f"{scores[i]:.4f}"] + [f"{grid[i][name]:g}" for name in names]
+        row += [f"{metrics[metric][i]:.3f}" for metric in METRICS]
+        print("  ".join(row))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["score"] + names + list(METRICS))
+            for i in order:
+                writer.writerow([scores[i]] + [grid[i][name] for name in names] + [metrics[m][i] for m in METRICS])
+
+    # Numbered on from the prefix, past any profile of that name already
+    number = 0
+    for i in order[:args.export]:
+        number += 1
+        while store.exists(f"{args.prefix}-{number}"):
+            number += 1
+        name = f"{args.prefix}-{number}"
+        store.create(name, dict(base_settings, **grid[i]))
+        print(f"Saved profile '{name}'")
+    store.writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+# Telemetry files start with a fixed header, then a ring of fixed-size
+# records, one per engine tick:
+#
+#   magic, version, record size, capacity, records written so far,
+#   wall-clock ns and perf_counter_ns when the file was started
+#
+# The writer stores a record, then bumps the count, so every slot except
+# the one at count % capacity (the next to be written) is complete.
+MAGIC = b"WMFKTEL1"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIQQqq")
+HEADER_BYTES = 64
+_COUNT = struct.Struct("<Q")
+_COUNT_OFFSET = 24
+
+# t_ns (perf_counter_ns at tick start), raw axis, curved output, active cap,
+# tick duration (ns), FLAG_* bits, held action keys (bit per position in
+# the profile's list, first ACTION_KEY_BITS only), padding
+_RECORD = struct.Struct("<qdddIIII")
+RECORD_BYTES = _RECORD.size
+
+# Action keys a record tells apart; profiles may have more, which are held
+# without showing up in the record's actions
+ACTION_KEY_BITS = 32
+_ACTION_KEY_MASK = (1 << ACTION_KEY_BITS) - 1
+
+FLAG_STEER_LEFT = 1
+FLAG_STEER_RIGHT = 2
+FLAG_FULLSTEER_LEFT = 4
+FLAG_FULLSTEER_RIGHT = 8
+FLAG_ACTION_KEY = 16
+FLAG_MOUSE = 32
+
+# Records kept by default: about 17 minutes at 1000 Hz, 3 hours at 100 Hz
+DEFAULT_CAPACITY = 1 << 20
+
+_MAX_DURATION = 0xFFFFFFFF
+
+
+class TelemetryError(Exception):
+    pass
+
+
+# Per-tick records of one session in a memory-mapped ring file.
+#
+# The steering loop calls write() once per tick; that's one struct pack
+# into the mapping plus the count, no syscall and no allocation beyond a
+# few ints. Readers map the same file (TelemetryReader) and follow the
+# count, so the engine never waits for them.
+class TelemetryWriter:
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        size = HEADER_BYTES + capacity * RECORD_BYTES
+        try:
+            # A new file rather than truncating the old one, which a reader
+            # may still have mapped; anything but an old telemetry file is
+            # left alone, in case the path was mistyped
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    if f.read(len(MAGIC)) != MAGIC:
+                        raise TelemetryError(f"{path} exists and is not a telemetry file, not replacing it")
+                os.remove(path)
+            self._file = open(path, "w+b")
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+        except (OSError, ValueError) as e:
+            raise TelemetryError(f"Couldn't create telemetry file {path}: {e}")
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD_BYTES, capacity, 0,
+                          time.time_ns(), time.perf_counter_ns())
+        self.count = 0
+
+    def write(self, t_ns, duration_ns, inputs, state):
+        count = self.count
+        flags = (inputs.steer_left | inputs.steer_right << 1 | inputs.fullsteer_left << 2
+                 | inputs.fullsteer_right << 3 | state.action_key_active << 4 | (inputs.mouse_dx != 0) << 5)
+        _RECORD.pack_into(self._map, HEADER_BYTES + count % self.capacity * RECORD_BYTES,
+                          t_ns, state.x, state.output, state.action_key_cap,
+                          duration_ns if duration_ns < _MAX_DURATION else _MAX_DURATION,
+                          flags, inputs.action_keys & _ACTION_KEY_MASK, 0)
+        self.count = count = count + 1
+        _COUNT.pack_into(self._map, _COUNT_OFFSET, count)
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def report(self):
+        return f"telemetry {self.path}: {self.count} ticks"
+
+
+# Reading side of a telemetry file, zero-copy through numpy.memmap. Works
+# while the engine is writing; records() and tail() return views into the
+# mapping where the ring doesn't wrap. A record's actions only hold the
+# first ACTION_KEY_BITS action keys of the profile.
+class TelemetryReader:
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+        except OSError as e:
+            raise TelemetryError(f"Couldn't open {path}: {e}")
+        if len(header) < _HEADER.size or not header.startswith(MAGIC):
+            raise TelemetryError(f"{path} is not a telemetry file")
+        _, version, record_bytes, self.capacity, _, self.wall_ns, self.perf_ns = _HEADER.unpack(header)
+        if version != VERSION or record_bytes != RECORD_BYTES:
+            raise TelemetryError(f"{path} has telemetry version {version}, this reader knows {VERSION}")
+        self.dtype = np.dtype([("t_ns", "<i8"), ("x", "<f8"), ("output", "<f8"), ("cap", "<f8"),
+                               ("duration_ns", "<u4"), ("flags", "<u4"), ("actions", "<u4"), ("pad", "<u4")])
+        self._count = np.memmap(path, dtype="<u8", mode="r", offset=_COUNT_OFFSET, shape=(1,))
+        self._records = np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_BYTES, shape=(self.capacity,))
+
+    # Records written so far, including ones the ring has overwritten
+    def count(self):
+        return int(self._count[0])
+
+    # Records first .. count - 1 in order, skipping any the ring no longer
+    # holds (the slot the writer fills next doesn't count as held)
+    def records(self, first=0, count=None):
+        import numpy as np
+
+        if count is None:
+            count = self.count()
+        first = max(first, count - (self.capacity - 1), 0)
+        if first >= count:
+            return self._records[:0]
+        start, end = first % self.capacity, count % self.capacity
+        if start < end:
+            return self._records[start:end]
+        return np.concatenate((self._records[start:], self._records[:end]))
+
+    # The last `seconds` of records; a binary search over the ring finds
+    # where they start, so only those get copied if the ring wraps
+    def tail(self, seconds):
+        count = self.count()
+        low = max(count - (self.capacity - 1), 0)
+        if low >= count:
+            return self.records(count, count)
+        since = self._time(count - 1) - int(seconds * 1e9)
+        high = count - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._time(middle) < since:
+                low = middle + 1
+            else:
+                high = middle
+        return self.records(low, count)
+
+    def _time(self, index):
+        return int(self._records["t_ns"][index % self.capacity])
+
+    # New records since the count an earlier call returned; returns
+    # (records, count, lost), lost being records the ring overwrote first
+    def follow(self, since):
+        count = self.count()
+        lost = max(0, count - (self.capacity - 1) - since)
+        return self.records(since, count), count, lost
+
+    def close(self):
+        self._count = self._records = None
+
+
+# Direction changes of the raw axis by at least gap (fraction of the axis),
+# counted between turning points so small wiggles don't add up
+def _reversals(x, gap):
+    import numpy as np
+
+    steps = np.diff(x)
+    moving = steps != 0
+    if not moving.any():
+        return 0
+    signs = np.sign(steps[moving])
+    turns = np.flatnonzero(signs[1:] != signs[:-1])
+    positions = x[1:][moving]
+    extremes = np.concatenate((x[:1], positions[turns], positions[-1:])).tolist()
+    count = 0
+    direction = 0
+    peak = anchor = extremes[0]
+    for value in extremes[1:]:
+        if direction == 0:
+            if abs(value - anchor) >= gap:
+                direction = 1 if value > anchor else -1
+                peak = value
+        elif (value - peak) * direction > 0:
+            peak = value
+        elif abs(value - peak) >= gap:
+            count += 1
+            direction = -direction
+            peak = value
+    return count
+
+
+# Session metrics of an array of telemetry records: time shares weigh each
+# tick by the interval to the next one; jitter is the deviation of tick
+# intervals from the median interval
+def analyse(records, reversal_gap=0.05):
+    import numpy as np
+
+    ticks = len(records)
+    if ticks < 2:
+        return {"ticks": ticks}
+    t = records["t_ns"].astype(np.int64)
+    intervals = np.diff(t)
+    weights = np.append(intervals, np.median(intervals)).astype(np.float64)
+    total = weights.sum()
+    x = records["x"].astype(np.float64)
+    cap = records["cap"]
+    flags = records["flags"]
+    seconds = (t[-1] - t[0]) / 1e9
+
+    def share(mask):
+        return float(weights[mask].sum() / total)
+
+    nominal = float(np.median(intervals))
+    jitter = np.abs(intervals - nominal)
+    durations = records["duration_ns"]
+    reversals = _reversals(x, reversal_gap)
+    return {
+        "ticks": ticks,
+        "seconds": seconds,
+        "rate_hz": 1e9 / nominal if nominal else 0.0,
+        "time_at_cap": share(np.abs(x) >= cap - 1e-9),
+        "time_at_action_cap": share((np.abs(x) >= cap - 1e-9) & (flags & FLAG_ACTION_KEY != 0)),
+        "time_action_key": share(flags & FLAG_ACTION_KEY != 0),
+        "time_fullsteer": share(flags & (FLAG_FULLSTEER_LEFT | FLAG_FULLSTEER_RIGHT) != 0),
+        "time_centered": share(x == 0),
+        "reversals": reversals,
+        "reversals_per_minute": reversals / seconds * 60 if seconds else 0.0,
+        "jitter_us": {
+            "p50": float(np.percentile(jitter, 50)) / 1000,
+            "p99": float(np.percentile(jitter, 99)) / 1000,
+            "max": float(jitter.max()) / 1000,
+        },
+        "late_ticks": int((intervals > 1.5 * nominal).sum()),
+        "tick_duration_us": {
+            "p50": float(np.percentile(durations, 50)) / 1000,
+            "p99": float(np.percentile(durations, 99)) / 1000,
+            "max": float(durations.max()) / 1000,
+        },
+    }
+
+
+# One line for the status bar
+def summary_line(metrics):
+    if metrics.get("ticks", 0) < 2:
+        return "telemetry: no ticks yet"
+    return (f"telemetry: {metrics['time_at_cap'] * 100:.0f}% at cap, "
+            f"{metrics['reversals_per_minute']:.0f} reversals/min, jitter p99 {metrics['jitter_us']['p99']:.0f} us")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a steering telemetry file (see --telemetry)")
+    parser.add_argument("path", help="Telemetry file")
+    parser.add_argument("--last", type=float, metavar="SECONDS", help="Only the last SECONDS of the session")
+    parser.add_argument("--gap", type=float, default=0.05, help="Smallest direction change that counts as a reversal (default 0.05)")
+    parser.add_argument("--follow", type=float, metavar="SECONDS", help="Keep printing the metrics of the last SECONDS every SECONDS")
+    parser.add_argument("--csv", metavar="PATH", help="Write the records as CSV")
+    args = parser.parse_args(argv)
+
+    try:
+        reader = TelemetryReader(args.path)
+    except TelemetryError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    try:
+        if args.follow:
+            while True:
+                print(summary_line(analyse(reader.tail(args.follow), args.gap)))
+                time.sleep(args.follow)
+        records = reader.tail(args.last) if args.last else reader.records()
+        print(json.dumps(analyse(records, args.gap), indent=4))
+        if args.csv:
+            with open(args.csv, "w") as f:
+                f.write("t_ns,x,output,cap,duration_ns,flags,actions\n")
+                for row in records.tolist():
+                    f.write(",".join(str(value) for value in row[:-1]) + "\n")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
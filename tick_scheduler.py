@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+
+MIN_TICK_RATE = 100
+MAX_TICK_RATE = 1000
+DEFAULT_TICK_RATE = 100
+
+# Largest dt handed to the engine after a stall, so a long hiccup doesn't
+# turn into one giant jump of the wheel
+MAX_DT = 0.05
+
+# The last stretch before a deadline is busy-waited; sleep() is too coarse
+# on most systems to hit a 1 ms period on its own
+SPIN_NS = 200_000
+
+
+# Fixed-rate tick clock based on absolute deadlines, so time spent doing work
+# inside a tick doesn't push the following ticks back.
+class TickScheduler:
+    def __init__(self, rate_hz=DEFAULT_TICK_RATE, spin_ns=SPIN_NS):
+        self.spin_ns = spin_ns
+        self.set_rate(rate_hz)
+        self.start()
+
+    def set_rate(self, rate_hz):
+        self.rate_hz = max(MIN_TICK_RATE, min(int(rate_hz), MAX_TICK_RATE))
+        self.period_ns = 1_000_000_000 // self.rate_hz
+
+    # (Re)start the clock; the first tick is due one period from now
+    def start(self):
+        now = time.perf_counter_ns()
+        self._last_ns = now
+        self._deadline_ns = now + self.period_ns
+        self.ticks = 0
+        self.missed_deadlines = 0
+
+    # Block until the next deadline and return the measured time since the
+    # previous tick in seconds
+    def wait(self):
+        deadline = self._deadline_ns
+        now = time.perf_counter_ns()
+        remaining = deadline - now - self.spin_ns
+        if remaining > 0:
+            time.sleep(remaining / 1e9)
+        now = time.perf_counter_ns()
+        while now < deadline:
+            now = time.perf_counter_ns()
+
+        # Late by a whole period or more: count the ticks we skipped and
+        # re-anchor instead of firing a burst of catch-up ticks
+        late = now - deadline
+        if late >= self.period_ns:
+            self.missed_deadlines += late // self.period_ns
+            self._deadline_ns = now + self.period_ns
+        else:
+            self._deadline_ns = deadline + self.period_ns
+
+        dt = (now - self._last_ns) / 1e9
+        self._last_ns = now
+        self.ticks += 1
+        return min(dt, MAX_DT)
+
+    # Short human-readable summary for the status line
+    def report(self):
+        return f"{self.rate_hz} Hz, {self.missed_deadlines} missed of {self.ticks} ticks"
+
+
+# Ask the OS to schedule the calling thread ahead of normal work. Only Linux
+# is handled; returns True if the priority was actually raised.
+def raise_thread_priority():
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        # Thread id 0 means the calling thread
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(10))
+        return True
+    except (AttributeError, PermissionError, OSError):
+        pass
+    try:
+        # On Linux the nice value is per thread as well
+        os.setpriority(os.PRIO_PROCESS, 0, -10)
+        return True
+    except (AttributeError, PermissionError, OSError):
+        return False
+
+
+# Ask the OS to schedule the whole process ahead of normal work: the high
+# priority class on Windows, a lower nice value elsewhere. Returns True if
+# the priority was actually raised.
+def raise_process_priority():
+    if sys.platform == "win32":
+        import ctypes
+        HIGH_PRIORITY_CLASS = 0x80
+        kernel32 = ctypes.windll.kernel32
+        return bool(kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), HIGH_PRIORITY_CLASS))
+    try:
+        os.setpriority(os.PRIO_PROCESS, 0, -10)
+        return True
+    except (AttributeError, PermissionError, OSError):
+        return False
@@ -0,0 +1,131 @@
+import json
+import time
+
+# Bucket i holds samples of i significant bits, i.e. in [2^(i-1), 2^i) ns.
+# 64 buckets fit any int64 duration, so recording never needs a bounds check.
+BUCKETS = 64
+
+# Ticks per histogram window; the previous full window stays readable while
+# the next one fills up, so the panel always shows a recent, complete picture
+DEFAULT_WINDOW = 1000
+
+
+# Log2 histogram of nanosecond durations. Recording is a single
+# `buckets[ns.bit_length()] += 1`; percentiles are reported as bucket upper
+# bounds, which is plenty to tell a 50 us tick from a 5 ms stall.
+class RollingHistogram:
+    __slots__ = ("buckets", "previous", "full")
+
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.previous = [0] * BUCKETS  # Counts of the previous full window
+        self.full = False
+
+    def record(self, ns):
+        self.buckets[ns.bit_length()] += 1
+
+    # Close the current window: copy its counts aside and start from zero.
+    # Runs on the steering thread, so it only moves ints between the two
+    # preallocated lists; the summary is built when someone asks for it.
+    def rotate(self):
+        buckets, previous = self.buckets, self.previous
+        for bits in range(BUCKETS):
+            previous[bits] = buckets[bits]
+            buckets[bits] = 0
+        self.full = True
+
+    # Upper bucket bound (in ns) below which `fraction` of the samples fall
+    def percentile(self, fraction, buckets=None):
+        buckets = buckets or self.buckets
+        target = fraction * sum(buckets)
+        seen = 0
+        for bits, n in enumerate(buckets):
+            seen += n
+            if n and seen >= target:
+                return 1 << bits
+        return 0
+
+    def summary(self, buckets=None):
+        buckets = list(buckets or self.buckets)
+        count = sum(buckets)
+        if not count:
+            return {"count": 0}
+        return {
+            "count": count,
+            "p50_us": self.percentile(0.5, buckets) / 1000.0,
+            "p99_us": self.percentile(0.99, buckets) / 1000.0,
+            "max_us": self.percentile(1.0, buckets) / 1000.0,
+            "buckets": {f"<{(1 << bits) / 1000.0:g}us": n for bits, n in enumerate(buckets) if n},
+        }
+
+    # The last complete window, or the partial one before the first fills up
+    def recent(self):
+        return self.summary(self.previous) if self.full else self.summary()
+
+
+# Timing instrumentation of the steering loop and the GUI.
+#
+# The loop calls record_tick() once per tick with timestamps around work it
+# does anyway; with enabled = False it returns immediately.
+class TickStats:
+    NAMES = ("tick_duration", "tick_interval", "key_to_output", "output_write", "gui_refresh")
+
+    def __init__(self, window=DEFAULT_WINDOW, enabled=True):
+        self.enabled = enabled
+        self.window = window
+        self.tick_duration = RollingHistogram()
+        self.tick_interval = RollingHistogram()
+        self.key_to_output = RollingHistogram()
+        self.output_write = RollingHistogram()
+        self.gui_refresh = RollingHistogram()
+        # Bucket lists are zeroed in place on rotation, so these stay valid
+        self._duration = self.tick_duration.buckets
+        self._interval = self.tick_interval.buckets
+        self._key = self.key_to_output.buckets
+        self._write = self.output_write.buckets
+        self._last_start = 0
+        self._ticks = 0
+
+    # start_ns: tick start; write_ns: output write started; end_ns: tick done;
+    # press_ns: earliest key press consumed this tick, or 0
+    def record_tick(self, start_ns, write_ns, end_ns, press_ns=0):
+        if not self.enabled:
+            return
+        if self._last_start:
+            self._interval[(start_ns - self._last_start).bit_length()] += 1
+        self._last_start = start_ns
+        self._duration[(end_ns - start_ns).bit_length()] += 1
+        self._write[(end_ns - write_ns).bit_length()] += 1
+        if press_ns:
+            self._key[(end_ns - press_ns).bit_length()] += 1
+        self._ticks += 1
+        if self._ticks >= self.window:
+            self._ticks = 0
+            self.tick_duration.rotate()
+            self.tick_interval.rotate()
+            self.key_to_output.rotate()
+            self.output_write.rotate()
+
+    def record_gui(self, start_ns, end_ns):
+        if self.enabled:
+            self.gui_refresh.record(end_ns - start_ns)
+            if sum(self.gui_refresh.buckets) >= self.window:
+                self.gui_refresh.rotate()
+
+    def snapshot(self):
+        return {name: getattr(self, name).recent() for name in self.NAMES}
+
+    # One line per histogram for the stats panel
+    def report(self):
+        lines = []
+        for name, summary in self.snapshot().items():
+            if summary.get("count"):
+                lines.append(f"{name.replace('_', ' '):<14} p50 <{summary['p50_us']:g}us  "
+                             f"p99 <{summary['p99_us']:g}us  max <{summary['max_us']:g}us")
+            else:
+                lines.append(f"{name.replace('_', ' '):<14} no data")
+        return "\n".join(lines)
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump({"timestamp": time.time(), "stats": self.snapshot()}, f, indent=4)
@@ -1,60 +1,60 @@
+import sys
+
+# Headless mode runs the engine without any of the GUI imports below
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    from headless import main
+    sys.exit(main([arg for arg in sys.argv[1:] if arg != "--headless"]))
+
 import time
-import pyvjoy # type: ignore
+import argparse
 import tkinter as tk
-from tkinter import simpledialog, messagebox
-from threading import Thread
-import json
-import os
-import numpy as np
+from tkinter import simpledialog, messagebox, filedialog
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import keyboard
 import webbrowser
-
-# Initialize vJoy device
-try:
-    vj = pyvjoy.VJoyDevice(1)
-except pyvjoy.exceptions.vJoyFailedToAcquireException:
-    messagebox.showerror("Error", "VJoy device 1 is already in use")
-    exit()
-except Exception as e:
-    if "No VJD" in str(e) or "VJD does not exist" in str(e):
-        messagebox.showerror("Error", "No vJoy device found")
-        exit()
-    else:
-        raise
-
-# Global variable to track steering input
-current_x_axis_value = 0
-
-# Default settings
-default_settings = {
-    "steer_left_binding": "a",  # Default to 'A' for steering left
-    "steer_right_binding": "d",  # Default to 'D' for steering right
-    "pause_steering_reset_binding": "",  # Default to unbound
-    "linearity": 100,             # Default linearity
-    "sensitivity": 10,           # Default sensitivity
-    "release_sensitivity": 15,   # Default sensitivity on release
-    "sensitivity_when_paused": 3, # Default Sensitivity when Paused
-    "countersteer_multiplier": 2,  # Default countersteer multiplier
-    "fullsteer_left_binding": "",  # Default to unbound for fullsteer left
-    "fullsteer_right_binding": "",  # Default to unbound for fullsteer right
-    "snap_to_action_key_multiplier": 1,  # Default snap to action key multiplier
-    "action_keys": [],  # Default empty action keys
-    "permanent_max_lock": 100
-}
-
-# Function to load settings from a file
+from control_server import ControlError, ControlServer, SteeringController
+from engine_process import EngineError, EngineProcess
+from key_input import KeyState, resolve_binding
+from live_plot import LivePlot
+from mouse_input import mouse_device
+from output_filters import FILTER_TYPES, STAGES as FILTER_STAGES, filters_from_settings, measure_latency
+from output_sinks import AXES, AXIS_X, SINKS
+from profile_store import DEFAULT_SETTINGS, ProfileError, ProfileStore, SettingsWriter
+from response_curve import CURVE_POWER, CURVE_TYPES, normalize_points
+from steering_engine import STACK_FIRST, STACKING_MODES, SteeringConfig
+from telemetry import TelemetryError, TelemetryReader, analyse, summary_line
+
+# Command line options
+parser = argparse.ArgumentParser(description="Wheelmode for Keyboard")
+parser.add_argument("--output", choices=list(SINKS), help="Output device (default: profile setting, else vjoy on Windows and uinput on Linux)")
+parser.add_argument("--record-trace", metavar="PATH", help="Record key events and steering output to a trace file for input_trace.py")
+parser.add_argument("--seat", action="append", default=[], metavar="PROFILE",
+                    help="Drive one more virtual device (vJoy device 2, 3, ...) from PROFILE; can be given several times")
+parser.add_argument("--control", metavar="ADDRESS",
+                    help="Accept profile and parameter changes on unix:PATH or [HOST:]PORT (see control_client.py)")
+parser.add_argument("--mouse", nargs="?", const="", metavar="DEVICE",
+                    help="Read the mouse for mouse steering (default: when the profile steers with it), optionally from an evdev DEVICE")
+parser.add_argument("--telemetry", metavar="PATH",
+                    help="Write every tick to a telemetry ring file for telemetry.py (default: profile setting)")
+parser.add_argument("--headless", action="store_true",
+                    help="Run the engine from a profile without this window (see headless.py --help)")
+args = parser.parse_args()
+
+# Default settings, shared with headless mode
+default_settings = DEFAULT_SETTINGS
+
+# Settings are saved in the background after a short quiet period
+settings_writer = SettingsWriter()
+
+# All profiles live in one indexed file; older per-profile files are imported on first run
+profile_store = ProfileStore(defaults=default_settings, writer=settings_writer)
+
+# Function to load settings of a profile (validated, with defaults filled in)
 def load_settings(profile_name="default"):
-    settings_file = f"keyboard_{profile_name}_settings.json"
-    if os.path.exists(settings_file):
-        with open(settings_file, 'r') as f:
-            return json.load(f)
-    return default_settings.copy()  # Return default settings
+    return profile_store.load(profile_name)
 
-# Function to save settings to a file
-def save_settings(settings, profile_name="default"):
-    # Convert StringVar to string before saving
+# Replace Tk variables in settings by their values, in place
+def resolve_tk_vars(settings):
     for key, value in settings.items():
         if isinstance(value, tk.StringVar):
             settings[key] = value.get()
@@ -65,52 +65,53 @@ def save_settings(settings, profile_name="default"):
                         if isinstance(v, tk.StringVar):
                             item[k] = v.get()
 
-    settings_file = f"keyboard_{profile_name}_settings.json"
-    with open(settings_file, 'w') as f:
-        json.dump(settings, f, indent=4)  # Save with indentation for better readability
+# Function to save settings of a profile
+def save_settings(settings, profile_name="default"):
+    resolve_tk_vars(settings)  # Convert StringVar to string before saving
+    profile_store.save(profile_name, settings)
 
 # Function to save the selected profile
 def save_selected_profile(profile_name):
-    with open("selected_profile.json", 'w') as f:
-        json.dump({"selected_profile": profile_name}, f)
+    profile_store.select(profile_name)
 
 # Function to load the selected profile
 def load_selected_profile():
-    if os.path.exists("selected_profile.json"):
-        with open("selected_profile.json", 'r') as f:
-            data = json.load(f)
-            return data.get("selected_profile", "default")
-    return "default"
+    return profile_store.selected
 
 # Function to rename the current profile
 def rename_profile():
     current_profile = profile_var.get()
     new_name = simpledialog.askstring("Rename Profile", f"Enter a new name for the profile '{current_profile}':")
-    if new_name and not os.path.exists(f"keyboard_{new_name}_settings.json"):
-        os.rename(f"keyboard_{current_profile}_settings.json",
-                  f"keyboard_{new_name}_settings.json")
-        profile_var.set(new_name)
-        update_profile_menu(new_name)
-    elif os.path.exists(f"keyboard_{new_name}_settings.json"):
-        tk.messagebox.showerror("Error", f"The profile '{new_name}' already exists. Please choose a different name.")
+    if not new_name:
+        return
+    try:
+        if not profile_store.exists(current_profile):
+            profile_store.save(current_profile, settings)  # Defaults that were never saved
+        profile_store.rename(current_profile, new_name)
+    except ProfileError as e:
+        tk.messagebox.showerror("Error", f"{e} Please choose a different name.")
+        return
+    update_profile_menu(new_name)
 
 # Function to update the profile menu to reflect the new name
 def update_profile_menu(new_name):
     profile_menu['menu'].delete(0, 'end')
-    profiles = [f.replace("keyboard_", "").replace("_settings.json", "") for f in os.listdir(".") if f.startswith("keyboard_")]
-    for profile in profiles:
+    for profile in profile_store.names():
         profile_menu['menu'].add_command(label=profile, command=lambda p=profile: profile_var.set(p))
     profile_var.set(new_name)
 
 # Function to create a new profile
 def create_new_profile():
     new_profile_name = simpledialog.askstring("Create New Profile", "Enter a name for the new profile:")
-    if new_profile_name and not os.path.exists(f"keyboard_{new_profile_name}_settings.json"):
-        profile_var.set(new_profile_name)
-        save_settings(settings, new_profile_name)
-        update_profile_menu(new_profile_name)
-    elif os.path.exists(f"keyboard_{new_profile_name}_settings.json"):
-        tk.messagebox.showerror("Error", f"The profile '{new_profile_name}' already exists. Please choose a different name.")
+    if not new_profile_name:
+        return
+    try:
+        resolve_tk_vars(settings)
+        profile_store.create(new_profile_name, settings)
+    except ProfileError as e:
+        tk.messagebox.showerror("Error", f"{e} Please choose a different name.")
+        return
+    update_profile_menu(new_profile_name)
 
 # Tkinter UI setup
 root = tk.Tk()
@@ -137,39 +138,41 @@ new_profile_button.pack(side=tk.LEFT, padx=(5, 10))
 
 # Load settings for the selected profile
 settings = load_settings(profile_var.get())
-steer_left_binding = settings.get("steer_left_binding", default_settings["steer_left_binding"])
-steer_right_binding = settings.get("steer_right_binding", default_settings["steer_right_binding"])
-pause_steering_reset_binding = settings.get("pause_steering_reset_binding", default_settings["pause_steering_reset_binding"])
-linearity_value = settings.get("linearity", default_settings["linearity"])
-sensitivity_value = settings.get("sensitivity", default_settings["sensitivity"])
-release_sensitivity_value = settings.get("release_sensitivity", default_settings["release_sensitivity"])
-sensitivity_when_paused_value = settings.get("sensitivity_when_paused", default_settings["sensitivity_when_paused"])
-countersteer_multiplier_value = settings.get("countersteer_multiplier", default_settings["countersteer_multiplier"])
-snap_to_action_key_multiplier_value = settings.get("snap_to_action_key_multiplier", default_settings["snap_to_action_key_multiplier"])
-action_keys = settings.get("action_keys", default_settings["action_keys"])
-permanent_max_lock = settings.get("permanent_max_lock", default_settings["permanent_max_lock"])
-fullsteer_left_binding = settings.get("fullsteer_left_binding", default_settings["fullsteer_left_binding"])
-fullsteer_right_binding = settings.get("fullsteer_right_binding", default_settings["fullsteer_right_binding"])
+steer_left_binding = settings["steer_left_binding"]
+steer_right_binding = settings["steer_right_binding"]
+pause_steering_reset_binding = settings["pause_steering_reset_binding"]
+pause_steering_reset_codes = list(settings["pause_steering_reset_binding_codes"])
+linearity_value = settings["linearity"]
+sensitivity_value = settings["sensitivity"]
+release_sensitivity_value = settings["release_sensitivity"]
+sensitivity_when_paused_value = settings["sensitivity_when_paused"]
+countersteer_multiplier_value = settings["countersteer_multiplier"]
+snap_to_action_key_multiplier_value = settings["snap_to_action_key_multiplier"]
+action_keys = settings["action_keys"]
+permanent_max_lock = settings["permanent_max_lock"]
+fullsteer_left_binding = settings["fullsteer_left_binding"]
+fullsteer_right_binding = settings["fullsteer_right_binding"]
 
 # Function to update the selected profile in the UI and settings
 def update_selected_profile(*args):
     profile_name = profile_var.get()
     save_selected_profile(profile_name)
-    global settings, steer_left_binding, steer_right_binding, linearity_value, sensitivity_value, release_sensitivity_value, countersteer_multiplier_value, snap_to_action_key_multiplier_value, action_keys, fullsteer_left_binding, fullsteer_right_binding
+    global settings, steer_left_binding, steer_right_binding, pause_steering_reset_binding, linearity_value, sensitivity_value, release_sensitivity_value, countersteer_multiplier_value, snap_to_action_key_multiplier_value, action_keys, fullsteer_left_binding, fullsteer_right_binding
     settings = load_settings(profile_name)
     
-    steer_left_binding = settings.get("steer_left_binding", default_settings["steer_left_binding"])
-    steer_right_binding = settings.get("steer_right_binding", default_settings["steer_right_binding"])
-    pause_steering_reset_binding = settings.get("pause_steering_reset_binding", default_settings["pause_steering_reset_binding"])
-    linearity_value = settings.get("linearity", default_settings["linearity"])
-    sensitivity_value = settings.get("sensitivity", default_settings["sensitivity"])
-    release_sensitivity_value = settings.get("release_sensitivity", default_settings["release_sensitivity"])
-    countersteer_multiplier_value = settings.get("countersteer_multiplier", default_settings["countersteer_multiplier"])
-    snap_to_action_key_multiplier_value = settings.get("snap_to_action_key_multiplier", default_settings["snap_to_action_key_multiplier"])
-    action_keys = settings.get("action_keys", default_settings["action_keys"])
-    fullsteer_left_binding = settings.get("fullsteer_left_binding", default_settings["fullsteer_left_binding"])
-    fullsteer_right_binding = settings.get("fullsteer_right_binding", default_settings["fullsteer_right_binding"])
-    permanent_max_lock_var.set(settings.get("permanent_max_lock", default_settings["permanent_max_lock"]))
+    steer_left_binding = settings["steer_left_binding"]
+    steer_right_binding = settings["steer_right_binding"]
+    pause_steering_reset_binding = settings["pause_steering_reset_binding"]
+    pause_steering_reset_codes[:] = settings["pause_steering_reset_binding_codes"]
+    linearity_value = settings["linearity"]
+    sensitivity_value = settings["sensitivity"]
+    release_sensitivity_value = settings["release_sensitivity"]
+    countersteer_multiplier_value = settings["countersteer_multiplier"]
+    snap_to_action_key_multiplier_value = settings["snap_to_action_key_multiplier"]
+    action_keys = settings["action_keys"]
+    fullsteer_left_binding = settings["fullsteer_left_binding"]
+    fullsteer_right_binding = settings["fullsteer_right_binding"]
+    permanent_max_lock_var.set(settings["permanent_max_lock"])
 
     # Update all entries without calling update_graph multiple times
     linearity_entry.delete(0, tk.END)
@@ -187,7 +190,8 @@ def update_selected_profile(*args):
     snap_to_action_key_multiplier_entry.delete(0, tk.END)
     snap_to_action_key_multiplier_entry.insert(0, str(snap_to_action_key_multiplier_value))
 
-    # Update the graph after updating all settings
+    # Hand the new values to the engine and update the graph
+    apply_settings()
     update_graph()
 
 profile_var.trace("w", update_selected_profile)
@@ -319,11 +323,18 @@ def validate_permanent_max_lock_input(value):
     except ValueError:
         return False
 
+# Store a key pressed in a bind window: the keysym in var for display and
+# the scan codes it resolves to in codes, which the profile keeps next to it
+def capture_key(event, var, codes):
+    var.set(event.keysym)
+    codes[:] = resolve_binding(event.keysym, event.keycode)
+
 # Function to bind the Pause Steering Reset button
 def bind_pause_steering_reset():
     def on_key_press(event):
         global pause_steering_reset_binding
         pause_steering_reset_binding = event.keysym
+        pause_steering_reset_codes[:] = resolve_binding(event.keysym, event.keycode)
         pause_steering_reset_var.set(pause_steering_reset_binding)  # Update the button label
         pause_steering_reset_window.unbind("<Key>")
     pause_steering_reset_window.bind("<Key>", on_key_press)
@@ -332,6 +343,7 @@ def bind_pause_steering_reset():
 def unbind_pause_steering_reset():
     global pause_steering_reset_binding
     pause_steering_reset_binding = ""
+    pause_steering_reset_codes.clear()
     pause_steering_reset_var.set("Not Set")
 
 # Full function for the steering bindings window
@@ -357,17 +369,21 @@ def open_steering_bindings_window():
     # Adding the horizontal line after Steer Right row
     tk.Frame(steering_window, height=2, bd=1, relief=tk.SUNKEN).grid(row=2, columnspan=3, padx=5, pady=10, sticky="ew")
 
+    # Scan codes of the current bindings, replaced when a key is bound
+    steer_left_codes = list(settings.get("steer_left_binding_codes", []))
+    steer_right_codes = list(settings.get("steer_right_binding_codes", []))
+
     # Function to bind keys to the buttons
-    def bind_key(button, var):
+    def bind_key(button, var, codes):
         def on_key_press(event):
-            var.set(event.keysym)
+            capture_key(event, var, codes)
             steering_window.unbind("<Key>")
             button.config(text=event.keysym)
         steering_window.bind("<Key>", on_key_press)
 
     # Bind buttons for Steer Left and Steer Right
-    steer_left_button.config(command=lambda: bind_key(steer_left_button, steer_left_var))
-    steer_right_button.config(command=lambda: bind_key(steer_right_button, steer_right_var))
+    steer_left_button.config(command=lambda: bind_key(steer_left_button, steer_left_var, steer_left_codes))
+    steer_right_button.config(command=lambda: bind_key(steer_right_button, steer_right_var, steer_right_codes))
 
     # Save button for steering bindings
     def save_bindings():
@@ -376,8 +392,12 @@ def open_steering_bindings_window():
         steer_right_binding = steer_right_var.get()
         settings["steer_left_binding"] = steer_left_binding
         settings["steer_right_binding"] = steer_right_binding
+        settings["steer_left_binding_codes"] = steer_left_codes
+        settings["steer_right_binding_codes"] = steer_right_codes
         settings["pause_steering_reset_binding"] = pause_steering_reset_binding
+        settings["pause_steering_reset_binding_codes"] = list(pause_steering_reset_codes)
         save_settings(settings, profile_var.get())
+        apply_settings()
         steering_window.destroy()
 
     # Save button
@@ -419,11 +439,15 @@ def open_fullsteer_bindings_window():
     fullsteer_right_button = tk.Button(fullsteer_window, textvariable=fullsteer_right_var, width=10)
     fullsteer_right_button.grid(row=1, column=1, padx=5, pady=5)
 
+    # Scan codes of the current bindings, replaced when a key is bound
+    fullsteer_left_codes = list(settings.get("fullsteer_left_binding_codes", []))
+    fullsteer_right_codes = list(settings.get("fullsteer_right_binding_codes", []))
+
     # Unbind Buttons
-    unbind_fullsteer_left_button = tk.Button(fullsteer_window, text="Unbind", command=lambda: fullsteer_left_var.set(""))
+    unbind_fullsteer_left_button = tk.Button(fullsteer_window, text="Unbind", command=lambda: (fullsteer_left_var.set(""), fullsteer_left_codes.clear()))
     unbind_fullsteer_left_button.grid(row=0, column=2, padx=5, pady=5)
 
-    unbind_fullsteer_right_button = tk.Button(fullsteer_window, text="Unbind", command=lambda: fullsteer_right_var.set(""))
+    unbind_fullsteer_right_button = tk.Button(fullsteer_window, text="Unbind", command=lambda: (fullsteer_right_var.set(""), fullsteer_right_codes.clear()))
     unbind_fullsteer_right_button.grid(row=1, column=2, padx=5, pady=5)
 
     # Checkbox for Snap to Center
@@ -432,21 +456,23 @@ def open_fullsteer_bindings_window():
     snap_to_center_checkbox.grid(row=2, column=0, columnspan=3, pady=5)
 
     # Function to bind keys to the buttons
-    def bind_key(button, var):
+    def bind_key(button, var, codes):
         def on_key_press(event):
-            var.set(event.keysym)
+            capture_key(event, var, codes)
             fullsteer_window.unbind("<Key>")
             button.config(text=event.keysym)
         fullsteer_window.bind("<Key>", on_key_press)
 
     # Bind the buttons to listen for key presses
-    fullsteer_left_button.config(command=lambda: bind_key(fullsteer_left_button, fullsteer_left_var))
-    fullsteer_right_button.config(command=lambda: bind_key(fullsteer_right_button, fullsteer_right_var))
+    fullsteer_left_button.config(command=lambda: bind_key(fullsteer_left_button, fullsteer_left_var, fullsteer_left_codes))
+    fullsteer_right_button.config(command=lambda: bind_key(fullsteer_right_button, fullsteer_right_var, fullsteer_right_codes))
 
     # Save Button
     def save_fullsteer_bindings():
         settings["fullsteer_left_binding"] = fullsteer_left_var.get()
         settings["fullsteer_right_binding"] = fullsteer_right_var.get()
+        settings["fullsteer_left_binding_codes"] = fullsteer_left_codes
+        settings["fullsteer_right_binding_codes"] = fullsteer_right_codes
         settings["snap_to_center"] = snap_to_center_var.get()
 
         save_settings(settings, profile_var.get())
@@ -455,6 +481,7 @@ def open_fullsteer_bindings_window():
         global fullsteer_left_binding, fullsteer_right_binding
         fullsteer_left_binding = settings["fullsteer_left_binding"]
         fullsteer_right_binding = settings["fullsteer_right_binding"]
+        apply_settings()
 
         fullsteer_window.destroy()
 
@@ -481,26 +508,29 @@ def open_action_keys_window():
     action_keys_window.title("Configure Action Keys")
 
     # Function to bind keys to buttons
-    def bind_key(button, var):
+    def bind_key(button, var, codes):
         if not isinstance(var, tk.StringVar):
             var = tk.StringVar(value=var)  # Ensure `var` is a StringVar
 
         def on_key_press(event):
-            var.set(event.keysym)  # Correctly set the key to StringVar
+            capture_key(event, var, codes)  # Correctly set the key to StringVar
             action_keys_window.unbind("<Key>")  # Unbind after key press
             button.config(text=var.get())  # Update button text with the key press
         
         action_keys_window.bind("<Key>", on_key_press)
 
+    # How caps combine when several action keys are held
+    stacking_var = tk.StringVar(action_keys_window, value=settings.get("action_key_stacking", STACK_FIRST))
+
     def add_action_key():
-        if len(action_keys) < 10:  # Limit to 10 action keys
-            new_action_key = {
-                "binding": tk.StringVar(value="Not Set"),  # Initialize binding as StringVar
-                "cap_percentage": tk.StringVar(value="50"),  # Initialize cap_percentage as StringVar
-            }
-            action_keys.append(new_action_key)
-            update_action_keys_window()  # Immediately update the window to show the new key
-            bind_key_to_button(new_action_key)  # Immediately enable binding for the new key
+        new_action_key = {
+            "binding": tk.StringVar(value="Not Set"),  # Initialize binding as StringVar
+            "binding_codes": [],  # Scan codes of the binding
+            "cap_percentage": tk.StringVar(value="50"),  # Initialize cap_percentage as StringVar
+        }
+        action_keys.append(new_action_key)
+        update_action_keys_window()  # Immediately update the window to show the new key
+        bind_key_to_button(new_action_key)  # Immediately enable binding for the new key
 
     # Function to immediately clamp cap percentage values and reset the input if needed
     def save_cap_percentage(event, cap_entry, cap_var):
@@ -519,7 +549,7 @@ def open_action_keys_window():
     def bind_key_to_button(action_key):
         bind_button = tk.Button(action_keys_window, textvariable=action_key["binding"], width=15)
         bind_button.grid(row=len(action_keys)-1, column=2, padx=5, pady=5)
-        bind_button.config(command=lambda ak=action_key: bind_key(bind_button, ak["binding"]))
+        bind_button.config(command=lambda ak=action_key: bind_key(bind_button, ak["binding"], ak["binding_codes"]))
 
     def delete_action_key(index):
         if 0 <= index < len(action_keys):
@@ -538,11 +568,14 @@ def open_action_keys_window():
         settings["action_keys"] = [
             {
                 "binding": ak["binding"].get() if isinstance(ak["binding"], tk.StringVar) else ak["binding"],
+                "binding_codes": list(ak.get("binding_codes", [])),
                 "cap_percentage": min(100, int(ak["cap_percentage"].get()))  # Clamp the value at 100
             }
             for ak in action_keys
         ]
+        settings["action_key_stacking"] = stacking_var.get()
         save_settings(settings, profile_var.get())  # Save the updated settings
+        apply_settings()
         action_keys_window.destroy()
 
     def update_action_keys_window():
@@ -555,6 +588,7 @@ def open_action_keys_window():
                 action_key["binding"] = tk.StringVar(value=action_key["binding"])
             if not isinstance(action_key["cap_percentage"], tk.StringVar):
                 action_key["cap_percentage"] = tk.StringVar(value=action_key["cap_percentage"])
+            action_key.setdefault("binding_codes", [])  # Bound before scan codes were stored
 
             # Display Action Key label
             tk.Label(action_keys_window, text=f"Action Key {index + 1}").grid(row=index, column=0, padx=5, pady=5)
@@ -569,7 +603,7 @@ def open_action_keys_window():
             bind_button.grid(row=index, column=2, padx=5, pady=5)
 
             # Unbind Button
-            unbind_button = tk.Button(action_keys_window, text="Unbind", command=lambda ak=action_key: ak["binding"].set(""))
+            unbind_button = tk.Button(action_keys_window, text="Unbind", command=lambda ak=action_key: (ak["binding"].set(""), ak["binding_codes"].clear()))
             unbind_button.grid(row=index, column=3, padx=5, pady=5)
 
             # Delete Button
@@ -577,217 +611,440 @@ def open_action_keys_window():
             delete_button.grid(row=index, column=4, padx=5, pady=5)
 
             # Bind the button to listen for key presses
-            bind_button.config(command=lambda ak=action_key: bind_key(bind_button, ak["binding"]))
+            bind_button.config(command=lambda ak=action_key: bind_key(bind_button, ak["binding"], ak["binding_codes"]))
 
-        # Only show the Add Button if there are less than 10 action keys
-        if len(action_keys) < 10:
-            add_button = tk.Button(action_keys_window, text="+", command=add_action_key)
-            add_button.grid(row=len(action_keys), column=0, columnspan=2, pady=5)
+        # Add Button
+        add_button = tk.Button(action_keys_window, text="+", command=add_action_key)
+        add_button.grid(row=len(action_keys), column=0, columnspan=2, pady=5)
 
         # Save Button
         save_button = tk.Button(action_keys_window, text="Save", command=save_action_keys)
         save_button.grid(row=len(action_keys), column=2, columnspan=2, pady=5)
 
+        # Stacking mode for several held action keys
+        tk.Label(action_keys_window, text="When several are held").grid(row=len(action_keys) + 1, column=0, columnspan=2, padx=5, pady=5)
+        tk.OptionMenu(action_keys_window, stacking_var, *STACKING_MODES).grid(row=len(action_keys) + 1, column=2, columnspan=2, padx=5, pady=5)
+
     update_action_keys_window()
 
 # Configure Action Keys button on the main UI
 config_action_keys_button = tk.Button(frame, text="Configure Action Keys", command=open_action_keys_window)
 config_action_keys_button.grid(row=9, column=0, columnspan=2, pady=10)
 
-# Matplotlib figure for the linearity curve
-fig, ax = plt.subplots(figsize=(5, 2))
-canvas = FigureCanvasTkAgg(fig, master=root)
-canvas.get_tk_widget().pack()
-
-# Function to update the graph based on linearity and show the current X axis position
-def update_graph():
-    try:
-        linearity = int(linearity_entry.get())
-        linearity = max(50, min(linearity, 200))  # Clamp between 1 and 100
-        settings["linearity"] = linearity
+# Global variable to track the response curve window
+curve_window = None
+
+def open_curve_window():
+    global curve_window
+
+    # Close any existing curve window before opening a new one
+    if curve_window is not None and curve_window.winfo_exists():
+        curve_window.destroy()
+
+    curve_window = tk.Toplevel(root)
+    curve_window.title("Configure Response Curve")
+
+    curve_type_var = tk.StringVar(curve_window, value=settings.get("curve_type", CURVE_POWER))
+    # Control points as (x, y) StringVars; (0, 0) and (1, 1) are always implied
+    point_vars = [(tk.StringVar(value=str(x)), tk.StringVar(value=str(y))) for x, y in settings.get("curve_points", [])]
+
+    def add_point():
+        point_vars.append((tk.StringVar(value="0.5"), tk.StringVar(value="0.5")))
+        update_curve_window()
+
+    def delete_point(index):
+        if 0 <= index < len(point_vars):
+            point_vars.pop(index)
+            update_curve_window()
+
+    def save_curve():
+        points = []
+        for x_var, y_var in point_vars:
+            try:
+                points.append([float(x_var.get()), float(y_var.get())])
+            except ValueError:
+                pass  # Ignore invalid values
+        settings["curve_type"] = curve_type_var.get()
+        settings["curve_points"] = [list(p) for p in normalize_points(points)[1:-1]]
         save_settings(settings, profile_var.get())
+        apply_settings()
+        update_graph()
+        curve_window.destroy()
 
-        x = np.linspace(-1, 1, 100)
-        y = np.abs(x) ** (100 / linearity)  # Apply linearity curve
+    def update_curve_window():
+        for widget in curve_window.winfo_children():
+            widget.destroy()
 
-        ax.clear()
-        ax.plot(x, y)
-        ax.set_title("Linearity Curve")
+        tk.Label(curve_window, text="Curve Type").grid(row=0, column=0, padx=5, pady=5)
+        tk.OptionMenu(curve_window, curve_type_var, *CURVE_TYPES).grid(row=0, column=1, columnspan=2, padx=5, pady=5)
+        tk.Label(curve_window, text="Input / Output (0 - 1), used by piecewise and spline").grid(row=1, column=0, columnspan=4, padx=5, pady=5)
 
-        # Add a line for the current steering output
-        current_output = (current_x_axis_value + 1) / 2  # Normalize to 0 to 1
-        ax.axvline(current_x_axis_value, color='r', linestyle='--')
+        for index, (x_var, y_var) in enumerate(point_vars):
+            row = index + 2
+            tk.Label(curve_window, text=f"Point {index + 1}").grid(row=row, column=0, padx=5, pady=5)
+            tk.Entry(curve_window, textvariable=x_var, width=5, validate='key', validatecommand=vcmd).grid(row=row, column=1, padx=5, pady=5)
+            tk.Entry(curve_window, textvariable=y_var, width=5, validate='key', validatecommand=vcmd).grid(row=row, column=2, padx=5, pady=5)
+            tk.Button(curve_window, text="Delete", command=lambda i=index: delete_point(i)).grid(row=row, column=3, padx=5, pady=5)
 
-        canvas.draw()
-    except ValueError:
-        pass
+        row = len(point_vars) + 2
+        tk.Button(curve_window, text="+", command=add_point).grid(row=row, column=0, columnspan=2, pady=5)
+        tk.Button(curve_window, text="Save", command=save_curve).grid(row=row, column=2, columnspan=2, pady=5)
 
-# Function to update the steering visualization
-def update_steering_visualization(x_axis_output):
-    global current_x_axis_value
-    current_x_axis_value = x_axis_output
-    update_graph()
+    update_curve_window()
 
-# Function to update the steering visualization
-def update_steering_visualization(x_axis_output):
-    global current_x_axis_value
-    current_x_axis_value = x_axis_output
-    update_graph()
+# Configure Response Curve button on the main UI
+config_curve_button = tk.Button(frame, text="Configure Response Curve", command=open_curve_window)
+config_curve_button.grid(row=11, column=0, columnspan=2, pady=10)
 
-def normalize_key_name(key_name):
-    # Normalize common special keys for compatibility with keyboard module
-    key_map = {
-        "Control_L": "ctrl",
-        "Control_R": "ctrl",
-        "Alt_L": "alt",
-        "Alt_R": "alt",
-        "Shift_L": "shift",
-        "Shift_R": "shift",
-    }
-    return key_map.get(key_name, key_name)  # Return mapped value or original key name
-
-# Monitor kb
-def monitor_keyboard():
-    global fullsteer_left_binding, fullsteer_right_binding, current_x_axis_value
-    action_key_active = False
-    fullsteer_active = False
-    previous_fullsteer_active = False
-
-    while True:
-        try:
-            # Retrieve and clamp all sensitivity-related settings
-            linearity = int(linearity_entry.get())
-            linearity = max(50, min(linearity, 200))  # Clamp between 50 and 200
-            sensitivity = int(sensitivity_entry.get())
-            sensitivity = max(1, min(sensitivity, 100))  # Clamp between 1 and 100
-            release_sensitivity = int(release_sensitivity_entry.get())
-            release_sensitivity = max(1, min(release_sensitivity, 100))  # Clamp between 1 and 100
-            countersteer_multiplier = float(countersteer_multiplier_entry.get())
-            snap_to_action_key_multiplier = float(snap_to_action_key_multiplier_entry.get())
-
-            # Get the Permanent Max Lock value
-            permanent_max_lock = permanent_max_lock_var.get() / 100.0  # Convert percentage to fraction
-        except ValueError:
-            continue  # Skip the iteration if there are invalid inputs
-
-        # Normalize the key bindings for steering
-        steer_left_binding_normalized = normalize_key_name(steer_left_binding)
-        steer_right_binding_normalized = normalize_key_name(steer_right_binding)
-
-        # Get the current X-axis value (steering output)
-        x_axis_output = current_x_axis_value
-
-        # Default action_key_cap
-        action_key_cap = permanent_max_lock  # Start with permanent max lock
-        action_key_active = False  # Reset action key active state
-
-        # Process each action key
-        for action_key in action_keys:
-            action_key_binding = action_key["binding"].get() if isinstance(action_key["binding"], tk.StringVar) else action_key["binding"]
-            
-            # Normalize action key bindings
-            action_key_binding_normalized = normalize_key_name(action_key_binding)
-
-            # Ensure a key is properly set and not "Not Set"
-            if action_key_binding_normalized and action_key_binding_normalized != "Not Set" and keyboard.is_pressed(action_key_binding_normalized):
-                action_key_cap = float(action_key["cap_percentage"].get()) / 100.0 if isinstance(action_key["cap_percentage"], tk.StringVar) else float(action_key["cap_percentage"]) / 100.0
-                action_key_active = True
-                break
-
-        fullsteer_active = False
-
-        # Handle Fullsteer Left
-        if fullsteer_left_binding and keyboard.is_pressed(normalize_key_name(fullsteer_left_binding)):
-            x_axis_output = -1  # Fullsteer left to 100%
-            fullsteer_active = True
-
-        # Handle Fullsteer Right
-        if fullsteer_right_binding and keyboard.is_pressed(normalize_key_name(fullsteer_right_binding)):
-            x_axis_output = 1  # Fullsteer right to 100%
-            fullsteer_active = True
-
-        # Handle fullsteer release (snap to center or smooth return)
-        if previous_fullsteer_active and not fullsteer_active:
-            if settings.get("snap_to_center", False):
-                x_axis_output = 0  # Snap to center
-                current_x_axis_value = 0
-            else:
-                # Smoothly return to center
-                if x_axis_output > 0:
-                    x_axis_output -= 0.01 * release_sensitivity
-                    x_axis_output = max(x_axis_output, 0)
-                elif x_axis_output < 0:
-                    x_axis_output += 0.01 * release_sensitivity
-                    x_axis_output = min(x_axis_output, 0)
-
-        # Normal steering input handling (if fullsteer is not active)
-        if not fullsteer_active:
-            if keyboard.is_pressed(steer_left_binding_normalized):
-                if x_axis_output > 0:
-                    x_axis_output -= 0.01 * sensitivity * countersteer_multiplier
-                else:
-                    x_axis_output -= 0.01 * sensitivity * (snap_to_action_key_multiplier if action_key_active else 1)
-                x_axis_output = max(x_axis_output, -action_key_cap)
-            elif keyboard.is_pressed(steer_right_binding_normalized):
-                if x_axis_output < 0:
-                    x_axis_output += 0.01 * sensitivity * countersteer_multiplier
-                else:
-                    x_axis_output += 0.01 * sensitivity * (snap_to_action_key_multiplier if action_key_active else 1)
-                x_axis_output = min(x_axis_output, action_key_cap)
-            else:
-                    # Smoothly return to the center
-                    if x_axis_output > action_key_cap:
-                        x_axis_output -= 0.01 * release_sensitivity * snap_to_action_key_multiplier
-                        x_axis_output = max(x_axis_output, action_key_cap)
-                    elif x_axis_output < -action_key_cap:
-                        x_axis_output += 0.01 * release_sensitivity * snap_to_action_key_multiplier
-                        x_axis_output = min(x_axis_output, -action_key_cap)
-                    else:
-                        if x_axis_output > 0:
-                            x_axis_output -= 0.01 * release_sensitivity * (snap_to_action_key_multiplier if action_key_active else 1)
-                            x_axis_output = max(x_axis_output, 0)
-                        elif x_axis_output < 0:
-                            x_axis_output += 0.01 * release_sensitivity * (snap_to_action_key_multiplier if action_key_active else 1)
-                            x_axis_output = min(x_axis_output, 0)
-
-        # Handle action key capping and smooth transition
-        if action_key_active and abs(x_axis_output) > action_key_cap:
-            if x_axis_output > action_key_cap:
-                x_axis_output -= 0.01 * release_sensitivity * snap_to_action_key_multiplier
-                x_axis_output = max(x_axis_output, action_key_cap)
-            elif x_axis_output < -action_key_cap:
-                x_axis_output += 0.01 * release_sensitivity * snap_to_action_key_multiplier
-                x_axis_output = min(x_axis_output, -action_key_cap)
-
-       # Apply linearity to the output
-        vjoy_output = np.sign(x_axis_output) * np.abs(x_axis_output) ** (100 / linearity)
-        
-        # Apply smoothing: The higher the smoothing_value, the slower the output change
-        vjoy_output = np.sign(x_axis_output) * np.abs(x_axis_output) ** (100 / linearity)
-        vj.set_axis(pyvjoy.HID_USAGE_X, int((vjoy_output + 1) * 0x4000))
+# Global variable to track the axes window
+axes_window = None
+
+# Axes a pedal can drive; X stays with the steering
+PEDAL_AXES = [axis for axis in AXES if axis != AXIS_X]
 
-        current_x_axis_value = x_axis_output
+def open_axes_window():
+    global axes_window
 
-        # Update the steering visualization
-        update_steering_visualization(x_axis_output)
+    # Close any existing axes window before opening a new one
+    if axes_window is not None and axes_window.winfo_exists():
+        axes_window.destroy()
 
-        previous_fullsteer_active = fullsteer_active
+    axes_window = tk.Toplevel(root)
+    axes_window.title("Configure Axes")
 
-        time.sleep(0.01)  # Small delay to prevent CPU overuse
+    # One dict of StringVars/BooleanVars per pedal axis
+    def make_vars(axis_settings):
+        return {
+            "name": tk.StringVar(value=axis_settings.get("name", "")),
+            "axis": tk.StringVar(value=axis_settings.get("axis", PEDAL_AXES[0])),
+            "binding": tk.StringVar(value=axis_settings.get("binding", "")),
+            "binding_codes": list(axis_settings.get("binding_codes", [])),
+            "sensitivity": tk.StringVar(value=str(axis_settings.get("sensitivity", default_settings["sensitivity"]))),
+            "release_sensitivity": tk.StringVar(value=str(axis_settings.get("release_sensitivity", default_settings["release_sensitivity"]))),
+            "linearity": tk.StringVar(value=str(axis_settings.get("linearity", default_settings["linearity"]))),
+            "invert": tk.BooleanVar(value=axis_settings.get("invert", False)),
+        }
 
-# Run the keyboard monitoring in a separate thread
+    axis_vars = [make_vars(axis_settings) for axis_settings in settings.get("axes", [])]
+
+    def bind_key(button, var, codes):
+        def on_key_press(event):
+            capture_key(event, var, codes)
+            axes_window.unbind("<Key>")
+        axes_window.bind("<Key>", on_key_press)
+
+    def add_axis():
+        # Pick the first axis nothing else uses yet
+        used = {v["axis"].get() for v in axis_vars}
+        free = [axis for axis in PEDAL_AXES if axis not in used]
+        if not free:
+            messagebox.showinfo("Configure Axes", "All axes are already in use.")
+            return
+        names = ["Throttle", "Brake", "Clutch"]
+        axis_vars.append(make_vars({"name": names[len(axis_vars)] if len(axis_vars) < len(names) else "", "axis": free[0]}))
+        update_axes_window()
+
+    def delete_axis(index):
+        if 0 <= index < len(axis_vars):
+            axis_vars.pop(index)
+            update_axes_window()
+
+    def save_axes():
+        axes = []
+        for v in axis_vars:
+            axis_settings = {"name": v["name"].get(), "axis": v["axis"].get(), "binding": v["binding"].get(),
+                             "binding_codes": v["binding_codes"], "invert": v["invert"].get()}
+            for key in ("sensitivity", "release_sensitivity", "linearity"):
+                try:
+                    axis_settings[key] = int(float(v[key].get()))
+                except ValueError:
+                    axis_settings[key] = default_settings[key]  # Fall back on invalid values
+            axes.append(axis_settings)
+        settings["axes"] = axes
+        save_settings(settings, profile_var.get())
+        apply_settings()
+        axes_window.destroy()
+
+    def update_axes_window():
+        for widget in axes_window.winfo_children():
+            widget.destroy()
+
+        headers = ["Name", "Axis", "Key", "", "Sensitivity", "On Release", "Linearity", "Invert"]
+        for column, text in enumerate(headers):
+            tk.Label(axes_window, text=text).grid(row=0, column=column, padx=5, pady=5)
+
+        for index, v in enumerate(axis_vars):
+            row = index + 1
+            tk.Entry(axes_window, textvariable=v["name"], width=10).grid(row=row, column=0, padx=5, pady=5)
+            tk.OptionMenu(axes_window, v["axis"], *PEDAL_AXES).grid(row=row, column=1, padx=5, pady=5)
+            bind_button = tk.Button(axes_window, textvariable=v["binding"], width=10)
+            bind_button.config(command=lambda b=bind_button, var=v["binding"], codes=v["binding_codes"]: bind_key(b, var, codes))
+            bind_button.grid(row=row, column=2, padx=5, pady=5)
+            tk.Button(axes_window, text="Unbind", command=lambda var=v["binding"], codes=v["binding_codes"]: (var.set(""), codes.clear())).grid(row=row, column=3, padx=5, pady=5)
+            for column, key in enumerate(("sensitivity", "release_sensitivity", "linearity"), start=4):
+                tk.Entry(axes_window, textvariable=v[key], width=5, validate='key', validatecommand=vcmd).grid(row=row, column=column, padx=5, pady=5)
+            tk.Checkbutton(axes_window, variable=v["invert"]).grid(row=row, column=7, padx=5, pady=5)
+            tk.Button(axes_window, text="Delete", command=lambda i=index: delete_axis(i)).grid(row=row, column=8, padx=5, pady=5)
+
+        row = len(axis_vars) + 1
+        tk.Button(axes_window, text="+", command=add_axis).grid(row=row, column=0, columnspan=2, pady=5)
+        tk.Button(axes_window, text="Save", command=save_axes).grid(row=row, column=2, columnspan=2, pady=5)
+
+    update_axes_window()
+
+# Configure Axes button on the main UI
+config_axes_button = tk.Button(frame, text="Configure Axes", command=open_axes_window)
+config_axes_button.grid(row=12, column=0, columnspan=2, pady=10)
+
+# Global variable to track the filters window
+filters_window = None
+
+def open_filters_window():
+    global filters_window
+
+    # Close any existing filters window before opening a new one
+    if filters_window is not None and filters_window.winfo_exists():
+        filters_window.destroy()
+
+    filters_window = tk.Toplevel(root)
+    filters_window.title("Configure Filters")
+
+    # One stage type plus a StringVar per parameter; every stage keeps its
+    # own parameters so switching the type back and forth loses nothing
+    def make_vars(stage_settings):
+        stage_type = stage_settings.get("type", FILTER_TYPES[0])
+        params = {}
+        for kind, stage in FILTER_STAGES.items():
+            for name, default in stage.PARAMS:
+                value = stage_settings.get(name, default) if kind == stage_type else default
+                params[kind, name] = tk.StringVar(value=str(value))
+        return {"type": tk.StringVar(value=stage_type), "params": params}
+
+    stage_vars = [make_vars(stage_settings) for stage_settings in settings["filters"]]
+
+    def collect():
+        stages = []
+        for v in stage_vars:
+            kind = v["type"].get()
+            stage_settings = {"type": kind}
+            for name, default in FILTER_STAGES[kind].PARAMS:
+                try:
+                    stage_settings[name] = float(v["params"][kind, name].get())
+                except ValueError:
+                    stage_settings[name] = default  # Fall back on invalid values
+            stages.append(stage_settings)
+        return stages
+
+    def add_stage():
+        stage_vars.append(make_vars({}))
+        update_filters_window()
+
+    def delete_stage(index):
+        if 0 <= index < len(stage_vars):
+            stage_vars.pop(index)
+            update_filters_window()
+
+    def save_filters():
+        settings["filters"] = collect()
+        save_settings(settings, profile_var.get())
+        apply_settings()
+        filters_window.destroy()
+
+    def update_filters_window():
+        for widget in filters_window.winfo_children():
+            widget.destroy()
+
+        tk.Label(filters_window, text="Stages run top to bottom on the steering output").grid(row=0, column=0, columnspan=8, padx=5, pady=5)
+        for index, v in enumerate(stage_vars):
+            row = index + 1
+            kind = v["type"].get()
+            tk.OptionMenu(filters_window, v["type"], *FILTER_TYPES, command=lambda _: update_filters_window()).grid(row=row, column=0, padx=5, pady=5)
+            column = 1
+            for name, _ in FILTER_STAGES[kind].PARAMS:
+                tk.Label(filters_window, text=name.replace("_", " ").capitalize()).grid(row=row, column=column, padx=5, pady=5)
+                tk.Entry(filters_window, textvariable=v["params"][kind, name], width=6, validate='key', validatecommand=vcmd).grid(row=row, column=column + 1, padx=5, pady=5)
+                column += 2
+            tk.Button(filters_window, text="Delete", command=lambda i=index: delete_stage(i)).grid(row=row, column=7, padx=5, pady=5)
+
+        row = len(stage_vars) + 1
+        # Added latency of the whole chain, at the current tick rate
+        latency = measure_latency(filters_from_settings(collect()), 1.0 / settings["tick_rate"])
+        tk.Label(filters_window, text=f"Added latency: step {latency['step_ms']:.0f} ms, ramp {latency['ramp_ms']:.0f} ms").grid(row=row, column=0, columnspan=8, padx=5, pady=5)
+        tk.Button(filters_window, text="+", command=add_stage).grid(row=row + 1, column=0, columnspan=2, pady=5)
+        tk.Button(filters_window, text="Update", command=update_filters_window).grid(row=row + 1, column=2, columnspan=2, pady=5)
+        tk.Button(filters_window, text="Save", command=save_filters).grid(row=row + 1, column=4, columnspan=2, pady=5)
+
+    update_filters_window()
+
+# Configure Filters button on the main UI
+config_filters_button = tk.Button(frame, text="Configure Filters", command=open_filters_window)
+config_filters_button.grid(row=13, column=0, columnspan=2, pady=10)
+
+# Global variable to track the mouse window
+mouse_window = None
+
+# Mouse steering parameters (label, setting); the recenter key is set like
+# the other bindings in the profile
+MOUSE_FIELDS = (
+    ("Key Weight (%)", "key_weight"),
+    ("Mouse Weight (%)", "mouse_weight"),
+    ("Mouse Gain", "mouse_gain"),
+    ("Deadzone (%)", "mouse_deadzone"),
+    ("Recenter Rate", "mouse_recenter"),
+)
+
+def open_mouse_window():
+    global mouse_window
+
+    # Close any existing mouse window before opening a new one
+    if mouse_window is not None and mouse_window.winfo_exists():
+        mouse_window.destroy()
+
+    mouse_window = tk.Toplevel(root)
+    mouse_window.title("Configure Mouse Steering")
+
+    field_vars = {name: tk.StringVar(value=str(settings.get(name, default_settings[name]))) for _, name in MOUSE_FIELDS}
+    device_var = tk.StringVar(value=settings.get("mouse_device", ""))
+
+    def save_mouse():
+        for _, name in MOUSE_FIELDS:
+            try:
+                settings[name] = float(field_vars[name].get())
+            except ValueError:
+                pass  # Keep the old value on invalid input
+        settings["mouse_device"] = device_var.get().strip()
+        save_settings(settings, profile_var.get())
+        apply_settings()
+        mouse_window.destroy()
+
+    tk.Label(mouse_window, text="Steering = keys x key weight + mouse x mouse weight").grid(row=0, column=0, columnspan=2, padx=5, pady=5)
+    for row, (label, name) in enumerate(MOUSE_FIELDS, start=1):
+        tk.Label(mouse_window, text=label).grid(row=row, column=0, padx=5, pady=5)
+        tk.Entry(mouse_window, textvariable=field_vars[name], width=6, validate='key', validatecommand=vcmd).grid(row=row, column=1, padx=5, pady=5)
+    row = len(MOUSE_FIELDS) + 1
+    tk.Label(mouse_window, text="Device (empty for the first mouse)").grid(row=row, column=0, padx=5, pady=5)
+    tk.Entry(mouse_window, textvariable=device_var, width=20).grid(row=row, column=1, padx=5, pady=5)
+    tk.Label(mouse_window, text="The mouse is opened at startup; restart after enabling it").grid(row=row + 1, column=0, columnspan=2, padx=5, pady=5)
+    tk.Button(mouse_window, text="Save", command=save_mouse).grid(row=row + 2, column=0, columnspan=2, pady=5)
+
+# Configure Mouse button on the main UI
+config_mouse_button = tk.Button(frame, text="Configure Mouse", command=open_mouse_window)
+config_mouse_button.grid(row=14, column=0, columnspan=2, pady=10)
+
+# Matplotlib figure for the linearity curve
+fig = plt.figure(figsize=(5, 2.5))
+canvas = FigureCanvasTkAgg(fig, master=root)
+canvas.get_tk_widget().pack()
+live_plot = LivePlot(fig, canvas, history_seconds=settings["history_seconds"])
+
+# Function to update the graph from the engine's response curve table
+def update_graph():
+    x, y = engine_runner.config.curve.plot_points()
+    live_plot.set_curve(x, y)
+
+# Redraw the current X axis position at a capped frame rate, on the Tk thread
+def refresh_plot():
+    refresh_start = time.perf_counter_ns()
+    live_plot.refresh(engine_runner.samples)
+    engine_runner.stats.record_gui(refresh_start, time.perf_counter_ns())
+    root.after(max(1, 1000 // settings["plot_fps"]), refresh_plot)
+
+# Resolves binding names to scan codes; the keyboard hook itself runs in
+# the engine process
+key_state = KeyState()
+
+# Compile a settings dict (which may still hold Tk variables) for the engine
+def compile_settings(profile_settings):
+    plain_settings = dict(profile_settings)
+    plain_settings["action_keys"] = [
+        {k: v.get() if isinstance(v, tk.StringVar) else v for k, v in ak.items()}
+        for ak in profile_settings.get("action_keys", [])
+    ]
+    return SteeringConfig.from_settings(plain_settings, key_state.mask)
+
+# The steering loop runs in its own process, which hooks the keyboard and
+# opens the output device (vJoy, uinput, ...) plus one more per extra seat.
+# Settings reach it as hot-reload messages; its position, stats and status
+# come back through shared memory, so drawing here never delays an output.
+engine_runner = EngineProcess(
+    compile_settings(settings),
+    output=args.output or settings.get("output"),
+    seat_configs=[compile_settings(load_settings(profile)) for profile in args.seat],
+    rate_hz=settings["tick_rate"],
+    instrumentation=settings["instrumentation"],
+    record_trace=args.record_trace,
+    raise_priority=settings["raise_thread_priority"],
+    on_problem=print,
+    mouse=args.mouse if args.mouse is not None else mouse_device(settings),
+    telemetry=args.telemetry or settings["telemetry_path"] or None,
+    telemetry_capacity=settings["telemetry_capacity"],
+)
+
+# Reads back the engine's telemetry file for the status line
+telemetry_reader = None
+
+# Seconds of telemetry the status line sums up
+TELEMETRY_SECONDS = 10
+
+# Compile the current settings and send them to the engine (Tk thread only).
+# An engine that can't take them is a problem to report, not a reason for
+# the callback to fail.
+def apply_settings():
+    config = compile_settings(settings)
+    try:
+        engine_runner.reload(config)
+        engine_runner.set_rate(settings["tick_rate"])
+        # Extra seats on the profile being edited follow along
+        for seat, profile in enumerate(args.seat):
+            if profile == profile_var.get():
+                engine_runner.reload_seat(seat, config)
+    except EngineError as e:
+        print(f"Couldn't update the engine: {e}")
+
+# Start the engine process; without an output device there's nothing to do
 def start_monitoring():
-    keyboard_thread = Thread(target=monitor_keyboard)
-    keyboard_thread.daemon = True
-    keyboard_thread.start()
+    global telemetry_reader
+    try:
+        engine_runner.start()
+    except EngineError as e:
+        engine_runner.close()
+        messagebox.showerror("Error", str(e))
+        exit()
+    if engine_runner.telemetry_path:
+        try:
+            telemetry_reader = TelemetryReader(engine_runner.telemetry_path)
+        except TelemetryError:
+            pass  # The engine process reports why it couldn't write one
+
+# Profiles changed through the control server, for the Tk thread to catch up on
+control_changes = []
+
+def apply_control_changes():
+    if control_changes:
+        profile = control_changes[-1]
+        control_changes.clear()
+        if profile != profile_var.get():
+            profile_var.set(profile)  # Reloads through update_selected_profile
+        else:
+            update_selected_profile()
+    root.after(100, apply_control_changes)
+
+# Local control server for scripts, stream decks and clutch helpers; changes
+# go straight to the engine, the widgets follow on the next poll
+control_server = None
+control_address = args.control or settings["control_address"]
+if control_address:
+    control_server = ControlServer(SteeringController(profile_store, engine_runner, key_state.mask, on_change=control_changes.append, seats=args.seat), control_address)
 
 # Load all profiles on startup
 def load_all_profiles():
-    profiles = [f.replace("keyboard_", "").replace("_settings.json", "") for f in os.listdir(".") if f.startswith("keyboard_")]
+    profiles = profile_store.names()
     profile_menu['menu'].delete(0, 'end')
     for profile in profiles:
         profile_menu['menu'].add_command(label=profile, command=lambda p=profile: profile_var.set(p))
-    if profiles:
+    if profile_store.selected in profiles:
+        profile_var.set(profile_store.selected)  # Reopen the last used profile
+    elif profiles:
         profile_var.set(profiles[0])  # Set the first profile as selected
     else:
         profile_var.set("default")  # Fallback to default if no profiles found
@@ -810,15 +1067,70 @@ url_button = tk.Button(
     bottom_frame, text="Check out Clutch helper Software (BTC2)", command=open_url)
 url_button.pack(side=tk.RIGHT)
 
+# Tick rate and missed deadlines of the steering loop
+tick_status_label = tk.Label(root, text="", font=("Helvetica", 9))
+tick_status_label.pack(side=tk.BOTTOM)
+
+# Stats panel with rolling latency histograms
+stats_frame = tk.Frame(root)
+stats_frame.pack(side=tk.BOTTOM, pady=(0, 5))
+stats_label = tk.Label(stats_frame, text="", font=("Courier", 8), justify=tk.LEFT)
+stats_label.pack(side=tk.LEFT, padx=5)
+
+def export_stats():
+    path = filedialog.asksaveasfilename(title="Export Stats", defaultextension=".json", initialfile="wheelmode_stats.json", filetypes=[("JSON", "*.json")])
+    if path:
+        engine_runner.stats.export(path)
+
+export_stats_button = tk.Button(stats_frame, text="Export Stats", command=export_stats)
+export_stats_button.pack(side=tk.LEFT, padx=5)
+
+# Pause/resume steering; while paused the wheel stays centered
+def toggle_pause():
+    try:
+        if pause_button.cget("text") == "Pause Steering":
+            engine_runner.pause()
+            pause_button.config(text="Resume Steering")
+        else:
+            engine_runner.resume()
+            pause_button.config(text="Pause Steering")
+    except EngineError as e:
+        print(f"Couldn't update the engine: {e}")
+
+pause_button = tk.Button(stats_frame, text="Pause Steering", command=toggle_pause)
+pause_button.pack(side=tk.LEFT, padx=5)
+
+def update_tick_status():
+    control_status = f" | {control_server.report()}" if control_server is not None else ""
+    telemetry_status = f" | {summary_line(analyse(telemetry_reader.tail(TELEMETRY_SECONDS)))}" if telemetry_reader is not None else ""
+    tick_status_label.config(text=f"{engine_runner.report()} | settings: {settings_writer.report()}, {profile_store.report()}{control_status}{telemetry_status}")
+    if engine_runner.stats.enabled:
+        stats_label.config(text=engine_runner.stats.report())
+    root.after(1000, update_tick_status)
+
 # Load profiles and start monitoring on startup
 load_all_profiles()
 start_monitoring()
+if control_server is not None:
+    try:
+        control_server.start()
+    except ControlError as e:
+        print(e)
+        control_server = None
+update_tick_status()
+refresh_plot()
+apply_control_changes()
 
 # Ensure the application closes fully when the X button is pressed
 root.protocol("WM_DELETE_WINDOW", root.quit)
 
-# Start monitoring when the profile selection changes
-profile_var.trace("w", lambda *args: start_monitoring())
-
 # Run the Tkinter event loop
 root.mainloop()
+
+# Center the wheel and write any settings still waiting for their quiet period
+if control_server is not None:
+    control_server.stop()
+if telemetry_reader is not None:
+    telemetry_reader.close()
+engine_runner.close()
+settings_writer.close()